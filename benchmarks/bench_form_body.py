@@ -0,0 +1,83 @@
+"""Measure the cost of parsing ``application/x-www-form-urlencoded`` bodies.
+
+:func:`pando.body_parsers.parse_urlencoded` is compared to the previous
+implementation of :func:`~pando.body_parsers.formdata`, which went through
+:class:`cgi.FieldStorage` (that module was removed from the standard library
+in Python 3.13, so the comparison is skipped there).
+
+Usage::
+
+    python benchmarks/bench_form_body.py [number_of_iterations]
+
+"""
+
+from io import BytesIO
+import sys
+from timeit import repeat
+import warnings
+
+from pando.body_parsers import parse_urlencoded
+from pando.http.baseheaders import BaseHeaders
+from pando.http.mapping import CaseInsensitiveMapping, Mapping
+
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    try:
+        import cgi
+    except ImportError:
+        cgi = None
+
+
+FORMS = {
+    'login': b'csrf_token=Nk3Tz8wq0aXbYb1RfJ2mC7pLsUeV&username=alice%40example.com'
+             b'&password=correct+horse+battery+staple&remember=on',
+    'search': b'q=caf%C3%A9+au+lait&category=drinks&sort=price&order=asc&page=2'
+              b'&tag=hot&tag=organic&tag=fair-trade&min_price=&max_price=10',
+}
+
+HEADERS = BaseHeaders({b'Content-Type': b'application/x-www-form-urlencoded'})
+
+
+def cgi_formdata(raw, headers):
+    """The previous implementation of `formdata`, minus the multipart branch.
+    """
+    environ = {"REQUEST_METHOD": "POST"}
+    _headers = CaseInsensitiveMapping()
+    for k, vals in headers.items():
+        for v in vals:
+            _headers.add(k.decode('ascii'), v.decode('ascii'))
+    parsed = cgi.FieldStorage(
+        fp=BytesIO(raw),
+        environ=environ,
+        headers=_headers,
+        keep_blank_values=True,
+        strict_parsing=False,
+    )
+    result = Mapping()
+    for k in parsed.keys():
+        vals = parsed[k]
+        if not isinstance(vals, list):
+            vals = [vals]
+        for v in vals:
+            if v.filename is None:
+                v = v.value
+                if isinstance(v, bytes):
+                    v = v.decode("UTF-8")
+            result.add(k, v)
+    return result
+
+
+def main(n=20000):
+    for name, raw in FORMS.items():
+        headers = BaseHeaders(HEADERS)
+        headers[b'Content-Length'] = str(len(raw)).encode('ascii')
+        if cgi is not None:
+            assert cgi_formdata(raw, headers) == parse_urlencoded(raw)
+            t = min(repeat(lambda: cgi_formdata(raw, headers), number=n, repeat=5))
+            print('%-6s cgi.FieldStorage  %8.2f µs/body' % (name, t / n * 1e6))
+        t = min(repeat(lambda: parse_urlencoded(raw, 1000, 1024), number=n, repeat=5))
+        print('%-6s parse_urlencoded  %8.2f µs/body' % (name, t / n * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,107 @@
+"""Compare the cost of common operations on headers objects.
+
+``BaseHeaders`` is compared to the class it replaced, which stacked
+``BytesMapping`` over ``CaseInsensitiveMapping``. The serialization of
+response headers for WSGI is compared to the transcoding of every header that
+``Response.to_wsgi`` used to do.
+
+Usage::
+
+    python benchmarks/bench_headers.py [number_of_iterations]
+
+"""
+
+from http.cookies import SimpleCookie
+import sys
+from timeit import repeat
+
+from pando.http.baseheaders import BaseHeaders, ResponseHeaders, _check_for_CRLF
+from pando.http.mapping import BytesMapping, CaseInsensitiveMapping
+
+
+class OldHeaders(BytesMapping, CaseInsensitiveMapping):
+
+    def __init__(self, headers=()):
+        super().__init__(headers)
+        self.cookie = SimpleCookie()
+        cookie = self.get(b'Cookie', b'')
+        if isinstance(cookie, bytes):
+            cookie = cookie.decode('ascii', 'replace')
+        self.cookie.load(cookie)
+
+    def __setitem__(self, name, value):
+        _check_for_CRLF(value)
+        super().__setitem__(name, value)
+
+    def add(self, name, value):
+        _check_for_CRLF(value)
+        super().add(name, value)
+
+
+REQUEST_HEADERS = {
+    b'HOST': b'example.com',
+    b'USER-AGENT': b'Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0',
+    b'ACCEPT': b'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    b'ACCEPT-LANGUAGE': b'en-US,en;q=0.5',
+    b'ACCEPT-ENCODING': b'gzip, deflate, br',
+    b'CONNECTION': b'keep-alive',
+    b'REFERER': b'https://example.com/',
+    b'X-FORWARDED-FOR': b'203.0.113.7',
+    b'X-FORWARDED-PROTO': b'https',
+}
+
+
+def request_headers(cls):
+    # Parse the request headers and look up a few of them.
+    headers = cls(REQUEST_HEADERS)
+    headers.get(b'Host')
+    headers.get(b'Content-Length')
+    headers.get(b'X-Forwarded-Proto')
+    headers.get(b'Accept')
+    headers.get(b'If-None-Match')
+
+
+def response_headers(cls):
+    # Build the headers of a typical response, then iterate over them.
+    headers = cls()
+    headers[b'Content-Type'] = b'text/html; charset=UTF-8'
+    headers[b'Cache-Control'] = b'no-cache'
+    headers.add(b'Vary', b'Accept')
+    headers.add(b'Vary', b'Cookie')
+    b'Content-Length' in headers
+    headers.items()
+
+
+def old_wsgi_headers(headers):
+    return [
+        (k.decode('ascii'), v.decode('ascii'))
+        for k, vals in headers.items() for v in vals
+    ]
+
+
+def wsgi_headers(cls):
+    # Build the headers of a typical response, then serialize them for WSGI.
+    headers = cls()
+    headers[b'Content-Type'] = b'text/html; charset=UTF-8'
+    headers[b'Content-Length'] = b'1234'
+    headers[b'Cache-Control'] = b'no-cache'
+    headers.add(b'Vary', b'Accept')
+    if cls is ResponseHeaders:
+        headers.native_items()
+    else:
+        old_wsgi_headers(headers)
+
+
+def main(n=50000):
+    for label, f, classes in (
+        ('request', request_headers, (OldHeaders, BaseHeaders)),
+        ('response', response_headers, (OldHeaders, BaseHeaders)),
+        ('wsgi', wsgi_headers, (BaseHeaders, ResponseHeaders)),
+    ):
+        for cls in classes:
+            t = min(repeat(lambda: f(cls), number=n, repeat=5))
+            print('%-8s %-15s %8.2f µs' % (label, cls.__name__, t / n * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
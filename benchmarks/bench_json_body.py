@@ -0,0 +1,70 @@
+"""Measure the cost of parsing a large JSON request body.
+
+The body is an array of small objects, like the ones sent to a bulk-ingest
+endpoint. Three strategies are compared:
+
+- ``str``: decoding the body into a string, then parsing it (the old behavior);
+- ``bytes``: :func:`pando.body_parsers.json_loads`, which parses the bytes
+  directly (with orjson if it's installed);
+- ``incremental``: :func:`pando.body_parsers.iter_json_array`, which parses
+  the body one chunk at a time.
+
+For each one the time and the peak of memory allocated (measured with
+:mod:`tracemalloc`, excluding the body itself) are printed.
+
+Usage::
+
+    python benchmarks/bench_json_body.py [number_of_elements]
+
+"""
+
+import json
+import sys
+from time import perf_counter
+import tracemalloc
+
+from pando.body_parsers import iter_json_array, json_loads
+
+
+def make_body(n):
+    return json.dumps([
+        {"id": i, "name": "item %i" % i, "tags": ["a", "b", "c"], "price": i * 1.25}
+        for i in range(n)
+    ]).encode('ascii')
+
+
+def parse_str(raw):
+    return json.loads(raw.decode('utf8'))
+
+
+def parse_incremental(raw, chunk_size=64 * 1024):
+    chunks = (raw[i:i+chunk_size] for i in range(0, len(raw), chunk_size))
+    count = 0
+    for element in iter_json_array(chunks):
+        count += 1
+    return count
+
+
+def measure(f, raw):
+    durations = []
+    for i in range(3):
+        start = perf_counter()
+        f(raw)
+        durations.append(perf_counter() - start)
+    tracemalloc.start()
+    f(raw)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(durations), peak
+
+
+def main(n=200000):
+    raw = make_body(n)
+    print('body size: %.1f MB' % (len(raw) / 1e6))
+    for name, f in (('str', parse_str), ('bytes', json_loads), ('incremental', parse_incremental)):
+        t, peak = measure(f, raw)
+        print('%-12s %8.1f ms %8.1f MB peak' % (name, t * 1000, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
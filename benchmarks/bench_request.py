@@ -0,0 +1,116 @@
+"""Measure the cost of turning a WSGI environ into a Request object.
+
+The environ mimics the ones built by Gunicorn, with native strings. The second
+measurement also parses the path, querystring and host, with and without the
+website's ``uri_cache``. The third one resolves the source of the request
+through two levels of trusted proxies, with and without the cache of
+``trusted_proxies``. The last one uses :mod:`tracemalloc` to count the
+bytes allocated for each request that are still in use after parsing, i.e. the
+size of the request's object graph (the environ isn't included).
+
+Usage::
+
+    python benchmarks/bench_request.py [number_of_requests]
+
+"""
+
+import io
+from ipaddress import IPv4Network, IPv6Network
+import sys
+from timeit import repeat
+import tracemalloc
+
+from pando.http.request import Request
+from pando.website import Website
+
+
+ENVIRON = {
+    'REQUEST_METHOD': 'GET',
+    'SCRIPT_NAME': '',
+    'PATH_INFO': '/foo/bar',
+    'QUERY_STRING': 'page=2',
+    'RAW_URI': '/foo/bar?page=2',
+    'SERVER_NAME': '0.0.0.0',
+    'SERVER_PORT': '8000',
+    'SERVER_PROTOCOL': 'HTTP/1.1',
+    'SERVER_SOFTWARE': 'gunicorn/20.1.0',
+    'REMOTE_ADDR': '10.0.0.1',
+    'REMOTE_PORT': '54321',
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': 'http',
+    'wsgi.input': io.BytesIO(),
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False,
+    'wsgi.multiprocess': True,
+    'wsgi.run_once': False,
+    'wsgi.file_wrapper': None,
+    'wsgi.input_terminated': True,
+    'gunicorn.socket': None,
+    'HTTP_HOST': 'example.com',
+    'HTTP_USER_AGENT': 'Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0',
+    'HTTP_ACCEPT': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'HTTP_ACCEPT_LANGUAGE': 'en-US,en;q=0.5',
+    'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br',
+    'HTTP_CONNECTION': 'keep-alive',
+    'HTTP_COOKIE': 'session=0123456789abcdef; theme=dark',
+    'HTTP_REFERER': 'https://example.com/',
+    'HTTP_UPGRADE_INSECURE_REQUESTS': '1',
+    'HTTP_X_FORWARDED_FOR': '203.0.113.7, 173.245.48.1',
+    'HTTP_X_FORWARDED_PROTO': 'https',
+}
+
+# Two proxy levels: a local load balancer, then a CDN with many networks.
+TRUSTED_PROXIES = [
+    ['private'],
+    [IPv4Network('173.245.48.0/20')] +
+    [IPv4Network('%i.%i.0.0/16' % (100 + i // 8, i % 8 * 32)) for i in range(40)] +
+    [IPv6Network('2400:%x::/32' % i) for i in range(20)],
+]
+
+
+def parse_request(website):
+    request = Request.from_wsgi(website, ENVIRON)
+    request.path, request.qs, request.host
+
+
+def measure_memory(website, n=1000):
+    requests = []
+    parse_request(website)  # warm up the caches
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        request = Request.from_wsgi(website, ENVIRON)
+        request.path, request.qs, request.host, request.headers
+        requests.append(request)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / n
+
+
+def resolve_source(website):
+    request = Request.from_wsgi(website, ENVIRON)
+    request.source
+
+
+def main(n=20000):
+    website = Website()
+    t = min(repeat(lambda: Request.from_wsgi(website, ENVIRON), number=n, repeat=5))
+    print('Request.from_wsgi %8.2f µs/request' % (t / n * 1e6))
+    for uri_cache_size in (0, 1000):
+        website = Website(uri_cache_size=uri_cache_size)
+        t = min(repeat(lambda: parse_request(website), number=n, repeat=5))
+        print('uri_cache_size=%-4i %8.2f µs/request' % (uri_cache_size, t / n * 1e6))
+    for cache_size in (0, 1000):
+        website = Website(
+            trusted_proxies=TRUSTED_PROXIES, trusted_proxies_cache_size=cache_size
+        )
+        t = min(repeat(lambda: resolve_source(website), number=n, repeat=5))
+        print('trusted_proxies_cache_size=%-4i %8.2f µs/request' % (cache_size, t / n * 1e6))
+    for uri_cache_size in (0, 1000):
+        website = Website(uri_cache_size=uri_cache_size)
+        size = measure_memory(website)
+        print('uri_cache_size=%-4i %8i bytes/request' % (uri_cache_size, size))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,35 @@
+"""Compare the interpreted and compiled modes of the state chain.
+
+Usage::
+
+    python benchmarks/bench_state_chain.py [number_of_requests]
+
+"""
+
+import sys
+from timeit import timeit
+
+from filesystem_tree import FilesystemTree
+
+from pando.testing.client import Client
+
+
+def main(n=20000):
+    www = FilesystemTree()
+    www.mk(('index.html.spt', '[---]\n[---]\nGreetings, program!'), ('file.txt', 'Hi.'))
+    try:
+        for compiled in (False, True):
+            client = Client(www.root)
+            client.hydrate_website(compile_state_chain=compiled)
+            environ = client.build_wsgi_environ('GET', '/file.txt')
+            respond = client.website.respond
+            respond(dict(environ))  # warm up the caches
+            t = timeit(lambda: respond(dict(environ)), number=n)
+            label = 'compiled' if compiled else 'interpreted'
+            print('%-12s %8.2f µs/request' % (label, t / n * 1e6))
+    finally:
+        www.remove()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -1,8 +1,14 @@
 """
+.. automodule:: pando.access_log
+.. automodule:: pando.asgi
 .. automodule:: pando.body_parsers
+.. automodule:: pando.caching
+.. automodule:: pando.chain
+.. automodule:: pando.compression
 .. automodule:: pando.exceptions
 .. automodule:: pando.http
 .. automodule:: pando.logging
+.. automodule:: pando.metrics
 .. automodule:: pando.state_chain
 .. automodule:: pando.testing
 .. automodule:: pando.utils
@@ -0,0 +1,184 @@
+"""
+:mod:`access_log`
+=================
+
+Structured access logging, in the `JSON Lines <https://jsonlines.org/>`_
+format.
+
+When the :attr:`~pando.website.DefaultConfiguration.access_log_file` option is
+set, the :func:`~pando.state_chain.log_result_of_request` function of the
+state chain builds a record for each request and puts it in the queue of an
+:class:`AccessLog` object, instead of logging a line of text. The records are
+serialized and written by a background thread, so slow disks don't delay the
+responses.
+
+Each record is a JSON object with the following keys:
+
+- ``time``: the Unix timestamp of the end of the request, as a float
+- ``method``: the request method, or ``null`` if the request couldn't be parsed
+- ``path``: the decoded URL path
+- ``status``: the response code, or ``null`` if there is no response
+- ``match``: the path of the file the request was dispatched to, relative to
+  ``www_root``
+- ``bytes``: the length of the response body, if known
+- ``source``: the IP address of the client, see :attr:`.Request.source`
+- ``timings``: the durations of the state chain functions, in milliseconds,
+  if :attr:`~pando.website.DefaultConfiguration.collect_metrics` is on
+
+"""
+
+import atexit
+import json
+from queue import Empty, Full, Queue
+import random
+from threading import Thread
+import time
+import traceback
+
+from .logging import get_logger
+
+
+logger = get_logger(__name__)
+
+_STOP = object()
+
+
+class AccessLog:
+    """A bounded queue of access log records, written to a file by a
+    background thread.
+
+    :arg file: a filesystem path, or a writable text stream
+    :arg int max_queue_size: the maximum number of records waiting to be
+        written, additional records are dropped (and counted in
+        :attr:`dropped`)
+    :arg float sample_rate: the proportion of successful requests that are
+        logged, between 0 and 1 (responses with a status code of 400 or more
+        are always logged)
+
+    """
+
+    def __init__(self, file, max_queue_size=10000, sample_rate=1.0):
+        if isinstance(file, str):
+            self.file = open(file, 'a', encoding='utf8')
+            self.owns_file = True
+        else:
+            self.file = file
+            self.owns_file = False
+        self.sample_rate = sample_rate
+        self.queue = Queue(max_queue_size)
+        self.dropped = 0
+        self.thread = Thread(target=self._run, name='pando-access-log', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def should_log(self, status):
+        """Decide whether a response should be logged, based on its status code
+        and :attr:`sample_rate`.
+        """
+        sample_rate = self.sample_rate
+        if sample_rate >= 1 or status is None or status >= 400:
+            return True
+        return random.random() < sample_rate
+
+    def put(self, record):
+        """Add a record (a dict) to the queue, without blocking.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until all the records in the queue have been written.
+        """
+        self.queue.join()
+
+    def close(self):
+        """Write the remaining records, then stop the background thread.
+        """
+        if not self.thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        self.thread.join()
+        if self.owns_file:
+            self.file.close()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        queue = self.queue
+        while True:
+            records = [queue.get()]
+            # Write all the records that are already waiting in one go
+            while True:
+                try:
+                    records.append(queue.get_nowait())
+                except Empty:
+                    break
+            stop = False
+            lines = []
+            for record in records:
+                if record is _STOP:
+                    stop = True
+                else:
+                    lines.append(json.dumps(record) + '\n')
+            try:
+                self.file.write(''.join(lines))
+                self.file.flush()
+            except Exception:
+                logger.log_dammit("Failed to write the access log:\n" + traceback.format_exc())
+            for record in records:
+                queue.task_done()
+            if stop:
+                break
+
+
+def make_record(website, request, dispatch_result, response, timings):
+    """Build the access log record of a request.
+    """
+    fspath = getattr(dispatch_result, 'match', None)
+    if fspath and fspath.startswith(website.www_root):
+        fspath = fspath[len(website.www_root):] or '/'
+    if request is None:
+        method = path = source = None
+    else:
+        method = request.method
+        path = request.line.uri.path.decoded
+        try:
+            source = request.source
+        except Exception:
+            source = None
+        if source is not None:
+            source = str(source)
+    if response is None:
+        status = length = None
+    else:
+        status = response.code
+        length = _get_body_length(response)
+    record = {
+        'time': time.time(),
+        'method': method,
+        'path': path,
+        'status': status,
+        'match': fspath,
+        'bytes': length,
+        'source': source,
+    }
+    if timings:
+        record['timings'] = {name: ns / 1000000 for name, ns in timings.items()}
+    return record
+
+
+def _get_body_length(response):
+    body = response.body
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    content_length = response.headers.get(b'Content-Length')
+    if content_length:
+        try:
+            return int(content_length)
+        except ValueError:
+            pass
+    try:
+        return len(body)
+    except TypeError:
+        return None
@@ -0,0 +1,22 @@
+"""
+:mod:`asgi`
+===========
+
+Provide an ASGI callable.
+
+This is the asynchronous counterpart of :mod:`pando.wsgi`. Point an ASGI server
+like uvicorn or hypercorn at ``pando.asgi:application``.
+
+"""
+
+from .website import Website
+
+#: An instance of :class:`.Website`.
+website = Website()
+
+
+async def application(scope, receive, send):
+    """This is the ASGI callable, it calls :meth:`website.asgi_app()
+    <pando.website.Website.asgi_app>`.
+    """
+    await website.asgi_app(scope, receive, send)
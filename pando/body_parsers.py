@@ -13,14 +13,40 @@ A body parser has the signature::
 
 where ``raw`` is the raw bytestring to be parsed, and ``headers`` is the
 :class:`.Headers` mapping of the supplied headers.
+
+A body parser can also consume the body incrementally instead of receiving it
+as a single bytestring. Such a parser has a ``streaming`` attribute set to
+:obj:`True`, and the signature::
+
+   def name(chunks, headers, website):
+
+where ``chunks`` is an iterator of bytestrings (see
+:meth:`.Request.iter_body`), and ``website`` is the :class:`.Website` object.
+
+A parser that isn't streaming can have a ``max_body_size`` attribute, in which
+case :meth:`.Request.parse_body` raises :class:`~pando.exceptions.BodyTooLarge`
+without reading the body if its ``Content-Length`` is larger.
+
+JSON documents are parsed from bytes by :func:`json_loads`, which uses
+`orjson <https://pypi.org/project/orjson/>`_ if it's installed. Large JSON
+arrays can also be consumed one element at a time, see
+:meth:`.Request.iter_json_array`.
 """
 
-import cgi
-from io import BytesIO
+import codecs
+import json as _stdlib_json
+import re
+from urllib.parse import unquote as _unquote
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
 
 from . import json
-from .http.mapping import CaseInsensitiveMapping, Mapping
-from .exceptions import MalformedBody
+from .http.mapping import Mapping
+from .http.multipart import MultipartParser, get_boundary
+from .exceptions import BodyTooLarge, MalformedBody
 
 
 def formdata(raw, headers):
@@ -30,42 +56,315 @@ def formdata(raw, headers):
 
     """
 
-    # Force the cgi module to parse as we want. If it doesn't find
-    # something besides GET or HEAD here then it ignores the fp
-    # argument and instead uses environ['QUERY_STRING'] or even
-    # sys.stdin(!). We want it to parse request bodies even if the
-    # method is GET (we already parsed the querystring elsewhere).
-
-    environ = {"REQUEST_METHOD": "POST"}
-    _headers = CaseInsensitiveMapping()
-    for k, vals in headers.items():
-        for v in vals:
-            _headers.add(k.decode('ascii'), v.decode('ascii'))
-    headers = _headers
-    parsed = cgi.FieldStorage(
-        fp=BytesIO(raw),
-        environ=environ,
-        headers=headers,
-        keep_blank_values=True,
-        strict_parsing=False,
-    )
+    content_type = headers.get(b'Content-Type', b'')
+    if content_type.startswith(b'multipart/form-data'):
+        return MultipartParser(get_boundary(content_type)).parse([raw])
+    return parse_urlencoded(raw)
+
+
+def urlencoded(raw, headers, max_fields=None, max_key_length=None):
+    """Parse an ``application/x-www-form-urlencoded`` body.
+
+    The :class:`~pando.website.Website` binds the limits to the values of the
+    :attr:`~pando.website.DefaultConfiguration.form_max_fields` and
+    :attr:`~pando.website.DefaultConfiguration.form_max_key_length` options.
+    See :func:`parse_urlencoded`.
+
+    """
+    return parse_urlencoded(raw, max_fields, max_key_length)
+
+
+def parse_urlencoded(raw, max_fields=None, max_key_length=None):
+    """Parse a urlencoded bytestring into a :class:`~pando.http.mapping.Mapping`.
+
+    The body is decoded as UTF-8 once, then split and unquoted (``+`` means
+    space) in a single pass, like :func:`urllib.parse.parse_qsl` would. Invalid
+    bytes are replaced. Fields without an ``=`` sign get an empty value, and
+    empty fields are ignored.
+
+    A :exc:`ValueError` is raised if there are more than ``max_fields``
+    (non-empty) fields, or if a key is longer than ``max_key_length``
+    characters (before unquoting).
+
+    >>> parse_urlencoded(b'q=caf%C3%A9+au+lait&tag=a&tag=b&empty')
+    {'q': ['café au lait'], 'tag': ['a', 'b'], 'empty': ['']}
+    """
     result = Mapping()
-    for k in parsed.keys():
-        vals = parsed[k]
-        if not isinstance(vals, list):
-            vals = [vals]
-        for v in vals:
-            if v.filename is None:
-                v = v.value
-                if isinstance(v, bytes):
-                    v = v.decode("UTF-8")  # XXX Really?  Always UTF-8?
-            result.add(k, v)
+    if not raw:
+        return result
+    if b'+' in raw:
+        raw = raw.replace(b'+', b' ')
+    get, setitem = dict.get, dict.__setitem__
+    count = 0
+    for field in raw.decode('utf8', 'replace').split('&'):
+        if not field:
+            continue
+        count += 1
+        if max_fields is not None and count > max_fields:
+            raise ValueError("Too many fields in form (limit: %i)" % max_fields)
+        key, _, value = field.partition('=')
+        if max_key_length is not None and len(key) > max_key_length:
+            raise ValueError(
+                "Form field name is too long (limit: %i characters)" % max_key_length
+            )
+        if '%' in key:
+            key = _unquote(key, 'utf8', 'replace')
+        if '%' in value:
+            value = _unquote(value, 'utf8', 'replace')
+        values = get(result, key)
+        if values is None:
+            setitem(result, key, [value])
+        else:
+            values.append(value)
     return result
 
 
+def multipart(chunks, headers, website):
+    """Parse ``multipart/form-data`` incrementally.
+
+    File parts are spooled to disk when they're larger than
+    :attr:`~pando.website.DefaultConfiguration.multipart_spool_threshold`, and
+    the size limits set in the website's configuration are enforced. See
+    :class:`~pando.http.multipart.MultipartParser`.
+
+    """
+    parser = MultipartParser(
+        get_boundary(headers.get(b'Content-Type', b'')),
+        spool_threshold=website.multipart_spool_threshold,
+        max_part_size=website.multipart_max_part_size,
+        max_total_size=website.multipart_max_size,
+    )
+    return parser.parse(chunks)
+
+multipart.streaming = True
+
+
+def json_loads(raw):
+    """Parse a JSON document from a bytestring (or a :class:`bytearray`).
+
+    If :mod:`orjson` is installed then it's used, it parses the bytes without
+    decoding them into a :class:`str` first. orjson is stricter than the
+    standard decoder: for example it doesn't accept ``NaN``, or integers that
+    don't fit in 64 bits. So a document that it rejects is given to the
+    standard decoder only if it contains one of those constructs, otherwise
+    orjson's error is raised without parsing the document a second time. The
+    standard decoder does decode the document into a :class:`str`.
+
+    This function is looked up when the JSON body parsers are called, so it
+    can be replaced by assigning a different decoder to
+    ``pando.body_parsers.json_loads``.
+    """
+    if _orjson is not None:
+        try:
+            return _orjson.loads(raw)
+        except _orjson.JSONDecodeError:
+            if not _ORJSON_REJECTS.search(raw):
+                raise
+    return json.loads(raw)
+
+
+#: Matches the constructs that the standard JSON decoder accepts but orjson
+#: doesn't: ``NaN`` and infinities, integers that may not fit in 64 bits,
+#: exponents that may overflow a float, and unpaired surrogates.
+_ORJSON_REJECTS = re.compile(
+    br'NaN|Infinity|[0-9]{19}|[eE][+-]?[0-9]{3}|\\u[dD][89a-fA-F]'
+)
+
+
 def jsondata(raw, headers):
     """Parse ``raw`` as JSON data."""
     try:
-        return json.loads(raw.decode('utf8'))
+        return json_loads(raw)
     except UnicodeDecodeError as e:
         raise MalformedBody(str(e))
+
+
+class JSONParser:
+    """A JSON body parser with a size limit.
+
+    :arg int max_body_size: the maximum size of a body (in bytes), checked
+        against its ``Content-Length`` before it's read, see
+        :meth:`.Request.parse_body`. :obj:`None` means no limit.
+
+    The body is parsed by :func:`jsondata`.
+    """
+
+    __slots__ = ('max_body_size',)
+
+    def __init__(self, max_body_size=None):
+        self.max_body_size = max_body_size
+
+    def __call__(self, raw, headers):
+        return jsondata(raw, headers)
+
+
+def _check_content_length(headers, max_size):
+    try:
+        length = int(headers.get(b'Content-Length') or b'0')
+    except ValueError:
+        # `Request.iter_body` responds with a 400 error.
+        return
+    if length > max_size:
+        raise BodyTooLarge(max_size)
+
+
+_JSON_WHITESPACE = ' \t\n\r'
+_JSON_DELIMITERS = _JSON_WHITESPACE + ',]'
+
+
+def iter_json_array(chunks, headers=None, max_size=None):
+    """Parse a JSON array incrementally, yielding its elements one by one.
+
+    :arg chunks: an iterable of bytestrings, the UTF-8 encoded JSON document
+    :arg headers: the request's headers, used to check ``Content-Length``
+        against ``max_size`` before reading anything (optional)
+    :arg int max_size: the maximum size of the document, in bytes
+
+    Only one element has to be held in memory at a time, so the document can
+    be much larger than the memory available. Elements are parsed by the
+    standard :class:`json.JSONDecoder`. A :exc:`ValueError` is raised if the
+    document isn't a valid JSON array.
+
+    >>> list(iter_json_array([b' [1, {"a"', b': [2]}, ', b'"x"] ']))
+    [1, {'a': [2]}, 'x']
+    """
+    if max_size is not None and headers is not None:
+        _check_content_length(headers, max_size)
+    raw_decode = _stdlib_json.JSONDecoder().raw_decode
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    chunks = iter(chunks)
+    total = 0
+
+    def read(buf, pos):
+        # Drop the consumed part of the buffer and append the next chunk.
+        nonlocal total
+        chunk = next(chunks, None)
+        if chunk is None:
+            return buf[pos:] + decode(b'', True), 0, True
+        total += len(chunk)
+        if max_size is not None and total > max_size:
+            raise BodyTooLarge(max_size)
+        return buf[pos:] + decode(chunk), 0, False
+
+    buf, pos, eof = '', 0, False
+    expected = '['
+
+    while True:
+        # Skip whitespace, reading more data if we reach the end of the buffer
+        # and there's another token to come.
+        n = len(buf)
+        while pos < n and buf[pos] in _JSON_WHITESPACE:
+            pos += 1
+        if pos == n and not eof:
+            buf, pos, eof = read(buf, pos)
+            continue
+        if pos == n:
+            if expected == 'end':
+                return
+            raise ValueError("Unexpected end of JSON array")
+
+        c = buf[pos]
+        if expected == 'end':
+            raise ValueError("Extra data after the JSON array")
+        elif expected == '[':
+            if c != '[':
+                raise ValueError("The JSON document isn't an array")
+            pos += 1
+            expected = 'first'
+        elif c == ']' and expected != 'value':
+            pos += 1
+            expected = 'end'
+        elif expected == ',':
+            if c != ',':
+                raise ValueError("Expected ',' or ']' in JSON array, got %r" % c)
+            pos += 1
+            expected = 'value'
+        elif c in '{["':
+            # An object, array or string. If it's incomplete, then its end is
+            # found by tracking the nesting depth as more chunks are read, so
+            # that it's decoded only once more, even if it's split across many
+            # chunks.
+            try:
+                value, pos = raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                state = [0, False, False]
+                end = _scan_json_element(buf, pos, state)
+                pieces = [buf[pos:]]
+                while end < 0 and not eof:
+                    buf, pos, eof = read('', 0)
+                    end = _scan_json_element(buf, 0, state)
+                    pieces.append(buf)
+                buf = ''.join(pieces)
+                value, pos = raw_decode(buf, 0)
+            yield value
+            expected = ','
+        else:
+            # A number or a literal. If it can't be parsed, or if it isn't
+            # followed by a delimiter (e.g. a number that continues in the
+            # next chunk), then read more data and retry.
+            try:
+                value, end = raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                end = None
+            if not eof and (end is None or end == len(buf) or buf[end] not in _JSON_DELIMITERS):
+                buf, pos, eof = read(buf, pos)
+                continue
+            yield value
+            pos = end
+            expected = ','
+
+
+_JSON_STRING_SPECIALS = re.compile(r'["\\]')
+_JSON_STRUCTURAL = re.compile(r'["{}\[\]]')
+
+
+def _scan_json_element(text, i, state):
+    """Find the end of the JSON object, array or string that starts at (or
+    continues from) ``text[i]``.
+
+    ``state`` is a list ``[depth, in_string, escaped]``, updated when the end
+    isn't found so that the scan can continue in the next piece of text.
+    Returns the index following the element, or -1.
+    """
+    depth, in_string, escaped = state
+    n = len(text)
+    if escaped:
+        if i >= n:
+            return -1
+        i += 1
+        escaped = False
+    while True:
+        if in_string:
+            m = _JSON_STRING_SPECIALS.search(text, i)
+            if m is None:
+                break
+            i = m.end()
+            if m.group() == '\\':
+                if i >= n:
+                    escaped = True
+                    break
+                i += 1
+                continue
+            in_string = False
+            if depth == 0:
+                return i
+        else:
+            m = _JSON_STRUCTURAL.search(text, i)
+            if m is None:
+                break
+            i = m.end()
+            c = m.group()
+            if c == '"':
+                in_string = True
+            elif c == '{' or c == '[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth <= 0:
+                    return i
+    state[:] = depth, in_string, escaped
+    return -1
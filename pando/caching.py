@@ -0,0 +1,129 @@
+"""
+:mod:`caching`
+==============
+
+An in-process cache of rendered responses.
+
+Caching is opt-in: a simplate enables it by setting ``response_cache_ttl`` to
+a number of seconds in its first page. By default the cache key contains the
+path of the simplate, the values of its path wildcards (e.g. ``%name``), the
+inputs of content negotiation (the file extension in the URL and the
+``Accept`` header) and the querystring. A simplate can add request headers to
+the key by listing their names in ``response_cache_vary``::
+
+    response_cache_ttl = 300
+    response_cache_vary = ['Accept-Language']
+    [---]
+    ...
+
+Only ``200`` responses to ``GET`` and ``HEAD`` requests are cached, and never
+when a cookie is being set. Don't enable caching for pages that depend on who
+the user is, unless the request headers that identify them are in the key.
+"""
+
+from time import monotonic
+
+from aspen.output import Output
+
+from .utils import LRUCache
+
+
+class CachedResponse:
+    """A rendered response, as stored in a :class:`ResponseCache`.
+    """
+
+    __slots__ = ('resource', 'expires', 'headers', 'body', 'media_type', 'charset')
+
+    def __init__(self, resource, expires, headers, output):
+        self.resource = resource
+        self.expires = expires
+        self.headers = headers
+        self.body = output.body
+        self.media_type = output.media_type
+        self.charset = output.charset
+
+    def apply_to(self, response):
+        """Copy the cached body and headers into ``response``, and return an
+        :class:`~aspen.output.Output` object.
+        """
+        headers = response.headers
+        for name, values in self.headers:
+            headers[name] = values[0]
+            for value in values[1:]:
+                headers.add(name, value)
+        response.body = self.body
+        return Output(body=self.body, media_type=self.media_type, charset=self.charset)
+
+
+class ResponseCache:
+    """A size-bounded cache of rendered responses, with expiration.
+
+    :arg int max_size: the maximum number of responses kept in memory, the
+        least recently used ones are evicted first
+
+    The :attr:`hits` and :attr:`misses` counters are incremented by
+    :meth:`lookup`, :attr:`evictions` counts the responses that were dropped to
+    make room for new ones.
+    """
+
+    __slots__ = ('entries', 'hits', 'misses')
+
+    def __init__(self, max_size):
+        self.entries = LRUCache(max_size)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def evictions(self):
+        return self.entries.evictions
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    @staticmethod
+    def get_ttl(resource):
+        """Return the TTL declared by ``resource``, or :obj:`None`.
+        """
+        page_one = getattr(resource, 'page_one', None)
+        if not page_one:
+            return None
+        return page_one.get('response_cache_ttl')
+
+    @staticmethod
+    def make_key(resource, dispatch_result, request, accept_header):
+        """Compute the cache key of a request.
+        """
+        vary = resource.page_one.get('response_cache_vary') or ()
+        headers = request.headers
+        return (
+            dispatch_result.match,
+            tuple(sorted((dispatch_result.wildcards or {}).items())),
+            dispatch_result.extension,
+            accept_header if len(resource.available_types) > 1 else None,
+            bytes(request.line.uri.querystring),
+            tuple(headers.get(name.encode('ascii')) for name in vary),
+        )
+
+    def lookup(self, key, resource):
+        """Return the cached response for ``key``, or :obj:`None`.
+
+        Expired entries, and entries that were rendered by an older version of
+        ``resource`` (before it was reloaded), are discarded.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires > monotonic() and entry.resource is resource:
+                self.hits += 1
+                return entry
+            self.entries.pop(key)
+        self.misses += 1
+        return None
+
+    def store(self, key, resource, ttl, headers, output):
+        """Add a rendered response to the cache.
+        """
+        entry = CachedResponse(resource, monotonic() + ttl, headers, output)
+        self.entries.set(key, entry)
@@ -0,0 +1,294 @@
+"""
+:mod:`chain`
+============
+
+This module contains :class:`CompiledStateChain`, a subclass of `StateChain
+<https://state-chain-py.readthedocs.io/en/latest/#state_chain.StateChain>`_
+that can precompute the dependency injection work it does on every run.
+
+"""
+
+import asyncio
+import inspect
+import sys
+
+from state_chain import FunctionNotFound, StateChain
+from dependency_injection import get_signature
+
+from .utils import monotonic_ns
+
+
+_MISSING = object()
+
+
+class Step:
+    """A precomputed entry in a :class:`CallPlan`.
+    """
+
+    __slots__ = (
+        'function', 'name', 'params', 'wants_exception', 'takes_exception',
+        'is_async',
+    )
+
+    def __init__(self, function):
+        signature = get_signature(function)
+        self.function = function
+        self.name = function.__name__
+        #: A tuple of ``(name, default)`` pairs, with ``default`` set to a
+        #: sentinel for required parameters.
+        self.params = tuple(
+            (name, signature.optional.get(name, _MISSING))
+            for name in signature.parameters
+        )
+        #: Whether this function is skipped when no exception is being handled.
+        self.wants_exception = 'exception' in signature.required
+        #: Whether this function is called when an exception is being handled.
+        self.takes_exception = 'exception' in signature.parameters
+        #: Whether this function is a coroutine function (``async def``).
+        self.is_async = inspect.iscoroutinefunction(function)
+
+    def resolve(self, state):
+        """Return the keyword arguments to call this step's function with.
+        """
+        kwargs = {}
+        for name, default in self.params:
+            if name in state:
+                kwargs[name] = state[name]
+            elif default is not _MISSING:
+                kwargs[name] = default
+        return kwargs
+
+    def __repr__(self):
+        return '<Step %s>' % self.name
+
+
+class CallPlan:
+    """A flat, precomputed plan of how to call the functions of a state chain.
+
+    Resolving the signature of each function and deciding which ones should be
+    skipped while an exception is being handled is done once, when the plan is
+    built, instead of on every run.
+    """
+
+    __slots__ = ('functions', 'steps', 'names', 'next_normal', 'next_handler')
+
+    def __init__(self, functions):
+        self.functions = list(functions)
+        self.steps = [Step(f) for f in self.functions]
+        self.names = [step.name for step in self.steps]
+        n = len(self.steps)
+        # For each position, the index of the next function to call in the
+        # normal flow, and the index of the next exception handler.
+        self.next_normal = [n] * (n + 1)
+        self.next_handler = [n] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            step = self.steps[i]
+            self.next_normal[i] = self.next_normal[i + 1] if step.wants_exception else i
+            self.next_handler[i] = i if step.takes_exception else self.next_handler[i + 1]
+
+    def stop_index(self, return_after):
+        """Return the index of the step to stop *before*.
+        """
+        if return_after is None:
+            return len(self.steps)
+        try:
+            return self.names.index(return_after) + 1
+        except ValueError:
+            raise FunctionNotFound(return_after)
+
+
+class CompiledStateChain(StateChain):
+    """A state chain that runs a precomputed :class:`CallPlan`.
+
+    The plan is built on the first run, and rebuilt whenever the
+    :attr:`functions` list is modified. Set :attr:`compiled` to :obj:`False`
+    to fall back to the behavior of the parent class.
+
+    When :attr:`timed` is :obj:`True`, the time spent in each function is
+    measured with :func:`~pando.utils.monotonic_ns` and stored in
+    ``state['timings']``, a dict mapping function names to durations in
+    nanoseconds. Timing requires the call plan, so it also applies when
+    :attr:`compiled` is :obj:`False`.
+    """
+
+    def __init__(self, *functions, **kw):
+        self.compiled = kw.pop('compiled', True)
+        self.timed = kw.pop('timed', False)
+        super().__init__(*functions, **kw)
+        self._plan = None
+
+    def compile(self):
+        """Build the call plan for the current list of functions, and return it.
+        """
+        self._plan = CallPlan(self.functions)
+        return self._plan
+
+    def get_plan(self):
+        """Return the current call plan, rebuilding it if it's out of date.
+        """
+        plan = self._plan
+        if plan is None or plan.functions != self.functions:
+            plan = self.compile()
+        return plan
+
+    def _prepare(self, state, _raise_immediately, _return_after, kw):
+        plan = self.get_plan()
+        stop = plan.stop_index(_return_after)
+        if state is None:
+            state = {}
+        if kw:
+            state.update(kw)
+        if _raise_immediately is None:
+            _raise_immediately = self.default_raise_immediately
+        if 'chain' not in state:
+            state['chain'] = self
+        if 'state' not in state:
+            state['state'] = state
+        if 'exception' not in state:
+            state['exception'] = None
+        if self.timed:
+            state['timings'] = {}
+        return plan, stop, state, _raise_immediately
+
+    def run(self, state=None, _raise_immediately=None, _return_after=None, **kw):
+        """Run through the functions in the :attr:`functions` list.
+
+        This method has the same signature and semantics as the one it
+        overrides.
+        """
+        if not (self.compiled or self.timed):
+            return super().run(state, _raise_immediately, _return_after, **kw)
+
+        plan, stop, state, _raise_immediately = self._prepare(
+            state, _raise_immediately, _return_after, kw
+        )
+        steps = plan.steps
+        next_normal = plan.next_normal
+        next_handler = plan.next_handler
+        timings = state.get('timings') if self.timed else None
+
+        # The position is shared between the recursive calls of `loop()`, so
+        # that exception handlers pick up where the failing function left off.
+        position = [0]
+
+        def loop(in_except):
+            next_index = next_handler if in_except else next_normal
+            while True:
+                i = next_index[position[0]]
+                if i >= stop:
+                    break
+                position[0] = i + 1
+                step = steps[i]
+                try:
+                    if timings is None:
+                        new_state = step.function(**step.resolve(state))
+                    else:
+                        start = monotonic_ns()
+                        try:
+                            new_state = step.function(**step.resolve(state))
+                        finally:
+                            timings[step.name] = (
+                                timings.get(step.name, 0) + monotonic_ns() - start
+                            )
+                    if new_state is not None:
+                        state.update(new_state)
+                    if in_except and state['exception'] is None:
+                        # exception is cleared, return to normal flow
+                        return
+                except Exception:
+                    if _raise_immediately:
+                        raise
+                    state['exception'] = sys.exc_info()[1]
+                    loop(True)
+                    if in_except:
+                        return
+            if in_except:
+                raise  # exception hasn't been handled, reraise
+
+        loop(False)
+
+        return state
+
+    async def run_async(
+        self, state=None, _raise_immediately=None, _return_after=None, _executor=None, **kw
+    ):
+        """Like :meth:`run`, but coroutine functions in the chain are awaited.
+
+        Regular functions are run in a thread of ``_executor`` (the event
+        loop's default executor if it's :obj:`None`), so that they don't block
+        the event loop. Consecutive regular functions are run in a single
+        thread hop. This method always uses the call plan, regardless of the
+        value of :attr:`compiled`.
+        """
+        plan, stop, state, _raise_immediately = self._prepare(
+            state, _raise_immediately, _return_after, kw
+        )
+        steps = plan.steps
+        next_normal = plan.next_normal
+        next_handler = plan.next_handler
+        timings = state.get('timings') if self.timed else None
+        position = [0]
+        run_in_executor = asyncio.get_running_loop().run_in_executor
+
+        def call(step):
+            if timings is None:
+                return step.function(**step.resolve(state))
+            start = monotonic_ns()
+            try:
+                return step.function(**step.resolve(state))
+            finally:
+                timings[step.name] = timings.get(step.name, 0) + monotonic_ns() - start
+
+        def run_sync(next_index, in_except):
+            # Run regular functions until the next coroutine function or the
+            # end of the chain. Returns `True` if an exception was cleared.
+            while True:
+                i = next_index[position[0]]
+                if i >= stop or steps[i].is_async:
+                    return False
+                position[0] = i + 1
+                new_state = call(steps[i])
+                if new_state is not None:
+                    state.update(new_state)
+                if in_except and state['exception'] is None:
+                    return True
+
+        async def loop(in_except):
+            next_index = next_handler if in_except else next_normal
+            while True:
+                i = next_index[position[0]]
+                if i >= stop:
+                    break
+                step = steps[i]
+                try:
+                    if step.is_async:
+                        position[0] = i + 1
+                        if timings is None:
+                            new_state = await step.function(**step.resolve(state))
+                        else:
+                            start = monotonic_ns()
+                            try:
+                                new_state = await step.function(**step.resolve(state))
+                            finally:
+                                timings[step.name] = (
+                                    timings.get(step.name, 0) + monotonic_ns() - start
+                                )
+                        if new_state is not None:
+                            state.update(new_state)
+                        if in_except and state['exception'] is None:
+                            return
+                    elif await run_in_executor(_executor, run_sync, next_index, in_except):
+                        return
+                except Exception:
+                    if _raise_immediately:
+                        raise
+                    state['exception'] = sys.exc_info()[1]
+                    await loop(True)
+                    if in_except:
+                        return
+            if in_except:
+                raise
+
+        await loop(False)
+
+        return state
@@ -0,0 +1,197 @@
+"""
+:mod:`compression`
+==================
+
+Compression of response bodies, with the ``gzip`` content coding.
+
+Compression is opt-in, it's enabled by the
+:attr:`~pando.website.DefaultConfiguration.compress_responses` option. The
+:func:`~pando.state_chain.compress_response` function of the state chain then
+compresses the body of a ``200`` response if:
+
+- its media type is listed in
+  :attr:`~pando.website.DefaultConfiguration.compressible_media_types`;
+- it doesn't already have a ``Content-Encoding``;
+- the client accepts the ``gzip`` coding, according to the ``Accept-Encoding``
+  header of the request;
+- the body is at least
+  :attr:`~pando.website.DefaultConfiguration.compression_min_size` bytes long,
+  or it's an iterator (streamed bodies are compressed on the fly).
+
+``Accept-Encoding`` is added to the ``Vary`` header of all the responses that
+have a compressible media type, and the ``ETag`` of a compressed response is
+made weak, since the compressed bytes depend on the compression level.
+Responses to ``HEAD`` requests get the same headers as the matching ``GET``
+responses.
+
+Static files are only compressed once: the result is kept in a
+:class:`StaticVariants` cache until the file is modified. When a file has a
+precompressed sibling that is at least as recent as itself (e.g. ``app.js.gz``
+next to ``app.js``), the sibling is served instead, so no CPU time is spent on
+compression. Static files that are too large to be loaded in memory (see
+:attr:`~pando.website.DefaultConfiguration.static_files_streaming_threshold`)
+are only compressed if they have such a sibling.
+
+The Python standard library doesn't include a Brotli compressor, so ``gzip`` is
+the only coding supported.
+"""
+
+import os
+import zlib
+
+from .utils import LRUCache
+
+
+def accepts_gzip(accept_encoding):
+    """Return :obj:`True` if the ``gzip`` coding is acceptable according to the
+    given ``Accept-Encoding`` header value (a bytestring).
+
+    >>> accepts_gzip(b'gzip, deflate, br')
+    True
+    >>> accepts_gzip(b'br;q=1.0, gzip;q=0')
+    False
+    >>> accepts_gzip(b'*')
+    True
+    >>> accepts_gzip(b'identity')
+    False
+    """
+    wildcard = False
+    for item in accept_encoding.split(b','):
+        coding, _, params = item.partition(b';')
+        coding = coding.strip().lower()
+        if coding == b'gzip' or coding == b'x-gzip':
+            return _get_qvalue(params) > 0
+        if coding == b'*':
+            wildcard = _get_qvalue(params) > 0
+    return wildcard
+
+
+def _get_qvalue(params):
+    for param in params.split(b';'):
+        name, _, value = param.partition(b'=')
+        if name.strip().lower() == b'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 0
+    return 1
+
+
+def add_vary(headers, name):
+    """Add ``name`` (a bytestring) to the ``Vary`` header, unless it's already
+    listed. Existing values are merged into a single header.
+
+    >>> from pando.http.baseheaders import BaseHeaders
+    >>> headers = BaseHeaders({b'Vary': b'Accept'})
+    >>> add_vary(headers, b'Accept-Encoding'); add_vary(headers, b'Accept-Encoding')
+    >>> headers.all(b'Vary')
+    [b'Accept, Accept-Encoding']
+    """
+    values = headers.all(b'Vary')
+    if not values:
+        headers[b'Vary'] = name
+        return
+    lowered = name.lower()
+    for value in values:
+        for item in value.split(b','):
+            item = item.strip().lower()
+            if item == lowered or item == b'*':
+                if len(values) > 1:
+                    headers[b'Vary'] = b', '.join(values)
+                return
+    headers[b'Vary'] = b', '.join(values + [name])
+
+
+def is_compressible(content_type, media_types):
+    """Return :obj:`True` if the media type of the given ``Content-Type``
+    header value (a bytestring) is in ``media_types`` (a set of strings).
+    """
+    media_type = content_type.split(b';', 1)[0].strip().lower()
+    return media_type.decode('ascii', 'replace') in media_types
+
+
+def gzip_compress(data, level=6):
+    """Compress a bytestring into the ``gzip`` format.
+
+    Unlike :func:`gzip.compress`, the modification time in the header is zero,
+    so the output only depends on the input and the level.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_chunks(chunks, charset, level=6):
+    """Compress an iterable of strings into the ``gzip`` format, one chunk at
+    a time. The iterable is closed when the returned generator is.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode(charset)
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class StaticVariants:
+    """A size-bounded cache of the compressed versions of static files.
+
+    :arg int max_size: the maximum number of variants kept in the cache, the
+        least recently used ones are evicted first
+
+    Variants are keyed by file path and compression level.
+    """
+
+    __slots__ = ('entries',)
+
+    def __init__(self, max_size):
+        self.entries = LRUCache(max_size)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    def get(self, fspath, level=6, streaming_threshold=None):
+        """Return the compressed version of the file at ``fspath``.
+
+        The return value is either a bytestring, or the path of a precompressed
+        file that is too large to be loaded in memory, or :obj:`None` if the
+        file is too large to be compressed on the fly.
+        """
+        try:
+            st = os.stat(fspath)
+        except OSError:
+            return None
+        version = (st.st_mtime_ns, st.st_size)
+        key = (fspath, level)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        variant = self._load(fspath, st, level, streaming_threshold)
+        self.entries.set(key, (version, variant))
+        return variant
+
+    @staticmethod
+    def _load(fspath, st, level, streaming_threshold):
+        gz_path = fspath + '.gz'
+        try:
+            gz_st = os.stat(gz_path)
+        except OSError:
+            gz_st = None
+        if gz_st is not None and gz_st.st_mtime_ns >= st.st_mtime_ns:
+            if streaming_threshold is not None and gz_st.st_size >= streaming_threshold:
+                return gz_path
+            with open(gz_path, 'rb') as f:
+                return f.read()
+        if streaming_threshold is not None and st.st_size >= streaming_threshold:
+            return None
+        with open(fspath, 'rb') as f:
+            return gzip_compress(f.read(), level)
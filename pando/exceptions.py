@@ -36,6 +36,16 @@ class UnknownBodyType(Response):
         Response.__init__(self, code=415, body="Unknown body Content-Type: %s" % ctype)
 
 
+class BodyTooLarge(Response):
+    """
+    A 413 :class:`.Response` raised if the body of a request exceeds a size limit.
+    """
+    def __init__(self, limit):
+        Response.__init__(
+            self, code=413, body="Request body is too large (limit: %i bytes)." % limit
+        )
+
+
 class BadLocation(Response):
     """
     A 500 :class:`.Response` raised if an invalid redirect is attempted.
@@ -8,6 +8,9 @@
 .. automodule:: pando.http.mapping
     :inherited-members:
     :show-inheritance:
+.. automodule:: pando.http.multipart
+.. automodule:: pando.http.proxies
+.. automodule:: pando.http.ranges
 .. automodule:: pando.http.request
     :inherited-members:
     :show-inheritance:
@@ -5,7 +5,7 @@
 
 from http.cookies import CookieError, SimpleCookie
 
-from .mapping import BytesMapping, CaseInsensitiveMapping
+from .mapping import NO_DEFAULT, BytesMapping, CaseInsensitiveMapping
 
 
 def _check_for_CRLF(value):
@@ -32,40 +32,181 @@ class BaseHeaders(BytesMapping, CaseInsensitiveMapping):
     `What character encoding should I use for a HTTP header?
     <http://stackoverflow.com/q/4400678/>`_
     have good notes on why we do everything as pure bytes here.
+
+    Like its base classes, this is a :class:`dict` that maps the names of the
+    headers, in title case, to lists of values. The names given to the methods
+    are normalized through an index that is built lazily (see
+    :func:`_normalize`), so looking up a header doesn't call
+    :meth:`bytes.title` every time.
+
+    Names are case-insensitive. Names and values are bytestrings, but they can
+    also be passed as :class:`str` objects, in which case they're encoded using
+    :attr:`encoding`, and values are returned as :class:`str` objects too.
+
+    Subscript assignment replaces all the existing values of a header, whereas
+    subscript access returns the last value. A missing header results in a 400
+    :class:`~pando.http.response.Response` being raised.
+
+    >>> headers = BaseHeaders({b'Content-Type': b'text/plain'})
+    >>> headers.add(b'vary', b'Accept')
+    >>> headers[b'content-type'], headers.get('Vary')
+    (b'text/plain', 'Accept')
+    >>> dict(headers)
+    {b'Content-Type': [b'text/plain'], b'Vary': [b'Accept']}
+
     """
 
+    __slots__ = ('_cookie',)
+
     def __init__(self, headers=()):
         """Takes headers as a dict, or list of items.
         """
-        super().__init__(headers)
+        self.encoding = 'utf8'
+        self.encoding_errors = 'backslashreplace'
+        self._cookie = None
+        if isinstance(headers, BaseHeaders):
+            for key, values in dict.items(headers):
+                _dict_setitem(self, key, list(values))
+        elif isinstance(headers, dict):
+            encode = self._encode
+            values = [
+                value if type(value) is bytes else encode(value)
+                for value in headers.values()
+            ]
+            # Checking all the values at once is much faster than one by one
+            try:
+                joined = b''.join(values)
+            except TypeError:
+                for value in values:
+                    _check_for_CRLF(value)
+            else:
+                if b'\r' in joined or b'\n' in joined:
+                    _check_for_CRLF(joined)
+            for name, value in zip(headers, values):
+                key = _normalize(name if type(name) is bytes else encode(name))
+                existing = _dict_get(self, key)
+                if existing is None:
+                    _dict_setitem(self, key, [value])
+                else:
+                    # Names that only differ by case
+                    existing.append(value)
+        elif headers:
+            for name, value in headers:
+                self[name] = value
 
-        # Cookie
-        # ======
+    def __reduce__(self):
+        state = (
+            {key: list(values) for key, values in dict.items(self)},
+            self.encoding, self.encoding_errors, self._cookie,
+        )
+        return (self.__class__, (), state)
 
-        self.cookie = SimpleCookie()
-        cookie = self.get(b'Cookie', b'')
-        if isinstance(cookie, bytes):
-            cookie = cookie.decode('ascii', 'replace')
-        try:
-            self.cookie.load(cookie)
-        except CookieError:
-            pass  # XXX really?
+    def __setstate__(self, state):
+        headers, self.encoding, self.encoding_errors, self._cookie = state
+        dict.update(self, headers)
 
-    def __setitem__(self, name, value):
-        """Checks for CRLF in ``value``, then calls the superclass method:
+    # Cookie
+    # ======
 
-        .. automethod:: pando.http.mapping.CaseInsensitiveMapping.__setitem__
+    @property
+    def cookie(self):
+        """A :class:`~http.cookies.SimpleCookie` object, loaded from the
+        ``Cookie`` header the first time this property is accessed.
         """
-        _check_for_CRLF(value)
-        super().__setitem__(name, value)
+        cookie = self._cookie
+        if cookie is None:
+            cookie = self._cookie = SimpleCookie()
+            header = self.get(b'Cookie')
+            if header:
+                if isinstance(header, bytes):
+                    header = header.decode('ascii', 'replace')
+                try:
+                    cookie.load(header)
+                except CookieError:
+                    pass  # XXX really?
+        return cookie
 
-    def add(self, name, value):
-        """Checks for CRLF in ``value``, then calls the superclass method:
+    @cookie.setter
+    def cookie(self, cookie):
+        self._cookie = cookie
 
-        .. automethod:: pando.http.mapping.CaseInsensitiveMapping.add
+    @property
+    def has_cookies(self):
+        """:obj:`True` if the :attr:`cookie` jar has been accessed and isn't
+        empty. Unlike checking :attr:`cookie` directly, this doesn't create the
+        jar.
         """
-        _check_for_CRLF(value)
-        super().add(name, value)
+        return bool(self._cookie)
+
+    # Internals
+    # =========
+
+    def _encode(self, s):
+        if isinstance(s, str):
+            return s.encode(self.encoding, self.encoding_errors)
+        return s
+
+    def _decode(self, value):
+        if isinstance(value, bytes):
+            return value.decode(self.encoding, self.encoding_errors)
+        return value
+
+    def _key(self, name):
+        if type(name) is not bytes:
+            return self._encode(name).title()
+        return _normalize(name)
+
+    def _values(self, name):
+        # Returns the list of values for `name`, or `None`. Names are usually
+        # given in title case, so the normalization is skipped if they match.
+        values = _dict_get(self, name)
+        if values is None and (type(name) is not bytes or not name.istitle()):
+            values = _dict_get(self, self._key(name))
+        return values
+
+    # Reading
+    # =======
+
+    def __contains__(self, name):
+        return self._values(name) is not None
+
+    def __getitem__(self, name):
+        """Given a name, return the last value or call :meth:`keyerror`.
+        """
+        values = self._values(name)
+        if values is None:
+            self.keyerror(name)
+        if type(name) is str:
+            return self._decode(values[-1])
+        return values[-1]
+
+    def get(self, name, default=None):
+        """Return the last value of the header, or ``default``.
+        """
+        values = self._values(name)
+        if values is None:
+            return default
+        if type(name) is str:
+            return self._decode(values[-1])
+        return values[-1]
+
+    def all(self, name):
+        """Given a name, return a list of values, possibly empty.
+
+        When ``name`` is a bytestring the list of values stored in the mapping
+        is returned, not a copy.
+        """
+        values = self._values(name)
+        if values is None:
+            return []
+        if type(name) is str:
+            return [self._decode(v) for v in values]
+        return values
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, [
+            (name, value) for name, values in dict.items(self) for value in values
+        ])
 
     @property
     def raw(self):
@@ -76,3 +217,171 @@ class BaseHeaders(BytesMapping, CaseInsensitiveMapping):
             for value in values:
                 out.append(header + b': ' + value)
         return b'\r\n'.join(out)
+
+    # Writing
+    # =======
+
+    def __setitem__(self, name, value):
+        """Checks for CRLF in ``value``, then replaces all the values of the
+        ``name`` header with ``value``. The header is moved to the end.
+        """
+        if type(value) is not bytes:
+            value = self._encode(value)
+        _check_for_CRLF(value)
+        key = self._key(name)
+        _dict_pop(self, key, None)
+        _dict_setitem(self, key, [value])
+
+    def add(self, name, value):
+        """Checks for CRLF in ``value``, then appends it to the values of the
+        ``name`` header.
+        """
+        if type(value) is not bytes:
+            value = self._encode(value)
+        _check_for_CRLF(value)
+        key = self._key(name)
+        values = _dict_get(self, key)
+        if values is None:
+            _dict_setitem(self, key, [value])
+        else:
+            values.append(value)
+
+    def update(self, *a, **kw):
+        """Replace the values of the given headers, like :meth:`__setitem__`.
+        """
+        for name, value in dict(*a, **kw).items():
+            self[name] = value
+
+    def __delitem__(self, name):
+        dict.__delitem__(self, self._key(name))
+
+    def pop(self, name, default=NO_DEFAULT):
+        """Remove the last value of the header and return it.
+
+        If the header is missing, then ``default`` is returned if it was
+        provided, otherwise :meth:`keyerror` is called.
+        """
+        key = self._key(name)
+        values = _dict_get(self, key)
+        if values is None:
+            if default is not NO_DEFAULT:
+                return default
+            self.keyerror(name)
+        value = values.pop()
+        if not values:
+            dict.__delitem__(self, key)
+        return self._decode(value) if type(name) is str else value
+
+    def popall(self, name, *default):
+        """Remove all the values of the header and return them in a list.
+
+        If the header is missing, then ``default`` is returned if it was
+        provided, otherwise :exc:`KeyError` is raised.
+        """
+        values = _dict_pop(self, self._key(name), None)
+        if values is None:
+            if default:
+                return default[0]
+            raise KeyError(name)
+        if type(name) is str:
+            return [self._decode(v) for v in values]
+        return values
+
+    def setdefault(self, name, default=None):
+        values = self._values(name)
+        if values is None:
+            self[name] = default
+            return default
+        return self._decode(values[-1]) if type(name) is str else values[-1]
+
+
+_dict_get = dict.get
+_dict_pop = dict.pop
+_dict_setitem = dict.__setitem__
+
+
+#: The normalized (title case) forms of the header names that have been seen,
+#: filled lazily by :func:`_normalize`.
+_normalized_names = {}
+
+
+def _normalize(name):
+    """Return the title case form of ``name`` (a bytestring).
+    """
+    key = _normalized_names.get(name)
+    if key is None:
+        key = name.title()
+        if len(_normalized_names) < 1000:
+            _normalized_names[name] = key
+    return key
+
+
+#: A cache of the native (`str`) names of response headers, preloaded with
+#: common ones. See :meth:`ResponseHeaders.native_items`.
+_native_names = {
+    name.encode('ascii'): name for name in (
+        'Accept-Ranges', 'Cache-Control', 'Content-Disposition', 'Content-Encoding',
+        'Content-Length', 'Content-Range', 'Content-Type', 'Etag', 'Expires',
+        'Last-Modified', 'Location', 'Set-Cookie', 'Vary', 'X-Frame-Options',
+    )
+}
+_native_names.update((name.lower(), native) for name, native in list(_native_names.items()))
+
+
+def _to_native_pair(name, value):
+    """Return the ``(name, value)`` pair as US-ASCII native strings, for WSGI.
+
+    Raises :exc:`ValueError` if the name or value isn't US-ASCII.
+    """
+    native_name = _native_names.get(name)
+    if native_name is None:
+        try:
+            native_name = name.title().decode('ascii')
+        except UnicodeDecodeError:
+            raise ValueError("Header key %s isn't US-ASCII." % name)
+        if len(_native_names) < 1000:
+            _native_names[name] = native_name
+    try:
+        return native_name, value.decode('ascii')
+    except UnicodeDecodeError:
+        name = name.decode('ascii', 'backslashreplace')
+        value = value.decode('ascii', 'backslashreplace')
+        raise ValueError("Header `%s: %s` isn't US-ASCII." % (name, value))
+
+
+class ResponseHeaders(BaseHeaders):
+    """Represent the headers of an HTTP Response message.
+
+    The :attr:`cookie` jar of a response starts empty, it's never loaded from
+    a ``Cookie`` header. Its morsels are sent as ``Set-Cookie`` headers.
+    """
+
+    __slots__ = ()
+
+    @property
+    def cookie(self):
+        """A :class:`~http.cookies.SimpleCookie` object, created empty the first
+        time this property is accessed.
+        """
+        cookie = self._cookie
+        if cookie is None:
+            cookie = self._cookie = SimpleCookie()
+        return cookie
+
+    @cookie.setter
+    def cookie(self, cookie):
+        self._cookie = cookie
+
+    def native_items(self):
+        """Return the headers as a list of ``(name, value)`` tuples of US-ASCII
+        native strings, with names in title case. Cookies aren't included.
+
+        The names of common headers aren't transcoded, they're looked up in a
+        table of native strings.
+
+        Raises :exc:`ValueError` if a header isn't US-ASCII.
+        """
+        return [
+            _to_native_pair(name, value)
+            for name, values in dict.items(self) for value in values
+        ]
@@ -0,0 +1,288 @@
+"""
+:mod:`multipart`
+----------------
+
+An incremental parser for ``multipart/form-data`` request bodies (`RFC 7578
+<https://tools.ietf.org/html/rfc7578>`_).
+"""
+
+from io import BytesIO
+import re
+from tempfile import SpooledTemporaryFile
+
+from ..exceptions import BodyTooLarge
+from .mapping import Mapping
+
+
+boundary_re = re.compile(r"^[0-9A-Za-z'()+_,\-./:=? ]{0,69}[0-9A-Za-z'()+_,\-./:=?]$")
+
+param_re = re.compile(r""";\s*([^\s;=]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)""")
+
+
+def parse_header_params(value):
+    """Given a header value like ``form-data; name="foo"``, return the main
+    value and a dict of parameters.
+
+    >>> parse_header_params('form-data; name="foo"; filename="a \\\\"b\\\\".txt"')
+    ('form-data', {'name': 'foo', 'filename': 'a "b".txt'})
+
+    """
+    i = value.find(';')
+    if i == -1:
+        return value.strip(), {}
+    params = {}
+    for k, v in param_re.findall(value[i:]):
+        v = v.strip()
+        if v[:1] == '"':
+            v = re.sub(r'\\(.)', r'\1', v[1:-1])
+        params[k.lower()] = v
+    return value[:i].strip(), params
+
+
+def get_boundary(content_type):
+    """Extract the boundary from a ``Content-Type`` header value (bytes).
+
+    Raises :exc:`ValueError` if the boundary is missing or invalid.
+    """
+    content_type = content_type.decode('ascii', 'backslashreplace')
+    boundary = parse_header_params(content_type)[1].get('boundary', '')
+    if not boundary_re.match(boundary):
+        raise ValueError("Invalid boundary in multipart form: %r" % boundary)
+    return boundary.encode('ascii')
+
+
+class UploadedFile:
+    """Represent a file uploaded through a ``multipart/form-data`` form.
+
+    .. attribute:: name
+
+        The name of the form field.
+
+    .. attribute:: filename
+
+        The file name sent by the client. Don't trust it.
+
+    .. attribute:: type
+
+        The media type sent by the client, ``application/octet-stream`` if it
+        didn't send one.
+
+    .. attribute:: headers
+
+        A :class:`dict` of the headers of the part, with lowercase names.
+
+    .. attribute:: file
+
+        A file-like object containing the data. Small files are kept in memory,
+        larger ones are spooled to a temporary file on disk.
+
+    """
+
+    __slots__ = ('name', 'filename', 'type', 'headers', 'file', '_value')
+
+    def __init__(self, name, filename, type, headers, file):
+        self.name = name
+        self.filename = filename
+        self.type = type
+        self.headers = headers
+        self.file = file
+
+    @property
+    def value(self):
+        """The content of the file, as :class:`bytes`. This attribute is
+        writable, for compatibility with :class:`cgi.FieldStorage`.
+        """
+        try:
+            return self._value
+        except AttributeError:
+            pass
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0)
+        return data
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    def close(self):
+        self.file.close()
+
+    def __repr__(self):
+        return '<UploadedFile %r (%s)>' % (self.filename, self.type)
+
+
+class MultipartParser:
+    """Parse a ``multipart/form-data`` body from an iterable of chunks.
+
+    :arg bytes boundary: the boundary string, from the ``Content-Type`` header
+    :arg int spool_threshold: file parts larger than this number of bytes are
+        written to a temporary file instead of being kept in memory
+    :arg int max_part_size: the maximum size of a single part, in bytes
+    :arg int max_total_size: the maximum size of the whole body, in bytes
+    :arg int max_header_size: the maximum size of the headers of a part
+
+    A :class:`~pando.exceptions.BodyTooLarge` exception is raised when a size
+    limit is exceeded, and a :exc:`ValueError` if the body is malformed.
+    """
+
+    def __init__(self, boundary, spool_threshold=1024*1024, max_part_size=None,
+                 max_total_size=None, max_header_size=16*1024):
+        self.delimiter = b'--' + boundary
+        self.spool_threshold = spool_threshold
+        self.max_part_size = max_part_size
+        self.max_total_size = max_total_size
+        self.max_header_size = max_header_size
+
+    def parse(self, chunks):
+        """Consume ``chunks`` and return a :class:`~pando.http.mapping.Mapping`.
+
+        Text fields are decoded as UTF-8, file fields are :class:`UploadedFile`
+        objects. If parsing fails, the files that have already been created
+        are closed before the exception is propagated.
+        """
+        files = []
+        try:
+            return self._parse(chunks, files)
+        except BaseException:
+            for f in files:
+                f.close()
+            raise
+
+    def _parse(self, chunks, files):
+        result = Mapping()
+        delimiter = self.delimiter
+        separator = b'\r\n' + delimiter
+        tail_size = len(separator) + 1
+        max_part_size = self.max_part_size
+        max_total_size = self.max_total_size
+
+        buf = bytearray()
+        total = 0
+        state = 'start'
+        part = None
+        part_size = 0
+
+        for chunk in chunks:
+            total += len(chunk)
+            if max_total_size is not None and total > max_total_size:
+                raise BodyTooLarge(max_total_size)
+            buf += chunk
+
+            while True:
+                if state == 'start':
+                    if len(buf) < len(delimiter):
+                        break
+                    if buf[:len(delimiter)] == delimiter:
+                        del buf[:len(delimiter)]
+                        state = 'delimiter'
+                    else:
+                        state = 'preamble'
+
+                elif state == 'preamble':
+                    i = buf.find(separator)
+                    if i == -1:
+                        # Discard the preamble, but keep enough bytes to detect
+                        # a delimiter split across chunks.
+                        if len(buf) > tail_size:
+                            del buf[:-tail_size]
+                        break
+                    del buf[:i + len(separator)]
+                    state = 'delimiter'
+
+                elif state == 'delimiter':
+                    if len(buf) < 2:
+                        break
+                    if buf[:2] == b'--':
+                        state = 'end'
+                        del buf[:]
+                        break
+                    # Ignore transport padding, per RFC 2046 section 5.1.1.
+                    i = buf.find(b'\r\n')
+                    if i == -1:
+                        if len(buf) > 1024:
+                            raise ValueError("Malformed multipart delimiter line")
+                        break
+                    if buf[:i].strip(b' \t'):
+                        raise ValueError("Malformed multipart delimiter line")
+                    del buf[:i + 2]
+                    state = 'headers'
+
+                elif state == 'headers':
+                    if len(buf) < 2:
+                        break
+                    if buf[:2] == b'\r\n':
+                        # A part without any headers.
+                        raw_headers, end = b'', 2
+                    else:
+                        i = buf.find(b'\r\n\r\n')
+                        if i == -1:
+                            if len(buf) > self.max_header_size:
+                                raise BodyTooLarge(self.max_header_size)
+                            break
+                        raw_headers, end = bytes(buf[:i]), i + 4
+                    part = self._start_part(raw_headers)
+                    if part[2] is not None:
+                        files.append(part[1])
+                    del buf[:end]
+                    part_size = 0
+                    state = 'body'
+
+                elif state == 'body':
+                    i = buf.find(separator)
+                    if i == -1:
+                        n = len(buf) - tail_size
+                        if n > 0:
+                            part_size += n
+                            if max_part_size is not None and part_size > max_part_size:
+                                raise BodyTooLarge(max_part_size)
+                            part[1].write(buf[:n])
+                            del buf[:n]
+                        break
+                    part_size += i
+                    if max_part_size is not None and part_size > max_part_size:
+                        raise BodyTooLarge(max_part_size)
+                    part[1].write(buf[:i])
+                    del buf[:i + len(separator)]
+                    self._finish_part(part, result)
+                    part = None
+                    state = 'delimiter'
+
+                else:  # state == 'end'
+                    del buf[:]
+                    break
+
+        if state == 'start' and total == 0:
+            return result
+        if state != 'end':
+            raise ValueError("Unexpected end of multipart body")
+        return result
+
+    def _start_part(self, raw_headers):
+        headers = {}
+        for line in raw_headers.split(b'\r\n'):
+            if not line:
+                continue
+            name, sep, value = line.partition(b':')
+            if not sep:
+                raise ValueError("Malformed header in multipart body: %r" % line)
+            headers[name.strip().decode('ascii').lower()] = value.strip().decode('utf8')
+        disposition, params = parse_header_params(headers.get('content-disposition', ''))
+        if disposition != 'form-data' or 'name' not in params:
+            raise ValueError("Missing or invalid Content-Disposition in multipart body")
+        filename = params.get('filename')
+        if filename is None:
+            return (params['name'], BytesIO(), None)
+        f = SpooledTemporaryFile(max_size=self.spool_threshold)
+        content_type = headers.get('content-type') or 'application/octet-stream'
+        upload = UploadedFile(params['name'], filename, content_type, headers, f)
+        return (params['name'], f, upload)
+
+    @staticmethod
+    def _finish_part(part, result):
+        name, data, upload = part
+        if upload is None:
+            result.add(name, data.getvalue().decode('utf8'))
+        else:
+            upload.file.seek(0)
+            result.add(name, upload)
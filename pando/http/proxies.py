@@ -0,0 +1,216 @@
+"""
+:mod:`proxies`
+--------------
+
+Identification of the clients of requests that went through reverse proxies.
+
+The :attr:`~pando.website.DefaultConfiguration.trusted_proxies` option is
+compiled into a :class:`TrustedProxies` object: the networks of each proxy
+level are converted into sorted tables of integer ranges, which are searched
+with :func:`~bisect.bisect_right` instead of testing the networks one by one.
+The results are cached, keyed by the values of ``REMOTE_ADDR`` and of the
+forwarding header.
+
+Two forwarding headers are supported: ``X-Forwarded-For``, and the
+``Forwarded`` header defined by `RFC 7239 <https://tools.ietf.org/html/rfc7239>`_
+(see the :attr:`~pando.website.DefaultConfiguration.trusted_proxies_header`
+option).
+"""
+
+from bisect import bisect_right
+from ipaddress import ip_address
+
+from ..utils import LRUCache
+from .response import Response
+
+
+class ProxyLevel:
+    """A compiled list of networks, the trusted addresses of a proxy level.
+
+    :arg networks: a list of :class:`~ipaddress.IPv4Network` and
+        :class:`~ipaddress.IPv6Network` objects, it can also contain the
+        special value ``'private'``
+
+    >>> from ipaddress import IPv4Network
+    >>> level = ProxyLevel([IPv4Network('10.0.0.0/8'), IPv4Network('11.0.0.0/8')])
+    >>> level.ranges[4]
+    ([167772160], [201326591])
+    >>> ip_address('11.1.2.3') in level, ip_address('12.0.0.1') in level
+    (True, False)
+    """
+
+    __slots__ = ('private', 'ranges')
+
+    def __init__(self, networks):
+        self.private = False
+        ranges = {4: [], 6: []}
+        for network in networks:
+            if network == 'private':
+                self.private = True
+                continue
+            ranges[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+        #: Maps IP versions to ``(starts, ends)`` tuples of sorted lists, with
+        #: overlapping and adjacent ranges merged.
+        self.ranges = {version: _merge(r) for version, r in ranges.items()}
+
+    def __contains__(self, addr):
+        if self.private and addr.is_private:
+            return True
+        starts, ends = self.ranges[addr.version]
+        n = int(addr)
+        i = bisect_right(starts, n) - 1
+        return i >= 0 and n <= ends[i]
+
+
+def _merge(ranges):
+    starts, ends = [], []
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class TrustedProxies:
+    """The compiled form of the
+    :attr:`~pando.website.DefaultConfiguration.trusted_proxies` option.
+
+    :arg list trusted_proxies: see the option's documentation
+    :arg str header: the name of the forwarding header, ``'X-Forwarded-For'``
+        or ``'Forwarded'``
+    :arg int cache_size: the maximum number of results kept in memory by
+        :meth:`resolve`, 0 disables the cache
+    """
+
+    __slots__ = ('trusted_proxies', 'header', 'header_name', 'forwarded', 'levels', 'cache')
+
+    def __init__(self, trusted_proxies, header='X-Forwarded-For', cache_size=1000):
+        if header.lower() not in ('x-forwarded-for', 'forwarded'):
+            raise ValueError("unsupported forwarding header %r" % header)
+        self.trusted_proxies = trusted_proxies
+        self.header = header
+        #: The name of the forwarding header, as a bytestring.
+        self.header_name = header.encode('ascii')
+        self.forwarded = header.lower() == 'forwarded'
+        self.levels = [ProxyLevel(networks) for networks in trusted_proxies]
+        self.cache = LRUCache(cache_size) if cache_size else None
+
+    def resolve(self, remote_addr, header_value):
+        """Determine where a request came from.
+
+        :arg bytes remote_addr: the IP address of the peer (the ``REMOTE_ADDR``
+            WSGI variable), or :obj:`None`
+        :arg bytes header_value: the value of the forwarding header, or
+            :obj:`None`
+
+        Returns a 3-tuple:
+
+        - the IP address of the client, or :obj:`None` if it's unknown;
+        - :obj:`True` if the request bypassed at least one proxy level,
+          :obj:`False` if it went through all of them, or :obj:`None` if the
+          address of the client is unknown;
+        - the ``proto`` parameter of the ``Forwarded`` header element that
+          identified the client (:obj:`None` if there isn't one).
+
+        Raises a 400 :class:`.Response` if ``remote_addr`` is missing and the
+        last address in the forwarding header is invalid.
+        """
+        cache = self.cache
+        if cache is None:
+            return self._resolve(remote_addr, header_value)
+        key = (remote_addr, header_value)
+        r = cache.get(key)
+        if r is None:
+            r = self._resolve(remote_addr, header_value)
+            cache.set(key, r)
+        return r
+
+    def _resolve(self, remote_addr, header_value):
+        if not header_value:
+            hops = []
+        elif self.forwarded:
+            hops = parse_forwarded_header(header_value)
+        else:
+            hops = [(hop, None) for hop in header_value.split(b',')]
+        proto = None
+        if remote_addr:
+            addr = ip_address(remote_addr.decode('ascii').strip())
+        elif hops:
+            # The WSGI server didn't provide the client's IP address. This
+            # probably means that it received the request through a Unix
+            # socket.
+            node, proto = hops.pop()
+            addr = self._parse_node(node)
+            if addr is None:
+                safe = header_value.decode('ascii', 'backslashreplace')
+                raise Response(
+                    400, "The '%s' header value is invalid: %s" % (self.header, safe)
+                )
+        else:
+            return None, None, None
+        levels = self.levels
+        if not levels or not hops:
+            return addr, bool(levels), proto
+        last_level = levels[-1]
+        for level in levels:
+            if addr not in level:
+                return addr, True, proto
+            node, hop_proto = hops.pop()
+            hop = self._parse_node(node)
+            if hop is None:
+                return addr, True, proto
+            addr, proto = hop, hop_proto
+            if not hops:
+                return addr, level is not last_level, proto
+        return addr, False, proto
+
+    def _parse_node(self, node):
+        """Parse an address from the forwarding header, return :obj:`None` if
+        it's invalid.
+        """
+        try:
+            node = node.decode('ascii').strip()
+            if self.forwarded:
+                # RFC 7239 section 6: the node can include a port, and IPv6
+                # addresses are enclosed in square brackets.
+                if node.startswith('['):
+                    node = node[1:node.index(']')]
+                elif node.count(':') == 1:
+                    node = node.split(':', 1)[0]
+            return ip_address(node)
+        except (UnicodeDecodeError, ValueError):
+            return None
+
+
+def parse_forwarded_header(value):
+    """Parse a ``Forwarded`` header value (bytes).
+
+    Returns a list of ``(for, proto)`` tuples, one for each element of the
+    header, in order. The ``for`` value is a bytestring (empty if it's
+    missing), ``proto`` is a lowercase string or :obj:`None`.
+
+    >>> parse_forwarded_header(b'for=192.0.2.43;proto=HTTPS, for="[2001:db8:cafe::17]:4711"')
+    [(b'192.0.2.43', 'https'), (b'[2001:db8:cafe::17]:4711', None)]
+
+    Quoted strings that contain commas or semicolons aren't supported, such
+    values don't occur in the ``for`` and ``proto`` parameters.
+    """
+    elements = []
+    for element in value.split(b','):
+        node, proto = b'', None
+        for pair in element.split(b';'):
+            name, _, v = pair.partition(b'=')
+            name = name.strip().lower()
+            v = v.strip()
+            if v[:1] == b'"' and v[-1:] == b'"':
+                v = v[1:-1].replace(b'\\', b'')
+            if name == b'for':
+                node = v
+            elif name == b'proto':
+                proto = v.decode('ascii', 'backslashreplace').lower()
+        elements.append((node, proto))
+    return elements
@@ -0,0 +1,84 @@
+"""
+:mod:`ranges`
+-------------
+
+Helpers for range requests (`RFC 7233 <https://tools.ietf.org/html/rfc7233>`_).
+"""
+
+import re
+
+
+range_spec_re = re.compile(br'^\s*([0-9]*)\s*-\s*([0-9]*)\s*$')
+
+#: The maximum number of ranges that a single request can ask for (after
+#: overlapping ranges have been merged). Requests for more are answered with
+#: the full representation.
+MAX_RANGES = 64
+
+
+def parse_range_header(value, size):
+    """Parse a ``Range`` header value (bytes) for a representation of ``size``
+    bytes.
+
+    Returns a list of ``(first, last)`` tuples (both inclusive), sorted and
+    with overlapping or adjacent ranges merged. An empty list means that none
+    of the ranges can be satisfied. :obj:`None` is returned if the header is
+    invalid or uses an unknown unit, in which case it should be ignored.
+
+    >>> parse_range_header(b'bytes=0-4, -3', 10)
+    [(0, 4), (7, 9)]
+    >>> parse_range_header(b'bytes=5-, 2-6', 10)
+    [(2, 9)]
+    >>> parse_range_header(b'bytes=20-', 10)
+    []
+    >>> parse_range_header(b'lines=1-2', 10) is None
+    True
+
+    """
+    unit, sep, specs = value.partition(b'=')
+    if not sep or unit.strip().lower() != b'bytes':
+        return None
+    ranges = []
+    n_specs = 0
+    for spec in specs.split(b','):
+        if not spec.strip():
+            continue
+        n_specs += 1
+        m = range_spec_re.match(spec)
+        if not m:
+            return None
+        first, last = m.groups()
+        if first:
+            first = int(first)
+            if last:
+                last = int(last)
+                if last < first:
+                    return None
+                last = min(last, size - 1)
+            else:
+                last = size - 1
+            if first >= size:
+                continue
+        elif last:
+            suffix_length = int(last)
+            if suffix_length == 0:
+                continue
+            first, last = max(size - suffix_length, 0), size - 1
+        else:
+            return None
+        ranges.append((first, last))
+    if n_specs == 0:
+        return None
+    if not ranges:
+        return ranges
+    ranges.sort()
+    merged = [ranges[0]]
+    for first, last in ranges[1:]:
+        prev_first, prev_last = merged[-1]
+        if first <= prev_last + 1:
+            merged[-1] = (prev_first, max(prev_last, last))
+        else:
+            merged.append((first, last))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
@@ -21,23 +21,28 @@ we use to model each::
 
 """
 
-from ipaddress import ip_address
 import re
 import string
 import sys
+from tempfile import SpooledTemporaryFile
 import traceback
 from urllib.parse import quote, quote_plus
 import warnings
 
-from aspen.http.request import Path as _Path, Querystring as _Querystring
+from aspen.http.request import Path as _Path, PathPart, Querystring as _Querystring
 
 from .. import Response
-from ..exceptions import MalformedBody, UnknownBodyType
-from ..utils import maybe_encode
-from .baseheaders import BaseHeaders as Headers
+from ..body_parsers import iter_json_array
+from ..exceptions import BodyTooLarge, CRLFInjection, MalformedBody, UnknownBodyType
+from ..logging import get_logger
+from ..utils import LRUCache, cached_property, maybe_encode
+from .baseheaders import BaseHeaders as Headers, _check_for_CRLF
 from .mapping import Mapping
 
 
+logger = get_logger(__name__)
+
+
 # WSGI Do Our Best
 # ================
 # Pando is jealous. It wants to pretend that it parsed the HTTP Request itself,
@@ -81,6 +86,135 @@ def make_franken_uri(path, qs):
     return path + qs
 
 
+_MISSING = object()
+_HEADER_PREFIXES = ('HTTP_', b'HTTP_')
+
+class EnvironView(dict):
+    """A WSGI environ, with keys and values transcoded to bytes.
+
+    Almost all the keys and values in a WSGI environ dict are (supposed to be)
+    of type `str`, but Pando wants bytestrings. Instead of converting the whole
+    dict upfront, this class transcodes the variables when they're first
+    accessed. Modifications are stored in the view, the original environ isn't
+    modified.
+
+    An environ whose keys are already bytestrings (like the ones built by
+    Pando's test client) is also supported.
+
+    >>> environ = EnvironView({'REQUEST_METHOD': 'GET', 'wsgi.errors': None})
+    >>> environ[b'REQUEST_METHOD']
+    b'GET'
+    >>> sorted(environ)
+    [b'REQUEST_METHOD', b'wsgi.errors']
+
+    Ref: https://www.python.org/dev/peps/pep-3333/#a-note-on-string-types
+    """
+
+    __slots__ = ('environ', 'complete')
+
+    def __init__(self, environ):
+        super().__init__()
+        self.environ = environ
+        self.complete = False
+
+    def _load(self, key, default):
+        if self.complete:
+            return default
+        if isinstance(key, str):
+            native_key, key = key, key.encode('latin1')
+            value = dict.get(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        else:
+            native_key = key.decode('latin1')
+        environ = self.environ
+        value = environ.get(native_key, _MISSING)
+        if value is _MISSING:
+            value = environ.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _load_all(self):
+        if self.complete:
+            return
+        for k, v in self.environ.items():
+            k = k.encode('latin1') if isinstance(k, str) else k
+            if k not in self:
+                dict.__setitem__(self, k, v.encode('latin1') if isinstance(v, str) else v)
+        self.complete = True
+
+    def __missing__(self, key):
+        value = self._load(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self._load(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        value = dict.get(self, key, _MISSING)
+        if value is _MISSING:
+            value = self._load(key, default)
+        return value
+
+    def setdefault(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            self[key] = value = default
+        return value
+
+    def __delitem__(self, key):
+        self._load_all()
+        super().__delitem__(key)
+
+    def pop(self, *a):
+        self._load_all()
+        return super().pop(*a)
+
+    def popitem(self):
+        self._load_all()
+        return super().popitem()
+
+    def __iter__(self):
+        self._load_all()
+        return super().__iter__()
+
+    def __len__(self):
+        self._load_all()
+        return super().__len__()
+
+    def __eq__(self, other):
+        self._load_all()
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def keys(self):
+        self._load_all()
+        return super().keys()
+
+    def values(self):
+        self._load_all()
+        return super().values()
+
+    def items(self):
+        self._load_all()
+        return super().items()
+
+    def copy(self):
+        self._load_all()
+        return dict(self)
+
+    def __repr__(self):
+        self._load_all()
+        return super().__repr__()
+
+
 def make_franken_headers(environ):
     """Takes a WSGI environ, returns a dict of HTTP headers.
 
@@ -93,9 +227,43 @@ def make_franken_headers(environ):
     return dict((k.replace(b'_', b'-'), v) for k, v in headers if v is not None)
 
 
+def _make_franken_headers_from_native_environ(environ):
+    # Same as `make_franken_headers`, for an environ that contains native
+    # strings, as specified by PEP 3333.
+    headers = {
+        k[5:].replace('_', '-').encode('latin1') if isinstance(k, str) else
+        k[5:].replace(b'_', b'-'):
+        v.encode('latin1') if isinstance(v, str) else v
+        for k, v in environ.items() if k[:5] in _HEADER_PREFIXES
+    }
+    for k in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+        v = environ.get(k)
+        if v is not None:
+            headers[k.replace('_', '-').encode('latin1')] = maybe_encode(v, 'latin1')
+    return headers
+
+
 def kick_against_goad(environ):
     """Kick against the goad. Try to squeeze blood from a stone. Do our best.
+
+    The keys and values of the ``environ`` can be bytestrings, or native strings
+    as specified by PEP 3333. In the latter case only the variables we need are
+    transcoded.
     """
+    if 'REQUEST_METHOD' in environ:
+        get = environ.get
+        method = maybe_encode(environ['REQUEST_METHOD'], 'latin1')
+        uri = make_franken_uri(
+            maybe_encode(get('PATH_INFO', ''), 'latin1'),
+            maybe_encode(get('QUERY_STRING', ''), 'latin1'),
+        )
+        server = maybe_encode(get('SERVER_SOFTWARE', ''), 'latin1')
+        version = maybe_encode(environ['SERVER_PROTOCOL'], 'latin1')
+        headers = _make_franken_headers_from_native_environ(environ)
+        body = get('wsgi.input')
+        return method, uri, server, version, headers, body
+    if not isinstance(environ, EnvironView):
+        environ = EnvironView(environ)
     method = environ[b'REQUEST_METHOD']
     uri = make_franken_uri(
         environ.get(b'PATH_INFO', b''),
@@ -108,6 +276,73 @@ def kick_against_goad(environ):
     return method, uri, server, version, headers, body
 
 
+# ASGI Do Our Best Too
+# ====================
+# The ASGI interface gives us the request metadata in a `scope` dict, and the
+# body as a series of messages. We translate that into a WSGI environ, so that
+# the rest of Pando doesn't have to care which interface the request came from.
+
+async def read_asgi_body(receive, max_size_in_memory=1024*1024):
+    """Read the body of an HTTP request from an `ASGI`_ ``receive`` callable.
+
+    Returns a file-like object, which is spooled to disk if the body is larger
+    than ``max_size_in_memory``.
+
+    .. _ASGI: https://asgi.readthedocs.io/
+    """
+    body = SpooledTemporaryFile(max_size=max_size_in_memory)
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body')
+        if chunk:
+            body.write(chunk)
+        more_body = message.get('more_body', False)
+    body.seek(0)
+    return body
+
+
+def make_environ_from_asgi_scope(scope, body):
+    """Takes an ASGI HTTP connection scope and a body stream, returns a WSGI environ.
+
+    https://asgi.readthedocs.io/en/latest/specs/www.html#wsgi-compatibility
+    """
+    path = scope['path'].encode('utf8').decode('latin1')
+    root_path = scope.get('root_path', '').encode('utf8').decode('latin1')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path,
+        'PATH_INFO': path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'asgi.scope': scope,
+    }
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+        environ['REMOTE_PORT'] = str(client[1])
+    server = scope.get('server')
+    if server:
+        environ['SERVER_NAME'] = server[0]
+        environ['SERVER_PORT'] = str(server[1]) if server[1] is not None else ''
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin1')
+        if name in environ:
+            sep = '; ' if name == 'HTTP_COOKIE' else ', '
+            value = environ[name] + sep + value
+        environ[name] = value
+    return environ
+
+
 ###########
 # Request #
 ###########
@@ -119,12 +354,22 @@ class Request:
 
         See :class:`.Line`.
 
-    .. attribute:: headers
+    The request line is parsed and validated immediately, but the headers and
+    the path and querystring mappings are only parsed when they're first
+    accessed.
 
-        A mapping of HTTP headers. See :class:`.Headers`.
+    The attributes that Pando uses are stored in slots. Instances still have
+    a ``__dict__`` for other attributes (e.g. the ones set by applications),
+    but it's only allocated when it's needed.
 
     """
 
+    __slots__ = (
+        'website', 'server_software', 'body_stream', 'line', 'environ',
+        '_raw_headers', '_headers', '_cleanups', '_body_bytes', 'parsed_body',
+        '_source', '_bypasses_proxy', '_forwarded_proto', '__dict__',
+    )
+
     def __init__(
         self, website, method=b'GET', uri=b'/', server_software=b'',
         version=b'HTTP/1.1', headers={b'Host': b'localhost'}, body=None,
@@ -134,8 +379,25 @@ class Request:
         self.website = website
         self.server_software = server_software
         self.body_stream = body
-        self.line = Line(method, uri, version)
-        self.headers = Headers(headers)
+        self.line = Line(method, uri, version, getattr(website, 'uri_cache', None))
+        self._raw_headers = headers
+        self._headers = None
+        self._cleanups = None
+
+    @property
+    def headers(self):
+        """A mapping of HTTP headers. See :class:`.Headers`.
+        """
+        headers = self._headers
+        if headers is None:
+            headers = self._headers = Headers(self._raw_headers)
+            # The raw headers aren't needed anymore, let them be freed
+            self._raw_headers = None
+        return headers
+
+    @headers.setter
+    def headers(self, headers):
+        self._headers = headers
 
     @classmethod
     def from_wsgi(cls, website, environ):
@@ -145,19 +407,25 @@ class Request:
         go the other direction, but we can't guarantee that we've reconstructed
         the bytes as they were on the wire.
 
-        Almost all the keys and values in a WSGI environ dict are (supposed to
-        be) of type `str`, meaning bytestrings in python 2 and unicode strings
-        in python 3. In this function we normalize them to bytestrings.
-        Ref: https://www.python.org/dev/peps/pep-3333/#a-note-on-string-types
+        The :attr:`environ` attribute of the returned object is an
+        :class:`EnvironView`, its keys and values are bytestrings.
 
         """
         try:
-            environ = {
-                maybe_encode(k, 'latin1'): maybe_encode(v, 'latin1')
-                for k, v in environ.items()
-            }
-            r = cls(website, *kick_against_goad(environ))
-            r.environ = environ
+            method, uri, server, version, headers, body = kick_against_goad(environ)
+            # The `headers` mapping is built lazily, but CRLF injection attempts
+            # are rejected right away. Checking all the values at once is much
+            # faster than checking them one by one.
+            try:
+                joined = b''.join(headers.values())
+            except TypeError:
+                for value in headers.values():
+                    _check_for_CRLF(value)
+            else:
+                if b'\r' in joined or b'\n' in joined:
+                    raise CRLFInjection()
+            r = cls(website, method, uri, server, version, headers, body)
+            r.environ = EnvironView(environ)
             return r
         except UnicodeError as e:
             if website.show_tracebacks:
@@ -215,7 +483,9 @@ class Request:
     def body_bytes(self):
         """Lazily read the whole request body.
 
-        Returns ``b''`` if the request doesn't have a body.
+        The body is read in a single call, which is given the value of the
+        ``Content-Length`` header. Returns ``b''`` if the request doesn't have
+        a body.
         """
         if self.body_stream is None:
             return b''
@@ -224,6 +494,46 @@ class Request:
         self._body_bytes = self.body_stream.read(self.content_length)
         return self._body_bytes
 
+    def iter_body(self, chunk_size=64*1024):
+        """Lazily read the request body, one chunk at a time.
+
+        At most ``Content-Length`` bytes are read. If :attr:`body_bytes` has
+        already been read, then it is returned as a single chunk.
+        """
+        if self.body_stream is None:
+            return
+        if hasattr(self, '_body_bytes'):
+            if self._body_bytes:
+                yield self._body_bytes
+            return
+        remaining = self.content_length
+        read = self.body_stream.read
+        while remaining > 0:
+            chunk = read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def iter_json_array(self, max_size=None):
+        """Parse the body as a JSON array, yielding its elements one at a time.
+
+        This is meant for large bodies, like bulk uploads: the body is read
+        from :attr:`body_stream` incrementally, so only one element is held in
+        memory at a time. ``max_size`` defaults to
+        :attr:`~pando.website.DefaultConfiguration.json_max_body_size`. See
+        :func:`~pando.body_parsers.iter_json_array`.
+
+        Raises :exc:`.MalformedBody` if the body isn't a valid JSON array, and
+        :exc:`.BodyTooLarge` if it exceeds ``max_size``.
+        """
+        if max_size is None:
+            max_size = self.website.json_max_body_size
+        try:
+            yield from iter_json_array(self.iter_body(), self.headers, max_size)
+        except ValueError as e:
+            raise MalformedBody(str(e))
+
     @property
     def body(self):
         """This property calls :meth:`parse_body()` and caches the result.
@@ -239,16 +549,19 @@ class Request:
         self.parsed_body = value
 
     def parse_body(self):
-        """Parses :attr:`body_bytes` using :attr:`headers` to determine which of
-        the :attr:`~pando.website.Website.body_parsers` should be used.
+        """Parses the body using :attr:`headers` to determine which of the
+        :attr:`~pando.website.Website.body_parsers` should be used.
+
+        Streaming parsers (see :mod:`pando.body_parsers`) are given
+        :meth:`iter_body`, the others are given :attr:`body_bytes`.
 
         Raises :exc:`.UnknownBodyType` if the HTTP ``Content-Type`` isn't
-        recognized, and :exc:`.MalformedBody` if the parsing fails.
+        recognized, :exc:`.BodyTooLarge` if the ``Content-Length`` exceeds the
+        parser's ``max_body_size``, and :exc:`.MalformedBody` if the parsing
+        fails.
 
         """
 
-        raw = self.body_bytes
-
         # Note we ignore parameters for now
         content_type = self.headers.get(b"Content-Type", b"").split(b';')[0]
         content_type = content_type.decode('ascii', 'backslashreplace')
@@ -260,7 +573,12 @@ class Request:
 
         parser = self.website.body_parsers.get(content_type, default_parser)
         try:
-            return parser(raw, self.headers)
+            if getattr(parser, 'streaming', False):
+                return parser(self.iter_body(), self.headers, self.website)
+            max_size = getattr(parser, 'max_body_size', None)
+            if max_size is not None and self.content_length > max_size:
+                raise BodyTooLarge(max_size)
+            return parser(self.body_bytes, self.headers)
         except ValueError as e:
             raise MalformedBody(str(e))
 
@@ -276,24 +594,24 @@ class Request:
         `RFC7230 section 5.4 <https://tools.ietf.org/html/rfc7230#section-5.4>`_.
         """
         host = self.headers[b'Host']
-        try:
-            return host.decode('idna')
-        except UnicodeError:
-            raise Response(
-                400,
-                "The 'Host' header is not a valid domain name: %r" % host,
-            )
+        uri_cache = getattr(self.website, 'uri_cache', None)
+        if uri_cache is not None:
+            return uri_cache.decode_host(host)
+        return decode_host(host)
 
     @property
     def scheme(self):
         """The guessed URL scheme of the request, usually 'https' or 'http'.
 
-        If the ``website.trusted_proxies`` list is empty, then the value of the
-        `WSGI`_ variable ``url_scheme`` is returned, otherwise the value of the
-        `X-Forwarded-Proto`_ HTTP header is returned.
-
-        Support for `RFC7239 <https://tools.ietf.org/html/rfc7239>`_ may be
-        added in the future (patches welcome ;-)).
+        If the :attr:`~pando.website.DefaultConfiguration.trusted_proxies` list
+        is empty, then the value of the `WSGI`_ variable ``url_scheme`` is
+        returned, otherwise the value of the `X-Forwarded-Proto`_ HTTP header
+        is returned. If the
+        :attr:`~pando.website.DefaultConfiguration.trusted_proxies_header` option
+        is set to ``'Forwarded'``, then the ``proto`` parameter of the
+        `RFC7239 <https://tools.ietf.org/html/rfc7239>`_ header element that
+        identified the client (see :attr:`source`) is used instead of
+        ``X-Forwarded-Proto``.
 
         If the scheme cannot be determined or isn't in
         :attr:`~pando.website.DefaultConfiguration.known_schemes`,
@@ -306,7 +624,16 @@ class Request:
             https://developer.mozilla.org/docs/Web/HTTP/Headers/X-Forwarded-Proto
         """
         scheme = None
-        if self.website.trusted_proxies or not self.environ.get(b'REMOTE_ADDR'):
+        matcher = self.website.compiled_trusted_proxies
+        behind_proxies = bool(matcher.levels) or not self.environ.get(b'REMOTE_ADDR')
+        if behind_proxies and matcher.forwarded:
+            source = '`proto` parameter of the `Forwarded` header'
+            try:
+                scheme = self._forwarded_proto
+            except AttributeError:
+                self._resolve_source()
+                scheme = self._forwarded_proto
+        elif behind_proxies:
             source = '`X-Forwarded-Proto` header'
             scheme = self.headers.get(b'X-Forwarded-Proto')
             if scheme:
@@ -330,8 +657,11 @@ class Request:
         :class:`~ipaddress.IPv6Address` object).
 
         This property looks at the WSGI ``REMOTE_ADDR`` variable and the HTTP
-        ``X-Forwarded-For`` header, trusting only the proxies listed in
-        :attr:`~pando.website.DefaultConfiguration.trusted_proxies`.
+        forwarding header (``X-Forwarded-For`` by default, see
+        :attr:`~pando.website.DefaultConfiguration.trusted_proxies_header`),
+        trusting only the proxies listed in
+        :attr:`~pando.website.DefaultConfiguration.trusted_proxies`. The result
+        can be :obj:`None` if the address of the client is unknown.
 
         .. warning::
             If the  :attr:`~pando.website.DefaultConfiguration.trusted_proxies`
@@ -340,60 +670,17 @@ class Request:
             address.
 
         """
-        r = self.__dict__.get('source')
-        if r is not None:
-            return r
+        try:
+            return self._source
+        except AttributeError:
+            self._resolve_source()
+            return self._source
 
-        def f():
-            addr = self.environ.get(b'REMOTE_ADDR')
-            forwarded_for = self.headers.get(b'X-Forwarded-For', b'')
-            if addr:
-                addr = ip_address(addr.decode('ascii').strip())
-            else:
-                # The WSGI server didn't provide the client's IP address. This
-                # probably means that it received the request through a Unix
-                # socket.
-                if forwarded_for:
-                    i = forwarded_for.rfind(b',')
-                    try:
-                        addr = ip_address(forwarded_for[i+1:].decode('ascii').strip())
-                    except (UnicodeDecodeError, ValueError):
-                        safe = forwarded_for.decode('ascii', 'backslashreplace')
-                        raise Response(
-                            400,
-                            "The 'X-Forwarded-For' header value is invalid: " + safe,
-                        )
-                    forwarded_for = forwarded_for[:i]
-                else:
-                    return
-            trusted_proxies = self.website.trusted_proxies
-            self.__dict__['bypasses_proxy'] = bool(trusted_proxies)
-            if not trusted_proxies or not forwarded_for:
-                return addr
-            for networks in trusted_proxies:
-                is_trusted = False
-                for network in networks:
-                    is_trusted = addr.is_private if network == 'private' else addr in network
-                    if is_trusted:
-                        break
-                if not is_trusted:
-                    return addr
-                i = forwarded_for.rfind(b',')
-                try:
-                    addr = ip_address(forwarded_for[i+1:].decode('ascii').strip())
-                except (UnicodeDecodeError, ValueError):
-                    return addr
-                if i == -1:
-                    if networks is trusted_proxies[-1]:
-                        break
-                    return addr
-                forwarded_for = forwarded_for[:i]
-            self.__dict__['bypasses_proxy'] = False
-            return addr
-
-        r = f()
-        self.__dict__['source'] = r
-        return r
+    def _resolve_source(self):
+        matcher = self.website.compiled_trusted_proxies
+        self._source, self._bypasses_proxy, self._forwarded_proto = matcher.resolve(
+            self.environ.get(b'REMOTE_ADDR'), self.headers.get(matcher.header_name)
+        )
 
     @property
     def bypasses_proxy(self):
@@ -401,10 +688,11 @@ class Request:
         levels listed in :attr:`~pando.website.DefaultConfiguration.trusted_proxies`,
         and ``True`` if the request bypassed at least one proxy level.
         """
-        if 'bypasses_proxy' not in self.__dict__:
-            # Call the `source` property to get the `bypasses_proxy` boolean.
-            self.source
-        return self.__dict__['bypasses_proxy']
+        try:
+            return self._bypasses_proxy
+        except AttributeError:
+            self._resolve_source()
+            return self._bypasses_proxy
 
     # Special methods
     # ===============
@@ -451,6 +739,33 @@ class Request:
         val = self.headers.get(b'X-Requested-With', b'')
         return val.lower() == b'xmlhttprequest'
 
+    def add_cleanup(self, callback, *args, **kwargs):
+        """Register a function to be called once the response has been sent.
+
+        This is useful to release resources that a streamed response body
+        depends on, for example a database cursor. The callbacks are called in
+        reverse order of registration, by :meth:`run_cleanups`, when the WSGI
+        server closes the response iterator or when :meth:`.Response.to_asgi`
+        has sent the last chunk of the body.
+        """
+        if self._cleanups is None:
+            self._cleanups = []
+        self._cleanups.append((callback, args, kwargs))
+
+    def run_cleanups(self):
+        """Call the functions registered with :meth:`add_cleanup`, then forget
+        them. Exceptions are logged, they don't prevent the other callbacks
+        from being called.
+        """
+        cleanups = self._cleanups
+        self._cleanups = None
+        while cleanups:
+            callback, args, kwargs = cleanups.pop()
+            try:
+                callback(*args, **kwargs)
+            except Exception:
+                logger.log_dammit(traceback.format_exc())
+
 
 # Request -> Line
 # ---------------
@@ -459,12 +774,12 @@ class Line(bytes):
     """Represent the first line of an HTTP Request message.
     """
 
-    def __new__(cls, method, uri, version):
-        """Takes three bytestrings.
+    def __new__(cls, method, uri, version, uri_cache=None):
+        """Takes three bytestrings, and optionally a :class:`URICache`.
         """
         raw = b" ".join([method, uri, version])
         method = Method(method)
-        uri = URI(uri)
+        uri = URI(uri) if uri_cache is None else uri_cache.get_uri(uri)
         version = Version(version)
 
         obj = super(Line, cls).__new__(cls, raw)
@@ -495,6 +810,10 @@ class Method(bytes):
     """Represent the HTTP method in the first line of an HTTP Request message.
     """
 
+    # The standard methods are shared by all requests, so their instances
+    # mustn't have a `__dict__`.
+    __slots__ = []
+
     def __new__(cls, raw):
         """Creates a new Method object.
 
@@ -517,14 +836,28 @@ class Method(bytes):
                            ; any VCHAR, except delimiters
 
         """
+        if cls is Method:
+            obj = _interned_methods.get(raw)
+            if obj is not None:
+                return obj
         decoded = raw.decode('ascii', 'backslashreplace')
         if decoded not in STANDARD_METHODS:  # fast for 99.999% case
             if any(char not in CHARS_ALLOWED_IN_METHOD for char in decoded):
                 raise Response(400, "Your request method violates RFC 7230: %s" % decoded)
 
-        obj = super(Method, cls).__new__(cls, raw)
-        obj.as_text = decoded
-        return obj
+        return super(Method, cls).__new__(cls, raw)
+
+    @property
+    def as_text(self):
+        return self.decode('ascii', 'backslashreplace')
+
+
+# The standard methods are parsed only once, the same objects are reused for
+# all requests.
+_interned_methods = {}
+_interned_methods.update(
+    (method.encode('ascii'), Method(method.encode('ascii'))) for method in STANDARD_METHODS
+)
 
 
 # Request -> Line -> URI
@@ -543,13 +876,34 @@ class URI(bytes):
         parts = raw.split(b'?', 1)
         path = Path(parts[0])
         querystring = Querystring(parts[1] if len(parts) > 1 else b'')
-        decoded = path.decoded
-        if len(parts) > 1:
-            decoded += '?' + querystring.decoded
         obj = super(URI, cls).__new__(cls, raw)
         obj.path = path
         obj.querystring = querystring
-        obj.decoded = decoded
+        return obj
+
+    @cached_property
+    def decoded(self):
+        """The URI decoded to text."""
+        if b'?' in self:
+            return self.path.decoded + '?' + self.querystring.decoded
+        return self.path.decoded
+
+    def copy(self):
+        """Return a new URI object that shares this one's parsing results.
+
+        The mappings of the copy are copied from this object's mappings when
+        they're first accessed, instead of being parsed again, so modifying
+        them doesn't affect this object.
+        """
+        path = bytes.__new__(Path, self.path)
+        path.decoded = self.path.decoded
+        path._template = self.path
+        querystring = bytes.__new__(Querystring, self.querystring)
+        querystring.decoded = self.querystring.decoded
+        querystring._template = self.querystring
+        obj = bytes.__new__(URI, self)
+        obj.path = path
+        obj.querystring = querystring
         return obj
 
 
@@ -570,6 +924,8 @@ class Path(bytes):
         List of :class:`~aspen.http.request.PathPart` instances.
     """
 
+    _template = None
+
     def __new__(cls, raw):
         """Creates a Path object from a raw bytestring.
         """
@@ -578,13 +934,20 @@ class Path(bytes):
         except UnicodeError:
             safe = raw.decode('ascii', 'backslashreplace')
             raise Response(400, "Request path isn't ascii: %s" % safe)
-        mapping = _PathMapping(decoded)
         obj = super(Path, cls).__new__(cls, raw)
         obj.decoded = decoded
-        obj.mapping = mapping
-        obj.parts = mapping.parts
         return obj
 
+    @cached_property
+    def mapping(self):
+        if self._template is not None:
+            return _copy_mapping(self._template.mapping)
+        return _PathMapping(self.decoded)
+
+    @cached_property
+    def parts(self):
+        return self.mapping.parts
+
 
 class _PathMapping(Mapping, _Path):
     __init__ = _Path.__init__
@@ -603,6 +966,8 @@ class Querystring(bytes):
         :class:`.Mapping` of querystring variables.
     """
 
+    _template = None
+
     def __new__(cls, raw):
         """Creates a Querystring object from a raw bytestring.
         """
@@ -611,17 +976,106 @@ class Querystring(bytes):
         except UnicodeError:
             safe = raw.decode('ascii', 'backslashreplace')
             raise Response(400, "Request querystring isn't ascii: %s" % safe)
-        mapping = _QuerystringMapping(decoded)
         obj = super(Querystring, cls).__new__(cls, raw)
         obj.decoded = decoded
-        obj.mapping = mapping
         return obj
 
+    @cached_property
+    def mapping(self):
+        if self._template is not None:
+            return _copy_mapping(self._template.mapping)
+        return _QuerystringMapping(self.decoded)
+
 
 class _QuerystringMapping(Mapping, _Querystring):
     __init__ = _Querystring.__init__
 
 
+def _copy_mapping(mapping):
+    """Return a copy of an HTTP mapping that doesn't share any list of values
+    (or path part) with the original.
+    """
+    cls = mapping.__class__
+    copy = cls.__new__(cls)
+    dict.update(copy, {k: list(v) for k, v in dict.items(mapping)})
+    copy.__dict__.update(mapping.__dict__)
+    parts = getattr(mapping, 'parts', None)
+    if parts is not None:
+        copy.parts = [PathPart(part, _copy_params(part.params)) for part in parts]
+    return copy
+
+
+def _copy_params(params):
+    if not params:
+        # Most path parts don't have parameters
+        return None if params is None else params.__class__()
+    return _copy_mapping(params)
+
+
+# Request -> Line -> URI cache
+# ............................
+
+def decode_host(host):
+    """Decode a ``Host`` header value with the IDNA codec.
+
+    Raises a 400 :class:`.Response` if decoding fails.
+    """
+    try:
+        return host.decode('idna')
+    except UnicodeError:
+        raise Response(
+            400,
+            "The 'Host' header is not a valid domain name: %r" % host,
+        )
+
+
+class URICache:
+    """A size-bounded cache of parsed request URIs and decoded hostnames.
+
+    :arg int max_size: the maximum number of URIs (and of hostnames) kept in
+        memory, the least recently used ones are evicted first
+
+    The cached :class:`URI` objects are never handed out, :meth:`get_uri`
+    returns copies of them (see :meth:`URI.copy`), so the path and querystring
+    mappings of a request can be modified without affecting the other requests.
+
+    The two underlying caches are exposed as the :attr:`uris` and
+    :attr:`hosts` attributes, each one keeps its own
+    :attr:`~pando.utils.LRUCache.hits`, :attr:`~pando.utils.LRUCache.misses`
+    and :attr:`~pando.utils.LRUCache.evictions` counters.
+    """
+
+    __slots__ = ('uris', 'hosts')
+
+    def __init__(self, max_size):
+        #: The :class:`~pando.utils.LRUCache` of parsed :class:`URI` objects.
+        self.uris = LRUCache(max_size)
+        #: The :class:`~pando.utils.LRUCache` of decoded hostnames.
+        self.hosts = LRUCache(max_size)
+
+    def clear(self):
+        self.uris.clear()
+        self.hosts.clear()
+
+    def get_uri(self, raw):
+        """Return a :class:`URI` object for the given bytestring.
+        """
+        uri = self.uris.get(raw)
+        if uri is None:
+            uri = URI(raw)
+            self.uris.set(raw, uri)
+        return uri.copy()
+
+    def decode_host(self, host):
+        """Same as :func:`decode_host`, with caching.
+        """
+        decoded = self.hosts.get(host)
+        if decoded is None:
+            decoded = decode_host(host)
+            self.hosts.set(host, decoded)
+        return decoded
+
+
 # Request -> Line -> Version
 # ..........................
 
@@ -644,6 +1098,13 @@ class Version(bytes):
 
     __slots__ = []
 
+    def __new__(cls, raw):
+        if cls is Version:
+            obj = _interned_versions.get(raw)
+            if obj is not None:
+                return obj
+        return super(Version, cls).__new__(cls, raw)
+
     @property
     def info(self):
         version = versions.get(self, None)
@@ -666,3 +1127,8 @@ class Version(bytes):
 
     def safe_decode(self):
         return self.decode('ascii', 'backslashreplace')
+
+
+# The known versions are only instantiated once, like the standard methods.
+_interned_versions = {}
+_interned_versions.update((raw, Version(raw)) for raw in versions)
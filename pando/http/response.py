@@ -3,27 +3,131 @@
 ---------------
 """
 
+import asyncio
 import os
-import sys
 
 from . import status_strings
-from .baseheaders import BaseHeaders as Headers
+from .baseheaders import BaseHeaders, ResponseHeaders as Headers
 
 
 class CloseWrapper:
     """Conform to WSGI's facility for running code *after* a response is sent.
+
+    :arg request: the :class:`.Request` object, its cleanup callbacks are
+        called by :meth:`close` (see :meth:`.Request.add_cleanup`)
+    :arg body: the iterable of bytestrings to send
+    :arg source: the original body of the response, if ``body`` is a wrapper
+        around it, so that it's closed too
     """
 
-    def __init__(self, request, body):
+    def __init__(self, request, body, source=None):
         self.request = request
         self.body = body
+        self.source = source
 
     def __iter__(self):
         return iter(self.body)
 
     def close(self):
-        # No longer using this since we ripped out Socket.IO support.
-        pass
+        try:
+            for body in (self.body, self.source):
+                close = getattr(body, 'close', None)
+                if close is not None:
+                    close()
+        finally:
+            if self.request is not None:
+                self.request.run_cleanups()
+
+
+class FileBody:
+    """A response body that is read from an open file, one chunk at a time.
+
+    :arg file: a binary file object, it must be seekable
+    :arg int length: the number of bytes to send
+    :arg int offset: the position of the first byte to send
+    :arg int chunk_size: the maximum number of bytes to read at a time
+
+    When the WSGI server provides a ``wsgi.file_wrapper``, and the body extends
+    to the end of the file, then the file is handed over to the server, which
+    allows it to use platform-specific optimizations like ``sendfile()``.
+    """
+
+    __slots__ = ('file', 'length', 'offset', 'chunk_size')
+
+    def __init__(self, file, length, offset=0, chunk_size=64*1024):
+        self.file = file
+        self.length = length
+        self.offset = offset
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        self.file.seek(self.offset)
+        read, chunk_size = self.file.read, self.chunk_size
+        remaining = self.length
+        while remaining > 0:
+            chunk = read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def __len__(self):
+        return self.length
+
+    def close(self):
+        self.file.close()
+
+    def reaches_eof(self):
+        """Returns :obj:`True` if the last byte of the body is the last byte of
+        the file.
+        """
+        try:
+            size = os.fstat(self.file.fileno()).st_size
+        except (AttributeError, OSError):
+            return False
+        return self.offset + self.length >= size
+
+    def __repr__(self):
+        return '<%s %r (%i bytes)>' % (
+            self.__class__.__name__, getattr(self.file, 'name', None), self.length
+        )
+
+
+class MultiRangeBody(FileBody):
+    """A ``multipart/byteranges`` response body (`RFC 7233 Appendix A
+    <https://tools.ietf.org/html/rfc7233#appendix-A>`_).
+
+    :arg file: a binary file object, it must be seekable
+    :arg ranges: a list of ``(first, last)`` tuples, both inclusive
+    :arg int size: the total size of the file
+    :arg bytes content_type: the media type of the file
+    :arg bytes boundary: the string used to separate the parts
+    """
+
+    __slots__ = ('parts', 'epilogue')
+
+    def __init__(self, file, ranges, size, content_type, boundary, chunk_size=64*1024):
+        self.parts = [
+            (
+                b'\r\n--%s\r\nContent-Type: %s\r\nContent-Range: bytes %i-%i/%i\r\n\r\n' % (
+                    boundary, content_type, first, last, size
+                ),
+                FileBody(file, last - first + 1, first, chunk_size),
+            )
+            for first, last in ranges
+        ]
+        self.epilogue = b'\r\n--%s--\r\n' % boundary
+        length = len(self.epilogue) + sum(len(h) + len(b) for h, b in self.parts)
+        super().__init__(file, length, chunk_size=chunk_size)
+
+    def __iter__(self):
+        for part_headers, part_body in self.parts:
+            yield part_headers
+            yield from part_body
+        yield self.epilogue
+
+    def reaches_eof(self):
+        return False
 
 
 class Response(Exception):
@@ -31,13 +135,15 @@ class Response(Exception):
     """
 
     request = None
-    whence_raised = (None, None)
+    _whence_raised = (None, None)
+    _raised_from = None
 
     def __init__(self, code=200, body='', headers=None):
         """Takes an int, a string, a dict.
 
             - code      an HTTP response code, e.g., 404
-            - body      the message body as a string
+            - body      the message body as a string, or an iterable of strings
+                        (e.g. a generator) that is streamed to the client
             - headers   a dict, list, or bytestring of HTTP headers
 
         Code is first because when you're raising your own Responses, they're
@@ -49,7 +155,7 @@ class Response(Exception):
             raise TypeError("'code' must be an integer")
         elif not isinstance(body, (bytes, str)) and not hasattr(body, '__iter__'):
             raise TypeError("'body' must be a string or iterable of strings")
-        elif headers is not None and not isinstance(headers, (dict, list)):
+        elif headers is not None and not isinstance(headers, (dict, list, BaseHeaders)):
             raise TypeError("'headers' must be a dictionary or a list of " +
                             "2-tuples")
 
@@ -58,46 +164,110 @@ class Response(Exception):
         self.body = body
         self.headers = Headers(headers)
 
+    def _native_headers(self):
+        """Return the headers as a list of ``(name, value)`` native strings,
+        including a ``Set-Cookie`` header for each cookie.
+
+        Raises :exc:`ValueError` if a header isn't US-ASCII.
+        """
+        headers = self.headers
+        native = headers.native_items()
+        if headers.has_cookies:
+            native.extend(
+                ('Set-Cookie', morsel.OutputString()) for morsel in headers.cookie.values()
+            )
+        return native
+
+    def _serialize_headers(self):
+        """Return the headers as a list of ``(name, value)`` ASCII bytestrings,
+        including a ``Set-Cookie`` header for each cookie.
+
+        Raises :exc:`ValueError` if a header isn't US-ASCII.
+        """
+        return [(k.encode('ascii'), v.encode('ascii')) for k, v in self._native_headers()]
+
+    def _iter_body(self, charset):
+        body = self.body
+        if isinstance(body, bytes):
+            return (body,)
+        if isinstance(body, str):
+            return (body.encode(charset),)
+        return (x.encode(charset) if not isinstance(x, bytes) else x for x in body)
+
     def to_wsgi(self, environ, start_response, charset):
         wsgi_status = str(self._status_text())
-        for morsel in self.headers.cookie.values():
-            self.headers.add(b'Set-Cookie', morsel.OutputString().encode('ascii'))
-
         # To comply with PEP 3333 headers should be `str` (bytes in py2 and unicode in py3)
-        wsgi_headers = []
-        for k, vals in self.headers.items():
-            try:        # XXX This is a hack. It's red hot, baby.
-                k = k.encode('US-ASCII') if not isinstance(k, bytes) else k
-            except UnicodeEncodeError:
-                raise ValueError("Header key %s isn't US-ASCII." % k)
-            for v in vals:
-                try:    # XXX This also is a hack. It is also red hot, baby.
-                    v = v.encode('US-ASCII') if not isinstance(v, bytes) else v
-                except UnicodeEncodeError:
-                    raise ValueError("Header value %s isn't US-ASCII." % k)
-                if str is bytes:  # python2 shortcut, no need to decode
-                    wsgi_headers.append((k, v))
-                    continue
-                try:
-                    wsgi_headers.append((k.decode('ascii'), v.decode('ascii')))
-                except UnicodeDecodeError:
-                    k = k.decode('ascii', 'backslashreplace')
-                    v = v.decode('ascii', 'backslashreplace')
-                    raise ValueError("Header `%s: %s` isn't US-ASCII." % (k, v))
+        start_response(wsgi_status, self._native_headers())
+        body = self.body
+        request = self.request
+        if isinstance(body, FileBody):
+            file_wrapper = environ.get('wsgi.file_wrapper')
+            if file_wrapper is not None and body.reaches_eof() and (
+                request is None or not request._cleanups
+            ):
+                body.file.seek(body.offset)
+                return file_wrapper(body.file, body.chunk_size)
+            return CloseWrapper(request, body)
+        if isinstance(body, (bytes, str, list, tuple)):
+            return CloseWrapper(request, self._iter_body(charset))
+        # An iterator, stream it
+        return CloseWrapper(request, self._iter_body(charset), source=body)
+
+    async def to_asgi(self, send, charset):
+        """Send this response through an `ASGI`_ ``send`` callable.
 
-        start_response(wsgi_status, wsgi_headers)
+        The body is sent one chunk at a time. Asynchronous iterables are
+        supported in addition to the types of body accepted by :meth:`to_wsgi`.
+        Files and regular iterators are read in a thread of the event loop's
+        default executor, so that they don't block the loop.
+
+        .. _ASGI: https://asgi.readthedocs.io/
+        """
+        await send({
+            'type': 'http.response.start',
+            'status': self.code,
+            'headers': [(k.lower(), v) for k, v in self._serialize_headers()],
+        })
         body = self.body
-        if not isinstance(body, (list, tuple)):
-            body = [body]
-        body = (x.encode(charset) if not isinstance(x, bytes) else x for x in body)
-        return CloseWrapper(self.request, body)
+        try:
+            if hasattr(body, '__aiter__'):
+                try:
+                    async for chunk in body:
+                        if not isinstance(chunk, bytes):
+                            chunk = chunk.encode(charset)
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                finally:
+                    aclose = getattr(body, 'aclose', None)
+                    if aclose is not None:
+                        await aclose()
+            elif isinstance(body, (bytes, str, list, tuple)):
+                for chunk in self._iter_body(charset):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                # Files and iterators can block, so they're read in a thread.
+                run_in_executor = asyncio.get_running_loop().run_in_executor
+                chunks = iter(self._iter_body(charset))
+                try:
+                    while True:
+                        chunk = await run_in_executor(None, next, chunks, None)
+                        if chunk is None:
+                            break
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                finally:
+                    close = getattr(body, 'close', None)
+                    if close is not None:
+                        await run_in_executor(None, close)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if self.request is not None:
+                self.request.run_cleanups()
 
     def __repr__(self):
         return "<Response: %s>" % self._status_text()
 
     def __str__(self):
         body = self.body
-        if len(body) < 500:
+        if hasattr(body, '__len__') and len(body) < 500:
             if not isinstance(body, str):
                 if isinstance(body, bytes):
                     body = body.decode('ascii', 'backslashreplace')
@@ -123,25 +293,50 @@ class Response(Exception):
             body = body.replace(b'\r\r', b'\r')
         return b'\r\n'.join([status_line, headers, b'', body])
 
-    def set_whence_raised(self):
-        """Sets and returns the value of `self.whence_raised`.
-
-        It's a tuple, (filename, linenum) where we were raised from.
-
-        This function needs to be called from inside the `except` block.
+    @property
+    def whence_raised(self):
+        """A tuple, (filename, linenum) where we were raised from, or
+        ``(None, None)`` if :meth:`set_whence_raised` hasn't been called.
 
+        The filename is relative to the project root when the request is
+        known. It's computed when this attribute is first accessed.
         """
-        cls, exception, tb = sys.exc_info()
-        if exception is self:
-            while tb.tb_next is not None:
-                tb = tb.tb_next
-            frame = tb.tb_frame
-            filepath = frame.f_code.co_filename
+        raised_from = self._raised_from
+        if raised_from is not None:
+            filepath, linenum = raised_from
             # Try to return the path relative to project_root
             if self.request and getattr(self.request, 'website', None):
                 filepath = os.path.relpath(filepath, self.request.website.project_root)
             else:
                 # Fall back to returning only the last two segments
                 filepath = os.sep.join(filepath.split(os.sep)[-2:])
-            self.whence_raised = (filepath, frame.f_lineno)
+            self._whence_raised = (filepath, linenum)
+            self._raised_from = None
+        return self._whence_raised
+
+    @whence_raised.setter
+    def whence_raised(self, value):
+        self._whence_raised = value
+        self._raised_from = None
+
+    def set_whence_raised(self):
+        """Sets and returns the value of :attr:`whence_raised`.
+
+        It's a tuple, (filename, linenum) where we were raised from. The
+        location is taken from the traceback attached to the exception
+        (:attr:`~BaseException.__traceback__`), so this method can be called
+        after the ``except`` block, or from another thread.
+
+        """
+        self._set_raised_from()
         return self.whence_raised
+
+    def _set_raised_from(self):
+        # Like `set_whence_raised`, but the path isn't made relative until
+        # `whence_raised` is accessed.
+        tb = self.__traceback__
+        if tb is not None:
+            while tb.tb_next is not None:
+                tb = tb.tb_next
+            frame = tb.tb_frame
+            self._raised_from = (frame.f_code.co_filename, frame.f_lineno)
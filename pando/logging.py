@@ -4,12 +4,81 @@
 
 Pando logging convenience wrappers
 
+The :func:`log` and :func:`log_dammit` functions find the name of the calling
+module by inspecting the stack. Modules that log often should call
+:func:`get_logger` once instead, and use the methods of the returned object::
+
+    from pando.logging import get_logger
+
+    logger = get_logger(__name__)
+
+    def foo():
+        logger.log("Something happened.", level=logging.INFO)
+
 """
 
 import sys
 import logging
 
 
+_loggers = {}
+
+
+class Logger:
+    """A wrapper of a :class:`logging.Logger` object, with the same calling
+    conventions as the module-level :func:`log` and :func:`log_dammit`
+    functions.
+
+    Instances of this class are obtained through :func:`get_logger`.
+    """
+
+    __slots__ = ('logger',)
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    @property
+    def name(self):
+        return self.logger.name
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def log(self, *messages, level=logging.WARNING, **kw):
+        """Log at ``level`` (``WARNING`` by default). Nothing is done if the
+        logger isn't enabled for that level.
+
+        The first message is the format string, the others are its arguments.
+        Other keyword arguments are passed through to :meth:`logging.Logger.log`.
+        """
+        logger = self.logger
+        if logger.isEnabledFor(level):
+            logger.log(level, *messages, **kw)
+
+    def log_dammit(self, *messages, level=logging.CRITICAL, **kw):
+        """Like :meth:`log`, but critical instead of warning.
+        """
+        logger = self.logger
+        if logger.isEnabledFor(level):
+            logger.log(level, *messages, **kw)
+
+    def __repr__(self):
+        return '<pando.logging.Logger %r>' % self.name
+
+
+def get_logger(name):
+    """Return the (cached) :class:`Logger` for the given ``name``.
+
+    >>> get_logger('pando.website') is get_logger('pando.website')
+    True
+
+    """
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, Logger(logging.getLogger(name)))
+    return logger
+
+
 def log(*messages, **kw):
     """
     Make logging more convenient - use magic to get the __name__ of the calling module/function
@@ -23,7 +92,7 @@ def log(*messages, **kw):
     level = kw.pop('level', logging.WARNING)
     upframes = kw.pop('upframes', 1)
     callerName = sys._getframe(upframes).f_globals.get('__name__', '<unknown>')
-    logging.getLogger(callerName).log(level, *messages, **kw)
+    get_logger(callerName).log(*messages, level=level, **kw)
 
 
 def log_dammit(*messages, **kw):
@@ -0,0 +1,216 @@
+"""
+:mod:`metrics`
+==============
+
+Optional measurement of the time spent processing requests.
+
+When the :attr:`~pando.website.DefaultConfiguration.collect_metrics` option is
+enabled, the :attr:`~pando.website.Website.state_chain` measures how long each
+of its functions takes, and stores the durations (in nanoseconds) in
+``state['timings']``. At the end of each request the timings are added to the
+histograms of :attr:`Website.metrics <pando.website.Website.metrics>`, then
+passed to the :attr:`~pando.website.DefaultConfiguration.metrics_sinks`.
+
+A sink is an object that has a ``record(timings, total)`` method, where
+``timings`` is a dict mapping function names to durations and ``total`` is
+the duration of the whole request, both in nanoseconds. This module provides
+:class:`LogSink` and :class:`StatsdSink`. The histograms can also be served in
+the Prometheus text format, by setting the
+:attr:`~pando.website.DefaultConfiguration.metrics_path` option.
+
+When :attr:`~pando.website.DefaultConfiguration.collect_metrics` is off, none
+of this code runs.
+"""
+
+from bisect import bisect_left
+import logging
+import socket
+from threading import Lock
+import traceback
+
+from .logging import get_logger
+
+
+logger = get_logger(__name__)
+
+#: The default upper bounds of histogram buckets, in nanoseconds (from 100µs
+#: to 10s).
+DEFAULT_BUCKETS = tuple(int(n * 1000) for n in (
+    100, 250, 500,
+    1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000,
+    1000000, 2500000, 5000000, 10000000,
+))
+
+
+class Histogram:
+    """Count observations in buckets, like a Prometheus histogram.
+
+    :arg buckets: a sorted sequence of upper bounds (inclusive)
+
+    >>> h = Histogram((10, 100))
+    >>> for value in (5, 10, 50, 500):
+    ...     h.observe(value)
+    >>> h.counts, h.sum, h.count
+    ([2, 1, 1], 565, 4)
+
+    The last item of :attr:`counts` is the number of observations that
+    exceeded the largest bound.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Aggregate the timings of requests into histograms.
+
+    :arg sinks: a list of objects that will be passed the timings of each
+        request, see the module's docstring
+    :arg buckets: the upper bounds of the histograms' buckets, in nanoseconds
+
+    :attr:`functions` maps the names of state chain functions to
+    :class:`Histogram` objects, :attr:`requests` is the histogram of the total
+    duration of requests.
+    """
+
+    def __init__(self, sinks=(), buckets=DEFAULT_BUCKETS):
+        self.sinks = list(sinks)
+        self.buckets = tuple(buckets)
+        self.functions = {}
+        self.requests = Histogram(self.buckets)
+        self.lock = Lock()
+
+    def record(self, timings, total):
+        """Add the timings of a request to the histograms, and pass them on to
+        the sinks.
+
+        Exceptions raised by sinks are logged, not propagated.
+        """
+        functions = self.functions
+        with self.lock:
+            self.requests.observe(total)
+            for name, duration in timings.items():
+                histogram = functions.get(name)
+                if histogram is None:
+                    histogram = functions[name] = Histogram(self.buckets)
+                histogram.observe(duration)
+        for sink in self.sinks:
+            try:
+                sink.record(timings, total)
+            except Exception:
+                logger.log_dammit(traceback.format_exc())
+
+    def to_prometheus(self, prefix='pando'):
+        """Return the histograms in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            name = prefix + '_request_duration_seconds'
+            lines.append('# HELP %s Time spent processing requests.' % name)
+            lines.append('# TYPE %s histogram' % name)
+            _format_histogram(lines, name, '', self.requests)
+            name = prefix + '_state_chain_function_duration_seconds'
+            lines.append('# HELP %s Time spent in each function of the state chain.' % name)
+            lines.append('# TYPE %s histogram' % name)
+            for function, histogram in sorted(self.functions.items()):
+                labels = 'function="%s",' % _escape_label_value(function)
+                _format_histogram(lines, name, labels, histogram)
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_histogram(lines, name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append('%s_bucket{%sle="%s"} %i' % (name, labels, _seconds(bound), cumulative))
+    lines.append('%s_bucket{%sle="+Inf"} %i' % (name, labels, histogram.count))
+    labels = '{%s}' % labels.rstrip(',') if labels else ''
+    lines.append('%s_sum%s %s' % (name, labels, _seconds(histogram.sum)))
+    lines.append('%s_count%s %i' % (name, labels, histogram.count))
+
+
+def _seconds(ns):
+    return repr(ns / 1000000000)
+
+
+class LogSink:
+    """Log the timings of each request.
+
+    :arg str logger_name: the name of the logger to use
+    :arg int level: the level of the log messages
+
+    Nothing is formatted when the logger isn't enabled for ``level``.
+    """
+
+    def __init__(self, logger_name='pando.metrics', level=logging.INFO):
+        self.logger = logging.getLogger(logger_name)
+        self.level = level
+
+    def record(self, timings, total):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        self.logger.log(self.level, "request took %.3fms (%s)", total / 1000000, ', '.join(
+            '%s: %.3fms' % (name, duration / 1000000) for name, duration in timings.items()
+        ))
+
+
+class StatsdSink:
+    """Send the timings of each request to a StatsD server, over UDP.
+
+    :arg str host: the address of the server
+    :arg int port: the port of the server
+    :arg str prefix: the prefix of the metric names
+    :arg int max_packet_size: the maximum size of a UDP payload, in bytes
+
+    The duration of each request is sent as ``{prefix}.request``, and the
+    durations of the state chain functions as ``{prefix}.state_chain.{name}``.
+    Multiple metrics are sent in each packet. Errors are ignored: sending
+    metrics is on a best-effort basis.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='pando', max_packet_size=1432):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.max_packet_size = max_packet_size
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def record(self, timings, total):
+        prefix = self.prefix
+        lines = ['%s.request:%.3f|ms' % (prefix, total / 1000000)]
+        lines.extend(
+            '%s.state_chain.%s:%.3f|ms' % (prefix, name, duration / 1000000)
+            for name, duration in timings.items()
+        )
+        packet = b''
+        for line in lines:
+            line = line.encode('ascii', 'backslashreplace')
+            if packet and len(packet) + 1 + len(line) > self.max_packet_size:
+                self.send(packet)
+                packet = b''
+            packet = packet + b'\n' + line if packet else line
+        self.send(packet)
+
+    def send(self, packet):
+        try:
+            self.socket.sendto(packet, self.address)
+        except OSError:
+            pass
+
+    def close(self):
+        self.socket.close()
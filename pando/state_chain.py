@@ -19,20 +19,37 @@ or ordering here would constitute a backwards-incompatible change.
 
 """
 
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime as _parsedate_to_datetime
+from io import BytesIO
 import os
 import os.path
 import traceback
+import uuid
 
 from aspen.exceptions import NegotiationFailure, NotFound
 from aspen.http.resource import Static
+from aspen.http.resource import open_resource as _open_resource
+from aspen.output import Output
 from aspen.request_processor import typecasting
 from aspen.request_processor.dispatcher import DispatchResult, DispatchStatus
-from first import first as _first
-
-from .logging import log as _log
-from .logging import log_dammit as _log_dammit
+from dependency_injection import resolve_dependencies as _resolve_dependencies
+
+from .access_log import make_record as _make_access_log_record
+from .compression import accepts_gzip as _accepts_gzip
+from .compression import add_vary as _add_vary
+from .compression import gzip_chunks as _gzip_chunks
+from .compression import gzip_compress as _gzip_compress
+from .compression import is_compressible as _is_compressible
+from .logging import get_logger as _get_logger
+from .http.ranges import parse_range_header as _parse_range_header
 from .http.request import Request
-from .http.response import Response
+from .http.response import FileBody, MultiRangeBody, Response
+from .utils import LazyTraceback as _LazyTraceback
+from .utils import to_rfc822 as _to_rfc822
+
+
+_logger = _get_logger(__name__)
 
 
 def parse_environ_into_request(environ, website):
@@ -62,6 +79,9 @@ def redirect_to_base_url(website, request):
 
 
 def dispatch_path_to_filesystem(website, request):
+    if website.metrics_path and request.path.raw == website.metrics_path:
+        fspath = website.ours_or_theirs('metrics.spt')
+        return {'dispatch_result': DispatchResult(DispatchStatus.okay, fspath, None, None, None)}
     return {'dispatch_result': website.request_processor.dispatch(request.path)}
 
 
@@ -91,6 +111,82 @@ def load_resource_from_filesystem(website, dispatch_result):
     return {'resource': website.request_processor.resources.get(fspath)}
 
 
+def raise_304_if_not_modified(state, website, request, resource):
+    """Add validators (``ETag`` and ``Last-Modified``) to the response, and
+    raise a 304 if the client's copy of the resource is still fresh.
+
+    The validators of static files are computed from their size and
+    modification time. Simplates can provide validators by defining a
+    ``get_validators`` function in their first page, it is called with
+    dependency injection from the state and should return a dict containing
+    an ``etag`` string (including the double quotes, e.g. ``'"v2"'``) and/or
+    a ``last_modified`` :class:`~datetime.datetime`, or :obj:`None`. A naive
+    ``last_modified`` is assumed to be in UTC.
+
+    The response object is created here if it doesn't exist yet, so that the
+    validators are set on it.
+    """
+    if isinstance(resource, Static):
+        try:
+            st = os.stat(resource.fspath)
+        except OSError:
+            return
+        etag = '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+        last_modified = datetime.fromtimestamp(int(st.st_mtime), timezone.utc)
+    else:
+        hook = getattr(resource, 'page_one', {}).get('get_validators')
+        if hook is None:
+            return
+        validators = hook(**_resolve_dependencies(hook, state).as_kwargs)
+        if not validators:
+            return
+        etag = validators.get('etag')
+        last_modified = validators.get('last_modified')
+        if last_modified and last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+
+    response = state.setdefault('response', Response())
+    if etag:
+        response.headers[b'ETag'] = etag.encode('ascii')
+    if last_modified:
+        response.headers[b'Last-Modified'] = _to_rfc822(last_modified).encode('ascii')
+
+    if request.method not in ('GET', 'HEAD'):
+        return
+    if_none_match = request.headers.get(b'If-None-Match')
+    if if_none_match is not None:
+        if etag and _etag_matches(if_none_match, etag.encode('ascii')):
+            response.code = 304
+            raise response
+    elif last_modified:
+        if_modified_since = request.headers.get(b'If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = _parsedate_to_datetime(if_modified_since.decode('ascii'))
+            except (TypeError, ValueError, UnicodeDecodeError):
+                return
+            if since.tzinfo is None:
+                return
+            if last_modified.replace(microsecond=0) <= since:
+                response.code = 304
+                raise response
+
+
+def _etag_matches(if_none_match, etag):
+    """Weak comparison of an ``If-None-Match`` header value with an entity tag.
+    """
+    if if_none_match.strip() == b'*':
+        return True
+    etag = etag[2:] if etag.startswith(b'W/') else etag
+    for tag in if_none_match.split(b','):
+        tag = tag.strip()
+        if tag.startswith(b'W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
 def resource_available():
     """No-op placeholder for easy hookage"""
     pass
@@ -110,10 +206,14 @@ def extract_accept_header(request=None, exception=None):
 
 
 def render_response(state, resource, response, website):
+    cache_key = None
     if isinstance(resource, Static):
-        method = getattr(state.get('request'), 'method', 'GET')
+        request = state.get('request')
+        method = getattr(request, 'method', 'GET')
+        if method in ('GET', 'HEAD'):
+            response.headers[b'Accept-Ranges'] = b'bytes'
         if method == 'GET':
-            output = resource.render()
+            output = _render_static(resource, request, response, website)
         elif method == 'HEAD':
             if b'Content-Length' not in response.headers:
                 if resource.raw is not None:
@@ -121,10 +221,22 @@ def render_response(state, resource, response, website):
                 else:
                     length = os.stat(resource.fspath).st_size
                 response.headers[b'Content-Length'] = str(length).encode('ascii')
+            if b'Content-Type' not in response.headers:
+                media_type = resource.media_type
+                if resource.charset:
+                    media_type += '; charset=' + resource.charset
+                response.headers[b'Content-Type'] = media_type.encode('ascii')
             return
         else:
             raise Response(405)
     else:
+        cache_key = _get_response_cache_key(state, resource, response, website)
+        if cache_key is not None:
+            cached = website.response_cache.lookup(cache_key, resource)
+            if cached is not None:
+                state['output'] = cached.apply_to(response)
+                return
+            headers_before = {k: list(v) for k, v in response.headers.items()}
         context = dict(state)  # copy to avoid unintended modifications by simplates
         output = None
         try:
@@ -132,7 +244,20 @@ def render_response(state, resource, response, website):
         finally:
             state['output'] = output or context.get('output')
 
-    if not isinstance(output.body, bytes):
+    _apply_output(output, response, website)
+
+    if cache_key is not None and response.code == 200 and not response.headers.has_cookies:
+        if isinstance(response.body, bytes):
+            headers = [
+                (k, list(v)) for k, v in response.headers.items()
+                if headers_before.get(k) != v
+            ]
+            ttl = website.response_cache.get_ttl(resource)
+            website.response_cache.store(cache_key, resource, ttl, headers, output)
+
+
+def _apply_output(output, response, website):
+    if isinstance(output.body, str):
         if not output.charset:
             output.charset = website.request_processor.encode_output_as
         output.body = output.body.encode(output.charset)
@@ -145,6 +270,156 @@ def render_response(state, resource, response, website):
         response.headers[b'Content-Type'] = media_type.encode('ascii')
 
 
+def _get_response_cache_key(state, resource, response, website):
+    """Returns :obj:`None` if the response to this request shouldn't be cached.
+    """
+    if website.response_cache is None or response.code != 200:
+        return None
+    if not website.response_cache.get_ttl(resource):
+        return None
+    request = state.get('request')
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    return website.response_cache.make_key(
+        resource, state['dispatch_result'], request, state['accept_header']
+    )
+
+
+def _render_static(resource, request, response, website):
+    """Render a static file, without reading it into memory if it's large.
+
+    Range requests (:rfc:`7233`) are supported.
+    """
+    threshold = website.static_files_streaming_threshold
+    range_header = request.headers.get(b'Range') if request else None
+    if range_header is None and (resource.raw is not None or threshold is None):
+        return resource.render()
+    if resource.raw is None:
+        f = _open_resource(resource.request_processor, resource.fspath)
+        size = os.fstat(f.fileno()).st_size
+    else:
+        f = BytesIO(resource.raw)
+        size = len(resource.raw)
+    try:
+        ranges = None
+        if range_header is not None and _if_range_matches(request, response):
+            ranges = _parse_range_header(range_header, size)
+        if ranges is None:
+            body = FileBody(f, size)
+        elif not ranges:
+            raise Response(416, headers={b'Content-Range': b'bytes */%i' % size})
+        elif len(ranges) == 1:
+            first, last = ranges[0]
+            body = FileBody(f, last - first + 1, first)
+            response.code = 206
+            response.headers[b'Content-Range'] = b'bytes %i-%i/%i' % (first, last, size)
+        else:
+            content_type = resource.media_type
+            if resource.charset:
+                content_type += '; charset=' + resource.charset
+            boundary = uuid.uuid4().hex.encode('ascii')
+            body = MultiRangeBody(f, ranges, size, content_type.encode('ascii'), boundary)
+            response.code = 206
+            response.headers[b'Content-Type'] = b'multipart/byteranges; boundary=' + boundary
+        if threshold is None or len(body) < threshold:
+            body = b''.join(body)
+            f.close()
+        else:
+            response.headers[b'Content-Length'] = str(len(body)).encode('ascii')
+    except BaseException:
+        f.close()
+        raise
+    return Output(body=body, media_type=resource.media_type, charset=resource.charset)
+
+
+def _if_range_matches(request, response):
+    """Returns :obj:`False` if the request has an ``If-Range`` header that
+    doesn't match the current validators of the file.
+
+    The comparison is strong: weak entity tags never match.
+    """
+    if_range = request.headers.get(b'If-Range')
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(b'W/'):
+        return False
+    if if_range.startswith(b'"'):
+        return if_range == response.headers.get(b'ETag')
+    return if_range == response.headers.get(b'Last-Modified')
+
+
+def compress_response(website, request, response, resource=None):
+    """Compress the response body with ``gzip``, if the
+    :attr:`~pando.website.DefaultConfiguration.compress_responses` option is
+    on and the client accepts it. See :mod:`pando.compression`.
+    """
+    if not website.compress_responses or response.code != 200:
+        return
+    headers = response.headers
+    content_type = headers.get(b'Content-Type')
+    if not content_type or not _is_compressible(content_type, website.compressible_media_types):
+        return
+    _add_vary(headers, b'Accept-Encoding')
+    if b'Content-Encoding' in headers:
+        return
+    accept_encoding = request.headers.get(b'Accept-Encoding')
+    if not accept_encoding or not _accepts_gzip(accept_encoding):
+        return
+    body = response.body
+    level = website.compression_level
+    charset = website.request_processor.encode_output_as
+    is_head = request.method == 'HEAD'
+    if isinstance(resource, Static) and (is_head or isinstance(body, (bytes, FileBody))):
+        if is_head:
+            # The body of a static file isn't loaded for a HEAD request, but
+            # the headers must be the same as in the response to a GET.
+            try:
+                size = int(headers.get(b'Content-Length') or b'')
+            except ValueError:
+                return
+        else:
+            size = len(body)
+        if size < website.compression_min_size:
+            return
+        variant = website.compressed_static_files.get(
+            resource.fspath, level, website.static_files_streaming_threshold
+        )
+        if variant is None:
+            return
+        if is_head:
+            length = len(variant) if isinstance(variant, bytes) else os.stat(variant).st_size
+        else:
+            if isinstance(body, FileBody):
+                body.close()
+            if isinstance(variant, bytes):
+                body = variant
+            else:
+                f = open(variant, 'rb')
+                body = FileBody(f, os.fstat(f.fileno()).st_size)
+            length = len(body)
+    elif isinstance(body, (bytes, str, list, tuple)):
+        body = b''.join(response._iter_body(charset))
+        if len(body) < website.compression_min_size:
+            return
+        body = _gzip_compress(body, level)
+        length = len(body)
+    elif hasattr(body, '__iter__') and not isinstance(body, MultiRangeBody):
+        body = _gzip_chunks(body, charset, level)
+        length = None
+    else:
+        return
+    response.body = body
+    headers[b'Content-Encoding'] = b'gzip'
+    if length is None:
+        headers.pop(b'Content-Length', None)
+    elif b'Content-Length' in headers:
+        headers[b'Content-Length'] = str(length).encode('ascii')
+    etag = headers.get(b'ETag')
+    if etag and not etag.startswith(b'W/'):
+        headers[b'ETag'] = b'W/' + etag
+
+
 def handle_negotiation_exception(exception):
     if isinstance(exception, NotFound):
         response = Response(404)
@@ -156,17 +431,29 @@ def handle_negotiation_exception(exception):
 
 
 def get_response_for_exception(website, exception):
-    tb = traceback.format_exc()
     if isinstance(exception, Response):
         response = exception
-        response.set_whence_raised()
+        response._set_raised_from()
+        if website.cheap_errors and response.code in website._cheap_error_codes:
+            return {'response': response, 'traceback': None, 'exception': None}
+        # Most `Response` exceptions are intentional (redirects, 4xx errors),
+        # so we only format the traceback if it's actually used.
+        tb = _LazyTraceback(exception)
     else:
+        tb = _format_traceback(exception)
         response = Response(500)
         if website.show_tracebacks:
             response.body = tb
     return {'response': response, 'traceback': tb, 'exception': None}
 
 
+def _format_traceback(exception):
+    # `traceback.format_exc()` can't be used here: exception handlers can run
+    # in a thread of an executor (see `CompiledStateChain.run_async`), where
+    # `sys.exc_info()` is empty.
+    return ''.join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+
+
 def response_available():
     """No-op placeholder for easy hookage"""
     pass
@@ -175,9 +462,9 @@ def response_available():
 def log_traceback_for_5xx(response, traceback=None):
     if response.code >= 500:
         if traceback:
-            _log_dammit(traceback)
+            _logger.log_dammit(str(traceback))
         else:
-            _log_dammit(response.body)
+            _logger.log_dammit(response.body)
     return {'traceback': None}
 
 
@@ -187,9 +474,7 @@ def delegate_error_to_simplate(website, state, response, request=None, resource=
     if response.code < 400:
         return
 
-    code = str(response.code)
-    possibles = [code + ".spt", "error.spt"]
-    fspath = _first(website.ours_or_theirs(errpage) for errpage in possibles)
+    fspath = website.find_error_page(response.code)
 
     if fspath is not None:
         request.original_resource = resource
@@ -197,39 +482,89 @@ def delegate_error_to_simplate(website, state, response, request=None, resource=
         state['dispatch_result'] = DispatchResult(
             DispatchStatus.okay, fspath, None, None, None
         )
-        # Try to return an error that matches the type of the response the
-        # client would have received if the error didn't occur
-        wanted = getattr(state.get('output'), 'media_type', None) or ''
-        # If we don't have a media type (e.g. when we're returning a 404), then
-        # we fall back to the Accept header
-        if state.get('accept_header'):
-            wanted += ',' + state['accept_header']
-        # As a last resort we accept anything, with a preference for text/plain
-        wanted += ',text/plain;q=0.2,*/*;q=0.1'
-        state['accept_header'] = wanted.lstrip(',')
-
-        render_response(state, resource, response, website)
+        if website.cheap_errors and response.code in website._cheap_error_codes:
+            # Skip content negotiation, and reuse the output even if the
+            # simplate doesn't have `render_once = True`
+            state['accept_header'] = 'text/plain;q=0.2,*/*;q=0.1'
+            key = (response.code, None)
+        else:
+            # Try to return an error that matches the type of the response the
+            # client would have received if the error didn't occur
+            wanted = getattr(state.get('output'), 'media_type', None) or ''
+            # If we don't have a media type (e.g. when we're returning a 404),
+            # then we fall back to the Accept header
+            if state.get('accept_header'):
+                wanted += ',' + state['accept_header']
+            # As a last resort we accept anything, with a preference for text/plain
+            wanted += ',text/plain;q=0.2,*/*;q=0.1'
+            state['accept_header'] = wanted = wanted.lstrip(',')
+
+            if website.show_tracebacks or not resource.page_one.get('render_once'):
+                render_response(state, resource, response, website)
+                return
+            key = (response.code, wanted)
+
+        cached = website.rendered_error_pages.get(key)
+        if cached is not None and cached[0] is resource:
+            output = cached[1]
+            output = state['output'] = Output(
+                body=output.body, media_type=output.media_type, charset=output.charset
+            )
+            _apply_output(output, response, website)
+        else:
+            render_response(state, resource, response, website)
+            website.rendered_error_pages.set(key, (resource, state['output']))
 
 
 def log_traceback_for_exception(website, exception):
     if isinstance(exception, Response):
         response = exception
-        response.set_whence_raised()
+        response._set_raised_from()
         if response.code < 500:
             return {'response': response, 'exception': None}
     else:
         response = Response(500)
-    tb = traceback.format_exc()
-    _log_dammit(tb)
+    tb = _format_traceback(exception)
+    _logger.log_dammit(tb)
     if website.show_tracebacks:
         response.body = tb
     return {'response': response, 'exception': None}
 
 
-def log_result_of_request(website, request=None, dispatch_result=None, response=None):
+def log_result_of_request(website, request=None, dispatch_result=None, response=None,
+                          timings=None):
     """Log access. With our own format (not Apache's).
+
+    If the :attr:`~pando.website.DefaultConfiguration.access_log_file` option is
+    set, then a structured record is queued instead, see
+    :mod:`pando.access_log`.
     """
 
+    # Should this be logged?
+    # ======================
+
+    # INFO when code < 400, WARNING when < 500, ERROR when < 600, CRITICAL when
+    # we don't have a response code
+    level = max((getattr(response, 'code', 600) - 100) // 100 * 10, 20)
+    access_log = website.access_log
+    if access_log is None and not _logger.isEnabledFor(level):
+        return
+
+    suppressed = 0
+    limiter = website._cheap_errors_log_limiter
+    if limiter is not None and response is not None:
+        if response.code in website._cheap_error_codes:
+            if not limiter.allow():
+                return
+            suppressed = limiter.take_suppressed()
+
+    if access_log is not None:
+        if access_log.should_log(getattr(response, 'code', None)):
+            access_log.put(_make_access_log_record(
+                website, request, dispatch_result, response, timings
+            ))
+        return
+
     # What was the URL path translated to?
     # ====================================
 
@@ -244,6 +579,8 @@ def log_result_of_request(website, request=None, dispatch_result=None, response=
         else:
             fspath = '...' + fspath[-21:]
         msg = "%-24s %s" % (request.line.uri.path.decoded, fspath)
+    if suppressed:
+        msg += " (%i similar messages suppressed)" % suppressed
 
     # Where was response raised from?
     # ===============================
@@ -259,7 +596,4 @@ def log_result_of_request(website, request=None, dispatch_result=None, response=
     # Log it.
     # =======
 
-    # INFO when code < 400, WARNING when < 500, ERROR when < 600, CRITICAL when
-    # we don't have a response code
-    level = max((getattr(response, 'code', 600) - 100) // 100 * 10, 20)
-    _log("%-36s %s" % (status, msg), level=level)
+    _logger.log("%-36s %s" % (status, msg), level=level)
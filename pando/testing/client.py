@@ -45,7 +45,8 @@ def encode_multipart(boundary, data):
 
     The key will be used as the form data name; the value will be transmitted
     as content. Use the FileUpload class to simulate file uploads (note that
-    they still come out as FieldStorage instances inside of simplates).
+    they come out as :class:`~pando.http.multipart.UploadedFile` instances
+    inside of simplates).
 
     """
     lines = []
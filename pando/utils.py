@@ -3,8 +3,12 @@
 ============
 """
 
+from collections import OrderedDict, UserString
 from datetime import datetime, timezone
 import re
+from threading import Lock
+import time
+import traceback
 
 
 # encoding helpers
@@ -14,6 +18,41 @@ def maybe_encode(s, codec='ascii'):
     return s.encode(codec) if isinstance(s, str) else s
 
 
+# descriptors
+# ===========
+
+class cached_property:
+    """A property that is computed on first access, then stored as a regular
+    attribute of the instance (like :func:`functools.cached_property`, which
+    isn't available in Python 3.6 and 3.7).
+
+    >>> class Foo:
+    ...     @cached_property
+    ...     def bar(self):
+    ...         print('computing bar')
+    ...         return 42
+    ...
+    >>> foo = Foo()
+    >>> foo.bar
+    computing bar
+    42
+    >>> foo.bar
+    42
+
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
+
+
 # datetime helpers
 # ================
 
@@ -44,6 +83,185 @@ def to_rfc822(dt):
     )
 
 
+if hasattr(time, 'monotonic_ns'):
+    monotonic_ns = time.monotonic_ns
+else:  # Python < 3.7
+    def monotonic_ns():
+        """Return the value of :func:`time.monotonic` in nanoseconds.
+        """
+        return int(time.monotonic() * 1000000000)
+
+
+# caching helpers
+# ===============
+
+class LRUCache:
+    """A thread-safe mapping that holds at most ``max_size`` items, discarding
+    the least recently used ones when it's full.
+
+    The :attr:`hits`, :attr:`misses` and :attr:`evictions` counters are
+    updated by the :meth:`get` and :meth:`set` methods.
+
+    >>> cache = LRUCache(2)
+    >>> cache.set('a', 1); cache.set('b', 2)
+    >>> cache.get('a')
+    1
+    >>> cache.set('c', 3)
+    >>> cache.get('b') is None
+    True
+    >>> sorted(cache.keys()), cache.hits, cache.misses, cache.evictions
+    (['a', 'c'], 1, 1, 1)
+
+    """
+
+    __slots__ = ('max_size', 'data', 'lock', 'hits', 'misses', 'evictions')
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the value for ``key`` and mark it as recently used, or return
+        ``default``.
+        """
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``, evicting old items if needed.
+        """
+        with self.lock:
+            data = self.data
+            data[key] = value
+            data.move_to_end(key)
+            while len(data) > self.max_size:
+                data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def keys(self):
+        return list(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
+# tracebacks
+# ==========
+
+class LazyTraceback(UserString):
+    """The traceback of an exception, formatted when it's first used.
+
+    This allows keeping a traceback around (e.g. in ``state['traceback']``)
+    without paying the cost of formatting it if it's never logged or shown.
+    It's a :class:`~collections.UserString`, so it supports the methods and
+    operators of :class:`str`.
+
+    >>> try:
+    ...     raise ValueError('oops')
+    ... except ValueError as e:
+    ...     tb = LazyTraceback(e)
+    >>> tb.splitlines()[-1]
+    'ValueError: oops'
+    >>> 'oops' in tb, tb.endswith('oops\\n')
+    (True, True)
+
+    """
+
+    __slots__ = ('exception', 'tb', 'text')
+
+    def __init__(self, exception):
+        if isinstance(exception, BaseException):
+            self.exception = exception
+            self.tb = exception.__traceback__
+            self.text = None
+        else:
+            # Called by the `UserString` methods that return a new string
+            self.exception = self.tb = None
+            self.text = str(exception)
+
+    @property
+    def data(self):
+        if self.text is None:
+            e = self.exception
+            self.text = ''.join(traceback.format_exception(type(e), e, self.tb))
+            self.exception = self.tb = None
+        return self.text
+
+    def __repr__(self):
+        return '<LazyTraceback %s>' % ('(formatted)' if self.text is not None else
+                                       type(self.exception).__name__)
+
+
+# rate limiting
+# =============
+
+class RateLimiter:
+    """A thread-safe counter that allows at most ``limit`` events per
+    ``period`` (in seconds), in fixed windows.
+
+    >>> limiter = RateLimiter(2, period=60)
+    >>> [limiter.allow() for i in range(4)]
+    [True, True, False, False]
+    >>> limiter.take_suppressed(), limiter.take_suppressed()
+    (2, 0)
+
+    """
+
+    __slots__ = ('limit', 'period', 'lock', 'window_end', 'count', 'suppressed')
+
+    def __init__(self, limit, period=1):
+        self.limit = limit
+        self.period = period
+        self.lock = Lock()
+        self.window_end = 0
+        self.count = 0
+        self.suppressed = 0
+
+    def allow(self):
+        """Return :obj:`True` if the event is allowed, otherwise count it as
+        suppressed and return :obj:`False`.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now >= self.window_end:
+                self.window_end = now + self.period
+                self.count = 0
+            if self.count < self.limit:
+                self.count += 1
+                return True
+            self.suppressed += 1
+            return False
+
+    def take_suppressed(self):
+        """Return the number of suppressed events, and reset it to zero.
+        """
+        with self.lock:
+            n, self.suppressed = self.suppressed, 0
+            return n
+
+
 # Soft type checking
 # ==================
 
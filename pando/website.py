@@ -5,18 +5,24 @@
 
 from copy import copy
 from datetime import datetime, timezone
+from functools import partial
 import os
 import string
 from urllib.parse import quote
 
 from aspen.request_processor import RequestProcessor
 from aspen.simplates.simplate import Simplate
-from state_chain import StateChain
 
 from . import body_parsers
-from .http.request import SAFE_METHODS
+from .access_log import AccessLog
+from .caching import ResponseCache
+from .chain import CompiledStateChain
+from .compression import StaticVariants
+from .http.proxies import TrustedProxies
+from .http.request import SAFE_METHODS, URICache, make_environ_from_asgi_scope, read_asgi_body
 from .http.response import Response
-from .utils import maybe_encode, to_rfc822
+from .metrics import Metrics
+from .utils import LRUCache, RateLimiter, maybe_encode, monotonic_ns, to_rfc822
 from .exceptions import BadLocation
 
 
@@ -47,14 +53,6 @@ class Website:
         pando_resources_dir = os.path.join(PANDO_DIR, 'www')
         self.request_processor.resource_directories.append(pando_resources_dir)
 
-        pando_chain = StateChain.from_dotted_name('pando.state_chain')
-        pando_chain.functions = [
-            getattr(f, 'placeholder_for', f) for f in pando_chain.functions
-        ]
-        #: The chain of functions used to process an HTTP request, imported from
-        #: :mod:`pando.state_chain`.
-        self.state_chain = pando_chain
-
         # configure from defaults and kwargs
         defaults = [(k, v) for k, v in DefaultConfiguration.__dict__.items() if k[0] != '_']
         for name, default in sorted(defaults):
@@ -63,15 +61,91 @@ class Website:
             else:
                 self.__dict__[name] = copy(default)
 
+        pando_chain = CompiledStateChain.from_dotted_name(
+            'pando.state_chain', compiled=self.compile_state_chain,
+            timed=self.collect_metrics,
+        )
+        pando_chain.functions = [
+            getattr(f, 'placeholder_for', f) for f in pando_chain.functions
+        ]
+        #: The chain of functions used to process an HTTP request, imported from
+        #: :mod:`pando.state_chain`. See :class:`~pando.chain.CompiledStateChain`.
+        self.state_chain = pando_chain
+
+        #: The :class:`~pando.caching.ResponseCache` of rendered simplates, or
+        #: :obj:`None` if :attr:`~DefaultConfiguration.response_cache_size` is 0.
+        self.response_cache = (
+            ResponseCache(self.response_cache_size) if self.response_cache_size else None
+        )
+
+        #: The :class:`~pando.compression.StaticVariants` cache of compressed
+        #: static files, or :obj:`None` if
+        #: :attr:`~DefaultConfiguration.compress_responses` is off.
+        self.compressed_static_files = (
+            StaticVariants(self.compression_cache_size) if self.compress_responses else None
+        )
+
+        #: The :class:`~pando.http.request.URICache` of parsed request URIs
+        #: and hostnames, or :obj:`None` if
+        #: :attr:`~DefaultConfiguration.uri_cache_size` is 0.
+        self.uri_cache = URICache(self.uri_cache_size) if self.uri_cache_size else None
+
+        #: The :class:`~pando.http.proxies.TrustedProxies` object compiled from
+        #: the :attr:`~DefaultConfiguration.trusted_proxies` and
+        #: :attr:`~DefaultConfiguration.trusted_proxies_header` options. Since
+        #: it's compiled here, modifying those options afterwards has no effect.
+        self.compiled_trusted_proxies = TrustedProxies(
+            self.trusted_proxies, self.trusted_proxies_header,
+            self.trusted_proxies_cache_size,
+        )
+
+        #: The :class:`~pando.metrics.Metrics` of this website, or :obj:`None`
+        #: if :attr:`~DefaultConfiguration.collect_metrics` is off.
+        self.metrics = Metrics(self.metrics_sinks) if self.collect_metrics else None
+
+        # index the error pages
+        self._error_pages = None
+        self._error_pages_mtime = None
+        #: The outputs of error simplates that declare ``render_once = True``,
+        #: keyed by status code and ``Accept`` header.
+        #: See :meth:`find_error_page`.
+        self.rendered_error_pages = LRUCache(256)
+        self.find_error_page(404)
+        self._cheap_errors_log_limiter = (
+            RateLimiter(self.cheap_errors_log_limit)
+            if self.cheap_errors and self.cheap_errors_log_limit is not None else None
+        )
+
+        #: The :class:`~pando.access_log.AccessLog` of this website, or
+        #: :obj:`None` if the :attr:`~DefaultConfiguration.access_log` option
+        #: isn't set.
+        self.access_log = None
+        if self.access_log_file is not None:
+            self.access_log = AccessLog(
+                self.access_log_file,
+                max_queue_size=self.access_log_queue_size,
+                sample_rate=self.access_log_sample_rate,
+            )
+
         # add ourself to the initial context of simplates
         Simplate.defaults.initial_context['website'] = self
 
         # load bodyparsers
-        #: Mapping of content types to parsing functions.
+        #: Mapping of content types to parsing functions. The limits set by
+        #: the :attr:`~DefaultConfiguration.form_max_fields`,
+        #: :attr:`~DefaultConfiguration.form_max_key_length` and
+        #: :attr:`~DefaultConfiguration.json_max_body_size` options are bound
+        #: to the parsers here.
         self.body_parsers = {
-            "application/x-www-form-urlencoded": body_parsers.formdata,
-            "multipart/form-data": body_parsers.formdata,
-            self.request_processor.media_type_json: body_parsers.jsondata
+            "application/x-www-form-urlencoded": partial(
+                body_parsers.urlencoded,
+                max_fields=self.form_max_fields,
+                max_key_length=self.form_max_key_length,
+            ),
+            "multipart/form-data": body_parsers.multipart,
+            self.request_processor.media_type_json: body_parsers.JSONParser(
+                self.json_max_body_size
+            ),
         }
 
     def __call__(self, environ, start_response):
@@ -89,18 +163,91 @@ class Website:
             website.wsgi_app = WSGIMiddleware(website.wsgi_app)
 
         """
-        response = self.respond(environ)['response']
+        state = self.respond(environ)
+        response = state['response']
+        response.request = state.get('request')
         return response.to_wsgi(environ, start_response, self.request_processor.encode_output_as)
 
+    async def asgi_app(self, scope, receive, send):
+        """ASGI interface.
+
+        Only the ``http`` and ``lifespan`` protocols are supported. The request
+        body is read before the state chain is run, and the response body is
+        sent in chunks, so a slow client doesn't tie up a thread. The regular
+        (non-``async``) functions of the state chain, which include simplate
+        rendering, are run in the event loop's default executor, as are the
+        reads of file and iterator response bodies, so they don't block the
+        event loop.
+
+        Wrap this method when you want to use ASGI middleware::
+
+            website = Website()
+            website.asgi_app = ASGIMiddleware(website.asgi_app)
+
+        """
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        elif scope['type'] != 'http':
+            raise NotImplementedError("unsupported ASGI scope type %r" % scope['type'])
+        body = await read_asgi_body(receive)
+        try:
+            environ = make_environ_from_asgi_scope(scope, body)
+            state = await self.respond_async(environ)
+            response = state['response']
+            response.request = state.get('request')
+            await response.to_asgi(send, self.request_processor.encode_output_as)
+        finally:
+            body.close()
+
     def respond(self, environ, raise_immediately=None, return_after=None):
         """Given a WSGI environ, return a state dict.
         """
-        return self.state_chain.run(
-            website=self,
-            environ=environ,
-            _raise_immediately=raise_immediately,
-            _return_after=return_after,
-        )
+        if self.metrics is None:
+            return self.state_chain.run(
+                website=self,
+                environ=environ,
+                _raise_immediately=raise_immediately,
+                _return_after=return_after,
+            )
+        state = {}
+        start = monotonic_ns()
+        try:
+            return self.state_chain.run(
+                state,
+                website=self,
+                environ=environ,
+                _raise_immediately=raise_immediately,
+                _return_after=return_after,
+            )
+        finally:
+            self.metrics.record(state.get('timings', {}), monotonic_ns() - start)
+
+    async def respond_async(self, environ, raise_immediately=None, return_after=None):
+        """Given a WSGI environ, return a state dict.
+
+        Functions of the :attr:`state_chain` that are coroutine functions
+        (``async def``) are awaited. See
+        :meth:`~pando.chain.CompiledStateChain.run_async`.
+        """
+        state = {}
+        start = monotonic_ns() if self.metrics is not None else None
+        try:
+            return await self.state_chain.run_async(
+                state,
+                website=self,
+                environ=environ,
+                _raise_immediately=raise_immediately,
+                _return_after=return_after,
+            )
+        finally:
+            if start is not None:
+                self.metrics.record(state.get('timings', {}), monotonic_ns() - start)
 
     def redirect(self, location, code=None, permanent=False, base_url=None, response=None):
         """Raise a redirect Response.
@@ -183,6 +330,69 @@ class Website:
 
         return None
 
+    # Error Pages
+    # ===========
+
+    _cheap_error_codes = frozenset((404, 405))
+
+    def find_error_page(self, code):
+        """Return the filepath of the simplate that renders error responses with
+        the given status ``code``, or ``None``.
+
+        The candidates are ``<code>.spt`` then ``error.spt``, in the project
+        root first, then in Pando's default files directory. Both directories
+        are indexed when the website is created, instead of checking whether
+        the files exist every time an error occurs. If Aspen's
+        ``changes_reload`` option is on, the index is rebuilt when the project
+        root is modified.
+
+        The output of an error simplate is rendered once per status code and
+        ``Accept`` header, then reused, if its first page sets ``render_once``
+        to :obj:`True` (Pando's default ``error.spt`` does), unless
+        :attr:`~DefaultConfiguration.show_tracebacks` is on.
+        """
+        index = self._error_pages
+        if index is None or self.request_processor.changes_reload:
+            mtime = self._get_project_root_mtime()
+            if index is None or mtime != self._error_pages_mtime:
+                index = self._error_pages = self._index_error_pages()
+                self._error_pages_mtime = mtime
+        return index.get(code) or index.get('error')
+
+    def _get_project_root_mtime(self):
+        if self.project_root is None:
+            return None
+        try:
+            return os.stat(self.project_root).st_mtime_ns
+        except OSError:
+            return None
+
+    def _index_error_pages(self):
+        index = {}
+        directories = [os.path.join(PANDO_DIR, 'www')]
+        if self.project_root is not None:
+            directories.append(self.project_root)
+        for directory in directories:
+            try:
+                filenames = os.listdir(directory)
+            except OSError:
+                continue
+            for filename in filenames:
+                name, ext = os.path.splitext(filename)
+                if ext != '.spt':
+                    continue
+                if name == 'error':
+                    key = name
+                elif len(name) == 3 and name.isdigit():
+                    key = int(name)
+                else:
+                    continue
+                fspath = os.path.join(directory, filename)
+                if os.path.isfile(fspath):
+                    index[key] = fspath
+        self.rendered_error_pages.clear()
+        return index
+
     # Backward compatibility
     # ======================
 
@@ -211,6 +421,27 @@ class DefaultConfiguration:
     """Default configuration of :class:`Website` objects.
     """
 
+    access_log_file = None
+    """
+    Write structured access log records to this file (a path or a writable
+    text stream), in the JSON Lines format, instead of logging a line of text
+    for each request. The records are written by a background thread. See
+    :mod:`pando.access_log`.
+    """
+
+    access_log_queue_size = 10000
+    """
+    The maximum number of access log records waiting to be written. When the
+    queue is full, new records are dropped instead of slowing down requests.
+    """
+
+    access_log_sample_rate = 1.0
+    """
+    The proportion of successful requests (status code below 400) that are
+    written to the :attr:`access_log_file`, between 0 and 1. Errors are always
+    logged.
+    """
+
     base_url = ''
     """
     The website's base URL (scheme and host only, no path). If specified, then
@@ -219,9 +450,104 @@ class DefaultConfiguration:
     ``http://www.example.net/foo`` is redirected to ``https://example.net/foo``.
     """
 
+    cheap_errors = False
+    """
+    Handle 404 and 405 errors as cheaply as possible, to limit the resources
+    consumed by bots and scanners requesting nonexistent URLs:
+
+    - the traceback of the :class:`~pando.http.response.Response` exception
+      isn't formatted, and ``state['traceback']`` is :obj:`None`;
+    - the error simplate is rendered once per status code, without content
+      negotiation (the ``Accept`` header is ignored), then the same body is
+      reused;
+    - the access log messages are rate limited, see
+      :attr:`cheap_errors_log_limit`.
+    """
+
+    cheap_errors_log_limit = 10
+    """
+    The maximum number of 404 and 405 responses logged per second when
+    :attr:`cheap_errors` is on. The number of messages that were dropped is
+    included in the next one that isn't. :obj:`None` means no limit.
+    """
+
     colorize_tracebacks = True
     "Use the Pygments package to prettify tracebacks with syntax highlighting."
 
+    collect_metrics = False
+    """
+    Measure the time spent in each function of the :attr:`~Website.state_chain`
+    and aggregate the timings in :attr:`Website.metrics`. See
+    :mod:`pando.metrics`.
+    """
+
+    compile_state_chain = False
+    """
+    Run the :attr:`~Website.state_chain` from a precomputed call plan instead of
+    inspecting the signature of each function on every request. The plan is
+    rebuilt automatically when functions are added to or removed from the
+    chain. See :class:`~pando.chain.CompiledStateChain`.
+    """
+
+    compress_responses = False
+    """
+    Compress response bodies with ``gzip`` when the client accepts it. See
+    :mod:`pando.compression`.
+    """
+
+    compressible_media_types = {
+        'application/atom+xml', 'application/javascript', 'application/json',
+        'application/manifest+json', 'application/rss+xml', 'application/xhtml+xml',
+        'application/xml', 'image/svg+xml', 'text/css', 'text/csv', 'text/html',
+        'text/javascript', 'text/markdown', 'text/plain', 'text/xml',
+    }
+    """
+    The set of media types that are compressed when :attr:`compress_responses`
+    is on. Formats that are already compressed (e.g. PNG images) gain nothing
+    from a second compression, and streams that must be delivered without
+    delay (``text/event-stream``) shouldn't be buffered by a compressor.
+    """
+
+    compression_cache_size = 256
+    """
+    The maximum number of compressed static files kept in memory when
+    :attr:`compress_responses` is on.
+    """
+
+    compression_level = 6
+    """
+    The ``zlib`` compression level, from 1 (fastest) to 9 (smallest).
+    """
+
+    compression_min_size = 1024
+    """
+    Response bodies smaller than this (in bytes) aren't compressed, the savings
+    wouldn't be worth the CPU time.
+    """
+
+    form_max_fields = 1000
+    """
+    The maximum number of fields in an ``application/x-www-form-urlencoded``
+    request body. A 400 response is returned when it's exceeded. :obj:`None`
+    means no limit.
+    """
+
+    form_max_key_length = 1024
+    """
+    The maximum length (in characters, before unquoting) of a field name in an
+    ``application/x-www-form-urlencoded`` request body. A 400 response is
+    returned when it's exceeded. :obj:`None` means no limit.
+    """
+
+    json_max_body_size = None
+    """
+    The maximum size (in bytes) of a JSON request body. It's checked against
+    the ``Content-Length`` header before the body is read, and a 413 response
+    is returned when it's exceeded. It also applies to
+    :meth:`~pando.http.request.Request.iter_json_array`. :obj:`None` means no
+    limit.
+    """
+
     known_schemes = {'http', 'https', 'ws', 'wss'}
     """
     The set of known and acceptable request URL schemes. Used by
@@ -231,9 +557,62 @@ class DefaultConfiguration:
     list_directories = False
     "List the contents of directories that don't have a custom index."
 
+    metrics_path = None
+    """
+    The URL path at which the histograms of :attr:`Website.metrics` are served
+    in the Prometheus text format, e.g. ``'/metrics'``. The page is rendered by
+    Pando's ``metrics.spt`` simplate, which can be overridden by putting a file
+    with the same name in the project root (for example to restrict access).
+    :obj:`None` disables the page.
+    """
+
+    metrics_sinks = []
+    """
+    The objects that the timings of each request are passed to when
+    :attr:`collect_metrics` is on, for example
+    ``[StatsdSink(port=8125)]``. See :mod:`pando.metrics`.
+    """
+
+    multipart_max_part_size = None
+    """
+    The maximum size (in bytes) of each part of a ``multipart/form-data`` request
+    body. A 413 response is returned when it's exceeded. :obj:`None` means no
+    limit.
+    """
+
+    multipart_max_size = None
+    """
+    The maximum total size (in bytes) of a ``multipart/form-data`` request body.
+    :obj:`None` means no limit.
+    """
+
+    multipart_spool_threshold = 1024 * 1024
+    """
+    Files uploaded through ``multipart/form-data`` forms are kept in memory
+    until they exceed this size (in bytes), then they're written to a temporary
+    file.
+    """
+
+    response_cache_size = 1000
+    """
+    The maximum number of rendered responses kept in memory by the
+    :attr:`~Website.response_cache`. Set it to 0 to disable the cache. Only
+    simplates that declare a ``response_cache_ttl`` are cached, see
+    :mod:`pando.caching`.
+    """
+
     show_tracebacks = False
     "Show Python tracebacks in error responses."
 
+    static_files_streaming_threshold = 64 * 1024
+    """
+    Static files that are at least this big (in bytes) aren't read into memory,
+    instead they're sent in chunks, or passed to the server's
+    ``wsgi.file_wrapper`` so that it can use ``sendfile()``. Files that are
+    stored in RAM (see Aspen's ``store_static_files_in_ram`` option) are always
+    served from memory. :obj:`None` disables streaming.
+    """
+
     trusted_proxies = []
     """
     The list of reverse proxies that requests to this website go through. With
@@ -255,4 +634,36 @@ class DefaultConfiguration:
     :attr:`~ipaddress.IPv4Address.is_private` attribute is used to determine
     if an IP address is private, both IPv4 and IPv6 are supported).
 
+    The networks are compiled into sorted tables of integer ranges when the
+    :class:`Website` is created, see :mod:`pando.http.proxies`. This option is
+    read-only afterwards: modifying it has no effect on
+    :attr:`~Website.compiled_trusted_proxies`.
+
+    """
+
+    trusted_proxies_cache_size = 1000
+    """
+    The maximum number of ``(REMOTE_ADDR, forwarding header)`` combinations
+    whose results (the :attr:`~pando.http.request.Request.source` and
+    :attr:`~pando.http.request.Request.bypasses_proxy` values) are kept in
+    memory. Set it to 0 to disable the cache.
+    """
+
+    trusted_proxies_header = 'X-Forwarded-For'
+    """
+    The HTTP header that the :attr:`trusted_proxies` use to forward the IP
+    addresses of clients: either ``'X-Forwarded-For'`` or ``'Forwarded'``
+    (`RFC 7239 <https://tools.ietf.org/html/rfc7239>`_). Only the header your
+    proxies actually set should be trusted, because clients can send the
+    other one. When ``'Forwarded'`` is used, the URL scheme of requests is
+    taken from its ``proto`` parameter instead of the ``X-Forwarded-Proto``
+    header. Like :attr:`trusted_proxies`, this option is read-only once the
+    :class:`Website` has been created.
+    """
+
+    uri_cache_size = 0
+    """
+    The maximum number of parsed request URIs (and of decoded hostnames) kept in
+    memory by the :attr:`~Website.uri_cache`. The cache is disabled by default,
+    set this option to a positive number (e.g. 1000) to enable it.
     """
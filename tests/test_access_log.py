@@ -0,0 +1,65 @@
+import io
+import json
+import threading
+
+from pando.access_log import AccessLog
+
+
+def test_access_log_writes_json_lines(harness):
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nGreetings, program!'))
+    stream = io.StringIO()
+    harness.client.hydrate_website(access_log_file=stream)
+    harness.client.GET('/', REMOTE_ADDR=b'1.2.3.4')
+    harness.client.GET('/foo', raise_immediately=False)
+    access_log = harness.client.website.access_log
+    access_log.flush()
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(records) == 2
+    assert records[0]['method'] == 'GET'
+    assert records[0]['path'] == '/'
+    assert records[0]['status'] == 200
+    assert records[0]['match'] == '/index.spt'
+    assert records[0]['bytes'] == len(b'Greetings, program!')
+    assert records[0]['source'] == '1.2.3.4'
+    assert 'timings' not in records[0]
+    assert records[1]['status'] == 404
+    access_log.close()
+
+def test_access_log_includes_timings_when_metrics_are_collected(harness):
+    stream = io.StringIO()
+    harness.client.hydrate_website(access_log_file=stream, collect_metrics=True)
+    harness.client.GET(raise_immediately=False)
+    harness.client.website.access_log.close()
+    record = json.loads(stream.getvalue())
+    assert 'dispatch_path_to_filesystem' in record['timings']
+
+def test_access_log_to_file(harness):
+    path = harness.fs.project.resolve('access.log')
+    harness.client.hydrate_website(access_log_file=path)
+    harness.client.GET(raise_immediately=False)
+    harness.client.website.access_log.close()
+    with open(path) as f:
+        assert json.loads(f.read())['status'] == 404
+
+def test_access_log_sampling_keeps_errors():
+    access_log = AccessLog(io.StringIO(), sample_rate=0)
+    assert not access_log.should_log(200)
+    assert access_log.should_log(404)
+    assert access_log.should_log(None)
+    access_log.close()
+
+def test_access_log_drops_records_when_queue_is_full():
+    unblock = threading.Event()
+
+    class SlowStream(io.StringIO):
+        def write(self, s):
+            unblock.wait()
+            return super().write(s)
+
+    access_log = AccessLog(SlowStream(), max_queue_size=1)
+    access_log.put({'i': 0})
+    access_log.put({'i': 1})
+    access_log.put({'i': 2})
+    assert access_log.dropped >= 1
+    unblock.set()
+    access_log.close()
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import threading
+
+from pando.http.request import make_environ_from_asgi_scope
+
+
+def make_scope(path='/', method='GET', headers=(), query_string=b''):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'https',
+        'path': path,
+        'raw_path': path.encode('utf8'),
+        'query_string': query_string,
+        'root_path': '',
+        'headers': [(b'host', b'localhost')] + list(headers),
+        'client': ('127.0.0.1', 54321),
+        'server': ('localhost', 443),
+    }
+
+
+def call_asgi(website, scope, body=b''):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(website.asgi_app(scope, receive, send))
+    return sent
+
+
+def test_asgi_app_responds(harness):
+    harness.fs.www.mk(('index.html.spt', '[---]\n[---]\nGreetings, program!'))
+    sent = call_asgi(harness.client.website, make_scope())
+    assert sent[0]['type'] == 'http.response.start'
+    assert sent[0]['status'] == 200
+    assert (b'content-type', b'text/html; charset=UTF-8') in sent[0]['headers']
+    assert b''.join(m['body'] for m in sent[1:]) == b'Greetings, program!'
+    assert sent[-1]['more_body'] is False
+
+def test_asgi_app_returns_404(harness):
+    sent = call_asgi(harness.client.website, make_scope('/missing'))
+    assert sent[0]['status'] == 404
+
+def test_asgi_app_passes_body_and_querystring(harness):
+    harness.fs.www.mk(('index.spt', '''
+        [---]
+        value = request.qs['a'] + request.body['b']
+        [---] text/plain via stdlib_format
+        {value}'''))
+    scope = make_scope(
+        method='POST', query_string=b'a=1',
+        headers=[(b'content-type', b'application/x-www-form-urlencoded'),
+                 (b'content-length', b'3')],
+    )
+    sent = call_asgi(harness.client.website, scope, body=b'b=2')
+    assert sent[0]['status'] == 200
+    assert b''.join(m['body'] for m in sent[1:]) == b'12'
+
+def test_asgi_app_awaits_async_chain_functions(harness):
+    harness.fs.www.mk(('index.html.spt', '[---]\n[---]\n%(foo)s'))
+
+    async def add_foo_to_context(request):
+        await asyncio.sleep(0)
+        return {'foo': 'bar'}
+
+    harness.client.website.state_chain.insert_after(
+        'parse_environ_into_request', add_foo_to_context
+    )
+    sent = call_asgi(harness.client.website, make_scope())
+    assert b''.join(m['body'] for m in sent[1:]) == b'bar'
+
+def test_asgi_app_streams_async_iterable_bodies(harness):
+    harness.fs.www.mk(('index.html.spt', '[---]\n[---]\nHi.'))
+
+    async def stream_body(response):
+        async def chunks():
+            yield b'Greetings, '
+            yield 'program!'
+        response.body = chunks()
+
+    harness.client.website.state_chain.insert_after('response_available', stream_body)
+    sent = call_asgi(harness.client.website, make_scope())
+    assert [m['body'] for m in sent[1:]] == [b'Greetings, ', b'program!', b'']
+
+def test_asgi_app_streams_generator_bodies_and_runs_cleanups(harness):
+    harness.fs.www.mk(('index.html.spt', '[---]\n[---]\nHi.'))
+    events = []
+
+    def stream_body(request, response):
+        def chunks():
+            yield 'Greetings, '
+            yield b'program!'
+        response.body = chunks()
+        request.add_cleanup(events.append, 'cleanup')
+
+    harness.client.website.state_chain.insert_after('response_available', stream_body)
+    sent = call_asgi(harness.client.website, make_scope())
+    assert [m['body'] for m in sent[1:]] == [b'Greetings, ', b'program!', b'']
+    assert events == ['cleanup']
+
+def test_asgi_app_runs_regular_chain_functions_off_the_event_loop(harness):
+    harness.fs.www.mk(('index.html.spt', '[---]\n[---]\nHi.'))
+    event = threading.Event()
+    main_thread = threading.current_thread()
+    threads = []
+
+    def block_or_unblock(request):
+        threads.append(threading.current_thread())
+        if request.qs.get('wait'):
+            # This would deadlock if the other request couldn't proceed.
+            assert event.wait(5)
+        else:
+            event.set()
+
+    website = harness.client.website
+    website.state_chain.insert_after('parse_environ_into_request', block_or_unblock)
+
+    async def call(scope):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        await website.asgi_app(scope, receive, send)
+        return sent
+
+    async def main():
+        return await asyncio.gather(
+            call(make_scope(query_string=b'wait=1')), call(make_scope()),
+        )
+
+    for sent in asyncio.run(main()):
+        assert sent[0]['status'] == 200
+    assert main_thread not in threads
+
+def test_asgi_app_streams_static_files(harness):
+    harness.fs.www.mk(('file.txt', 'x' * 100))
+    harness.client.hydrate_website(static_files_streaming_threshold=10)
+    sent = call_asgi(harness.client.website, make_scope('/file.txt'))
+    assert sent[0]['status'] == 200
+    assert b''.join(m['body'] for m in sent[1:]) == b'x' * 100
+
+def test_make_environ_from_asgi_scope():
+    scope = make_scope('/µ', headers=[(b'cookie', b'a=1'), (b'cookie', b'b=2')])
+    environ = make_environ_from_asgi_scope(scope, None)
+    assert environ['PATH_INFO'] == '/µ'.encode('utf8').decode('latin1')
+    assert environ['HTTP_HOST'] == 'localhost'
+    assert environ['HTTP_COOKIE'] == 'a=1; b=2'
+    assert environ['REMOTE_ADDR'] == '127.0.0.1'
+    assert environ['wsgi.url_scheme'] == 'https'
+
+def test_asgi_app_logs_the_traceback_of_a_500(harness, caplog):
+    harness.fs.www.mk(('index.spt', '[---]\nraise ValueError("oops")\n[---] text/plain\n'))
+    harness.client.hydrate_website(show_tracebacks=True)
+    caplog.set_level(logging.INFO)
+    sent = call_asgi(harness.client.website, make_scope())
+    assert sent[0]['status'] == 500
+    body = b''.join(m['body'] for m in sent[1:])
+    assert b'Traceback (most recent call last)' in body
+    assert b'ValueError: oops' in body
+    logged = [r.getMessage() for r in caplog.records if 'ValueError: oops' in r.getMessage()]
+    assert logged and logged[0].startswith('Traceback (most recent call last)')
+
+def test_asgi_app_records_whence_raised(harness):
+    harness.fs.www.mk((
+        'index.spt', 'from pando import Response\n[---]\nraise Response(403)\n[---] text/plain\n'
+    ))
+    state = {}
+
+    def grab_response(response):
+        state['response'] = response
+
+    harness.client.website.state_chain.insert_after('get_response_for_exception', grab_response)
+    sent = call_asgi(harness.client.website, make_scope())
+    assert sent[0]['status'] == 403
+    filepath, linenum = state['response'].whence_raised
+    assert (filepath.endswith('index.spt'), linenum) == (True, 3)
@@ -0,0 +1,99 @@
+from pando import caching
+
+
+CACHED_SIMPLATE = '''\
+response_cache_ttl = 60
+response_cache_vary = ['Accept-Language']
+[---]
+website.renders = getattr(website, 'renders', 0) + 1
+response.headers[b'X-Renders'] = str(website.renders).encode('ascii')
+[---] text/plain via stdlib_format
+{website.renders}'''
+
+
+def test_simplate_without_ttl_is_not_cached(harness):
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nGreetings, program!'))
+    harness.client.GET()
+    harness.client.GET()
+    cache = harness.client.website.response_cache
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+def test_simplate_with_ttl_is_cached(harness):
+    harness.fs.www.mk(('index.spt', CACHED_SIMPLATE))
+    assert harness.client.GET().body == b'1'
+    r = harness.client.GET()
+    assert r.body == b'1'
+    assert r.headers[b'X-Renders'] == b'1'
+    assert r.headers[b'Content-Type'] == b'text/plain; charset=UTF-8'
+    cache = harness.client.website.response_cache
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_cache_key_includes_querystring_and_vary_headers(harness):
+    harness.fs.www.mk(('index.spt', CACHED_SIMPLATE))
+    assert harness.client.GET('/').body == b'1'
+    assert harness.client.GET('/?foo=bar').body == b'2'
+    assert harness.client.GET('/', HTTP_ACCEPT_LANGUAGE=b'fr').body == b'3'
+    assert harness.client.GET('/?foo=bar').body == b'2'
+    assert harness.client.GET('/', HTTP_ACCEPT_LANGUAGE=b'fr').body == b'3'
+
+def test_cache_key_includes_path_wildcards(harness):
+    harness.fs.www.mk(('%name/index.spt', '''\
+response_cache_ttl = 60
+[---]
+name = request.path['name']
+[---] text/plain via stdlib_format
+{name}'''))
+    assert harness.client.GET('/alice/').body == b'alice'
+    assert harness.client.GET('/bob/').body == b'bob'
+    assert harness.client.GET('/alice/').body == b'alice'
+    cache = harness.client.website.response_cache
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_cached_response_expires(harness, monkeypatch):
+    harness.fs.www.mk(('index.spt', CACHED_SIMPLATE))
+    now = [1000.0]
+    monkeypatch.setattr(caching, 'monotonic', lambda: now[0])
+    assert harness.client.GET().body == b'1'
+    now[0] += 59
+    assert harness.client.GET().body == b'1'
+    now[0] += 2
+    assert harness.client.GET().body == b'2'
+
+def test_least_recently_used_responses_are_evicted(harness):
+    harness.fs.www.mk(('index.spt', CACHED_SIMPLATE))
+    harness.client.hydrate_website(response_cache_size=1)
+    assert harness.client.GET('/?a').body == b'1'
+    assert harness.client.GET('/?b').body == b'2'
+    assert harness.client.GET('/?a').body == b'3'
+    cache = harness.client.website.response_cache
+    assert len(cache) == 1
+    assert cache.evictions == 2
+
+def test_responses_that_set_cookies_are_not_cached(harness):
+    harness.fs.www.mk(('index.spt', '''\
+        response_cache_ttl = 60
+        [---]
+        response.headers.cookie['foo'] = 'bar'
+        [---] text/plain
+        Greetings, program!'''))
+    harness.client.GET()
+    assert len(harness.client.website.response_cache) == 0
+
+def test_cache_can_be_disabled(harness):
+    harness.fs.www.mk(('index.spt', CACHED_SIMPLATE))
+    harness.client.hydrate_website(response_cache_size=0)
+    assert harness.client.website.response_cache is None
+    assert harness.client.GET().body == b'1'
+    assert harness.client.GET().body == b'2'
+
+def test_error_responses_are_not_cached(harness):
+    harness.fs.www.mk(('index.spt', '''\
+        from pando import Response
+        response_cache_ttl = 60
+        [---]
+        raise Response(418)
+        [---] text/plain
+        '''))
+    assert harness.client.GET(raise_immediately=False).code == 418
+    assert len(harness.client.website.response_cache) == 0
@@ -0,0 +1,91 @@
+from pytest import raises
+from state_chain import FunctionNotFound
+
+from pando.chain import CompiledStateChain
+
+
+def foo():
+    return {'baz': 1}
+
+def bar():
+    return {'buz': 2}
+
+def bloo(baz, buz, bonus=0):
+    return {'sum': baz + buz + bonus}
+
+def uh_oh(baz):
+    if baz == 2:
+        raise ValueError(baz)
+
+def deal_with_it(exception):
+    return {'exception': None, 'dealt_with': exception}
+
+
+def test_compiled_chain_runs_functions():
+    chain = CompiledStateChain(foo, bar, bloo)
+    assert chain.run()['sum'] == 3
+
+def test_compiled_chain_uses_defaults_for_missing_optional_params():
+    chain = CompiledStateChain(foo, bar, bloo)
+    assert chain.run(bonus=4)['sum'] == 7
+
+def test_compiled_chain_fast_forwards_to_exception_handler():
+    chain = CompiledStateChain(bar, uh_oh, bloo, deal_with_it)
+    state = chain.run(baz=2)
+    assert 'sum' not in state
+    assert isinstance(state['dealt_with'], ValueError)
+    assert state['exception'] is None
+
+def test_compiled_chain_skips_exception_handlers_in_normal_flow():
+    chain = CompiledStateChain(bar, uh_oh, bloo, deal_with_it)
+    state = chain.run(baz=5)
+    assert state['sum'] == 7
+    assert 'dealt_with' not in state
+
+def test_compiled_chain_reraises_unhandled_exception():
+    chain = CompiledStateChain(bar, uh_oh, bloo)
+    with raises(ValueError):
+        chain.run(baz=2)
+
+def test_compiled_chain_honors_raise_immediately():
+    chain = CompiledStateChain(bar, uh_oh, bloo, deal_with_it)
+    with raises(ValueError):
+        chain.run(baz=2, _raise_immediately=True)
+
+def test_compiled_chain_honors_return_after():
+    chain = CompiledStateChain(foo, bar, bloo)
+    state = chain.run(_return_after='bar')
+    assert state['buz'] == 2
+    assert 'sum' not in state
+    with raises(FunctionNotFound):
+        chain.run(_return_after='blah')
+
+def test_compiled_chain_is_recompiled_when_functions_change():
+    chain = CompiledStateChain(bar, bloo)
+    plan = chain.get_plan()
+    assert chain.get_plan() is plan
+    chain.insert_before('bloo', uh_oh)
+    assert chain.get_plan() is not plan
+    assert chain.get_plan().names == ['bar', 'uh_oh', 'bloo']
+    with raises(ValueError):
+        chain.run(baz=2)
+    chain.remove('uh_oh')
+    assert chain.run(baz=2)['sum'] == 4
+
+def test_interpreted_mode_falls_back_to_parent_class():
+    chain = CompiledStateChain(foo, bar, bloo, compiled=False)
+    assert chain.run()['sum'] == 3
+    assert chain._plan is None
+
+def test_website_can_use_compiled_chain(harness):
+    harness.fs.www.mk(('index.html.spt', '[---]\n[---]\nGreetings, program!'))
+    harness.client.hydrate_website(compile_state_chain=True)
+    assert harness.client.website.state_chain.compiled
+    assert harness.client.GET().body == b'Greetings, program!'
+    assert harness.client.GET('/missing', raise_immediately=False).code == 404
+
+def test_timed_chain_records_timings():
+    chain = CompiledStateChain(bar, uh_oh, bloo, deal_with_it, timed=True)
+    state = chain.run(baz=2)
+    assert list(state['timings']) == ['bar', 'uh_oh', 'deal_with_it']
+    assert all(isinstance(ns, int) for ns in state['timings'].values())
@@ -0,0 +1,151 @@
+import gzip
+import os
+
+from pando.compression import StaticVariants, gzip_compress
+from pando.http.response import FileBody
+
+
+TEXT = 'Greetings, program! ' * 100
+SIMPLATE = '[---]\n[---] text/plain\n' + TEXT
+
+
+def test_responses_arent_compressed_by_default(harness):
+    harness.fs.www.mk(('index.spt', SIMPLATE))
+    r = harness.client.GET(HTTP_ACCEPT_ENCODING=b'gzip')
+    assert r.body == TEXT.encode('ascii')
+    assert b'Content-Encoding' not in r.headers
+    assert b'Vary' not in r.headers
+
+def test_simplate_output_is_compressed(harness):
+    harness.fs.www.mk(('index.spt', SIMPLATE))
+    harness.client.hydrate_website(compress_responses=True)
+    r = harness.client.GET(HTTP_ACCEPT_ENCODING=b'gzip, deflate, br')
+    assert r.headers[b'Content-Encoding'] == b'gzip'
+    assert r.headers[b'Vary'] == b'Accept-Encoding'
+    assert gzip.decompress(r.body) == TEXT.encode('ascii')
+
+def test_compression_requires_acceptance_by_the_client(harness):
+    harness.fs.www.mk(('index.spt', SIMPLATE))
+    harness.client.hydrate_website(compress_responses=True)
+    for accept_encoding in (None, b'identity', b'gzip;q=0, *'):
+        headers = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding else {}
+        r = harness.client.GET(**headers)
+        assert r.body == TEXT.encode('ascii')
+        assert b'Content-Encoding' not in r.headers
+        assert r.headers[b'Vary'] == b'Accept-Encoding'
+
+def test_small_and_incompressible_bodies_arent_compressed(harness):
+    harness.fs.www.mk(
+        ('small.spt', '[---]\n[---] text/plain\nHi.'),
+        ('image.spt', '[---]\n[---] image/png\n' + TEXT),
+    )
+    harness.client.hydrate_website(compress_responses=True)
+    r = harness.client.GET('/small', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert r.body == b'Hi.'
+    assert r.headers[b'Vary'] == b'Accept-Encoding'
+    r = harness.client.GET('/image', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert b'Content-Encoding' not in r.headers
+    assert b'Vary' not in r.headers
+
+def test_etag_of_compressed_response_is_weak(harness):
+    harness.fs.www.mk(('file.txt', TEXT))
+    harness.client.hydrate_website(compress_responses=True)
+    r = harness.client.GET('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    etag = r.headers[b'ETag']
+    assert etag.startswith(b'W/"')
+    r = harness.client.GET('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip', HTTP_IF_NONE_MATCH=etag,
+                           raise_immediately=False)
+    assert r.code == 304
+
+def test_static_files_are_compressed_once(harness):
+    harness.fs.www.mk(('file.txt', TEXT))
+    harness.client.hydrate_website(compress_responses=True)
+    r1 = harness.client.GET('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    r2 = harness.client.GET('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert gzip.decompress(r1.body) == TEXT.encode('ascii')
+    assert r2.body is r1.body
+    assert len(harness.client.website.compressed_static_files) == 1
+
+def test_precompressed_sibling_is_preferred(harness):
+    harness.fs.www.mk(('file.txt', TEXT))
+    precompressed = gzip_compress(b'precompressed', 9)
+    harness.fs.www.mk(('file.txt.gz', precompressed, False))
+    st = os.stat(harness.fs.www.resolve('file.txt'))
+    os.utime(harness.fs.www.resolve('file.txt.gz'), ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    harness.client.hydrate_website(compress_responses=True)
+    r = harness.client.GET('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert r.body == precompressed
+
+def test_outdated_precompressed_sibling_is_ignored(harness):
+    harness.fs.www.mk(('file.txt', TEXT), ('file.txt.gz', gzip_compress(b'outdated'), False))
+    st = os.stat(harness.fs.www.resolve('file.txt'))
+    os.utime(harness.fs.www.resolve('file.txt.gz'), ns=(st.st_atime_ns, st.st_mtime_ns - 1))
+    harness.client.hydrate_website(compress_responses=True)
+    r = harness.client.GET('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert gzip.decompress(r.body) == TEXT.encode('ascii')
+
+def test_large_static_files_are_only_compressed_if_precompressed(harness):
+    harness.fs.www.mk(('big.txt', TEXT), ('other.txt', TEXT))
+    harness.fs.www.mk(('big.txt.gz', gzip_compress(TEXT.encode('ascii')), False))
+    harness.client.hydrate_website(compress_responses=True, static_files_streaming_threshold=10)
+    r = harness.client.GET('/big.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert isinstance(r.body, FileBody)
+    assert r.headers[b'Content-Encoding'] == b'gzip'
+    body = b''.join(r.body)
+    r.body.close()
+    assert r.headers[b'Content-Length'] == str(len(body)).encode('ascii')
+    assert gzip.decompress(body) == TEXT.encode('ascii')
+    r = harness.client.GET('/other.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert b'Content-Encoding' not in r.headers
+    assert b''.join(r.body) == TEXT.encode('ascii')
+    r.body.close()
+
+def test_streamed_bodies_are_compressed_on_the_fly(harness):
+    harness.fs.www.mk(('export.spt', """\
+        [---]
+        output.body = ('%i,%i\\n' % (i, i * i) for i in range(1000))
+        output.media_type = 'text/csv'
+        [---]
+    """))
+    harness.client.hydrate_website(compress_responses=True)
+    r = harness.client.GET('/export', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert r.headers[b'Content-Encoding'] == b'gzip'
+    expected = ''.join('%i,%i\n' % (i, i * i) for i in range(1000))
+    assert gzip.decompress(b''.join(r.body)) == expected.encode('ascii')
+
+
+def test_static_variants_are_keyed_by_compression_level(harness):
+    harness.fs.www.mk(('file.txt', TEXT))
+    fspath = harness.fs.www.resolve('file.txt')
+    variants = StaticVariants(10)
+    fast, best = variants.get(fspath, 1), variants.get(fspath, 9)
+    assert fast == gzip_compress(TEXT.encode('ascii'), 1)
+    assert best == gzip_compress(TEXT.encode('ascii'), 9)
+    assert variants.get(fspath, 1) is fast
+    assert len(variants) == 2
+
+
+def test_existing_vary_header_is_merged(harness):
+    harness.fs.www.mk(
+        ('index.spt', "[---]\nresponse.headers[b'Vary'] = b'Cookie'\n[---] text/plain\n" + TEXT),
+        ('again.spt', "[---]\nresponse.headers[b'Vary'] = b'accept-encoding'\n"
+                      "[---] text/plain\n" + TEXT),
+    )
+    harness.client.hydrate_website(compress_responses=True)
+    r = harness.client.GET('/', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert r.headers.all(b'Vary') == [b'Cookie, Accept-Encoding']
+    r = harness.client.GET('/again', HTTP_ACCEPT_ENCODING=b'gzip')
+    assert r.headers.all(b'Vary') == [b'accept-encoding']
+
+
+def test_head_response_headers_match_get(harness):
+    harness.fs.www.mk(('file.txt', TEXT))
+    harness.client.hydrate_website(compress_responses=True)
+    get = harness.client.GET('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    head = harness.client.HEAD('/file.txt', HTTP_ACCEPT_ENCODING=b'gzip')
+    for name in (b'Content-Encoding', b'Vary', b'ETag'):
+        assert head.headers.get(name) == get.headers.get(name)
+    assert head.headers[b'Content-Length'] == str(len(get.body)).encode('ascii')
+    head = harness.client.HEAD('/file.txt')
+    assert head.headers[b'Content-Length'] == str(len(TEXT)).encode('ascii')
+    assert b'Content-Encoding' not in head.headers
@@ -0,0 +1,114 @@
+import os
+
+
+SIMPLATE_WITH_VALIDATORS = '''\
+from datetime import datetime, timezone
+def get_validators(request):
+    return {
+        'etag': '"v2"',
+        'last_modified': datetime(2020, 1, 1, tzinfo=timezone.utc),
+    }
+[---]
+request.rendered = True
+[---] text/plain
+Greetings, program!'''
+
+
+def test_static_resource_has_validators(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt')
+    st = os.stat(harness.fs.www.resolve('file.txt'))
+    assert r.headers[b'ETag'] == b'"%x-%x"' % (st.st_mtime_ns, st.st_size)
+    assert r.headers[b'Last-Modified'].endswith(b' GMT')
+
+def test_if_none_match_returns_304(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    etag = harness.client.GET('/file.txt').headers[b'ETag']
+    r = harness.client.GET('/file.txt', HTTP_IF_NONE_MATCH=etag, raise_immediately=False)
+    assert r.code == 304
+    assert not r.body
+    assert r.headers[b'ETag'] == etag
+
+def test_if_none_match_uses_weak_comparison(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    etag = harness.client.GET('/file.txt').headers[b'ETag']
+    if_none_match = b'"foo", W/' + etag
+    r = harness.client.GET('/file.txt', HTTP_IF_NONE_MATCH=if_none_match, raise_immediately=False)
+    assert r.code == 304
+    r = harness.client.GET('/file.txt', HTTP_IF_NONE_MATCH=b'*', raise_immediately=False)
+    assert r.code == 304
+
+def test_if_none_match_mismatch_returns_200(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_IF_NONE_MATCH=b'"foo"')
+    assert r.code == 200
+    assert r.body == b"Greetings, program!"
+
+def test_if_modified_since_returns_304(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    last_modified = harness.client.GET('/file.txt').headers[b'Last-Modified']
+    r = harness.client.GET('/file.txt', HTTP_IF_MODIFIED_SINCE=last_modified,
+                           raise_immediately=False)
+    assert r.code == 304
+
+def test_if_modified_since_in_the_past_returns_200(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_IF_MODIFIED_SINCE=b'Fri, 17 Nov 2006 00:00:00 GMT')
+    assert r.code == 200
+
+def test_invalid_if_modified_since_is_ignored(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_IF_MODIFIED_SINCE=b'yesterday')
+    assert r.code == 200
+
+def test_if_modified_since_is_ignored_when_if_none_match_is_present(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    last_modified = harness.client.GET('/file.txt').headers[b'Last-Modified']
+    r = harness.client.GET('/file.txt', HTTP_IF_MODIFIED_SINCE=last_modified,
+                           HTTP_IF_NONE_MATCH=b'"foo"')
+    assert r.code == 200
+
+def test_simplate_without_hook_has_no_validators(harness):
+    harness.fs.www.mk(('index.spt', "[---]\n[---] text/plain\nGreetings, program!"))
+    r = harness.client.GET('/')
+    assert b'ETag' not in r.headers
+    assert b'Last-Modified' not in r.headers
+
+def test_simplate_hook_provides_validators(harness):
+    harness.fs.www.mk(('index.spt', SIMPLATE_WITH_VALIDATORS))
+    r = harness.client.GET('/')
+    assert r.code == 200
+    assert r.headers[b'ETag'] == b'"v2"'
+    assert r.headers[b'Last-Modified'] == b'Wed, 01 Jan 2020 00:00:00 GMT'
+
+def test_simplate_is_not_rendered_when_not_modified(harness):
+    harness.fs.www.mk(('index.spt', SIMPLATE_WITH_VALIDATORS))
+    state = harness.client.GET('/', HTTP_IF_NONE_MATCH=b'"v2"', want='state',
+                               raise_immediately=False)
+    assert state['response'].code == 304
+    assert not hasattr(state['request'], 'rendered')
+
+def test_simplate_hook_can_return_a_naive_datetime(harness):
+    harness.fs.www.mk(('index.spt', SIMPLATE_WITH_VALIDATORS.replace(
+        "datetime(2020, 1, 1, tzinfo=timezone.utc)", "datetime(2020, 1, 1)"
+    )))
+    r = harness.client.GET('/')
+    assert r.headers[b'Last-Modified'] == b'Wed, 01 Jan 2020 00:00:00 GMT'
+    r = harness.client.GET('/', HTTP_IF_MODIFIED_SINCE=r.headers[b'Last-Modified'],
+                           raise_immediately=False)
+    assert r.code == 304
+    r = harness.client.GET('/', HTTP_IF_MODIFIED_SINCE=b'Tue, 31 Dec 2019 23:59:59 GMT')
+    assert r.code == 200
+
+def test_unsafe_methods_are_not_short_circuited(harness):
+    harness.fs.www.mk(('index.spt', SIMPLATE_WITH_VALIDATORS))
+    r = harness.client.POST('/', HTTP_IF_NONE_MATCH=b'"v2"')
+    assert r.code == 200
+
+def test_if_range_with_current_etag_allows_range(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    etag = harness.client.GET('/file.txt').headers[b'ETag']
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=0-8', HTTP_IF_RANGE=etag)
+    assert r.code == 206
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=0-8', HTTP_IF_RANGE=b'W/' + etag)
+    assert r.code == 200
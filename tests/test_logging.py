@@ -0,0 +1,32 @@
+import logging
+
+from pando.logging import get_logger, log
+
+
+def test_get_logger_returns_cached_wrapper():
+    logger = get_logger('pando.test')
+    assert logger is get_logger('pando.test')
+    assert logger.logger is logging.getLogger('pando.test')
+
+def test_logger_methods(caplog):
+    caplog.set_level(logging.INFO, logger='pando.test')
+    logger = get_logger('pando.test')
+    logger.log('%s %s', 'foo', 'bar', level=logging.INFO)
+    logger.log_dammit('boom')
+    logger.log('ignored', level=logging.DEBUG)
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [
+        (logging.INFO, 'foo bar'), (logging.CRITICAL, 'boom'),
+    ]
+
+def test_log_uses_name_of_calling_module(caplog):
+    log('hello')
+    assert caplog.records[0].name == __name__
+
+def test_access_log_message_isnt_formatted_when_level_is_disabled(harness, caplog):
+    caplog.set_level(logging.WARNING, logger='pando.state_chain')
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nGreetings, program!'))
+    response = harness.client.GET(want='response')
+    assert response.code == 200
+    assert not [r for r in caplog.records if r.name == 'pando.state_chain']
+    harness.client.GET('/foo', raise_immediately=False)
+    assert caplog.records[-1].getMessage().startswith('404 Not Found')
@@ -1,9 +1,12 @@
+from copy import copy, deepcopy
+import pickle
+
 from pytest import raises
 
 from pando import Response
 from pando.exceptions import CRLFInjection
 from pando.http.mapping import Mapping, CaseInsensitiveMapping, BytesMapping
-from pando.http.baseheaders import BaseHeaders
+from pando.http.baseheaders import BaseHeaders, ResponseHeaders
 
 
 def test_accessing_missing_key_raises_Response():
@@ -109,3 +112,87 @@ def test_headers_reject_CR_injection_from_add():
 def test_headers_reject_LF_injection_from_add():
     with raises(CRLFInjection):
         BaseHeaders().add(b'foo', b'\nbar')
+
+def test_headers_access_is_case_insensitive_for_all_methods():
+    headers = BaseHeaders([(b'Content-Type', b'text/plain')])
+    headers.add(b'VARY', b'Accept')
+    headers.add(b'vary', b'Cookie')
+    assert b'content-type' in headers
+    assert headers[b'CONTENT-TYPE'] == b'text/plain'
+    assert headers.all(b'Vary') == [b'Accept', b'Cookie']
+    assert headers.pop(b'vary') == b'Cookie'
+    assert headers.popall(b'Vary') == [b'Accept']
+    assert b'Vary' not in headers
+    del headers[b'content-TYPE']
+    assert len(headers) == 0
+
+def test_headers_setitem_replaces_all_values():
+    headers = BaseHeaders()
+    headers.add(b'Vary', b'Accept')
+    headers.add(b'Vary', b'Cookie')
+    headers[b'vary'] = b'Accept-Encoding'
+    assert headers.all(b'Vary') == [b'Accept-Encoding']
+    assert headers.raw == b'Vary: Accept-Encoding'
+
+def test_headers_items_are_title_cased_and_grouped():
+    headers = BaseHeaders({b'ETAG': b'"1"', b'x-foo': b'a'})
+    headers.add(b'X-Foo', b'b')
+    assert list(headers.items()) == [(b'Etag', [b'"1"']), (b'X-Foo', [b'a', b'b'])]
+    assert list(headers) == [b'Etag', b'X-Foo']
+    assert headers == {b'Etag': [b'"1"'], b'X-Foo': [b'a', b'b']}
+
+def test_headers_are_a_dict_of_lists():
+    headers = BaseHeaders({b'Content-Type': b'text/plain'})
+    headers.add(b'vary', b'Accept')
+    headers.add(b'Vary', b'Cookie')
+    assert isinstance(headers, dict)
+    assert isinstance(headers, CaseInsensitiveMapping)
+    assert isinstance(headers, BytesMapping)
+    assert dict(headers) == {b'Content-Type': [b'text/plain'], b'Vary': [b'Accept', b'Cookie']}
+    del headers[b'VARY']
+    headers.update({b'x-foo': b'bar'})
+    assert dict(headers) == {b'Content-Type': [b'text/plain'], b'X-Foo': [b'bar']}
+    assert headers.raw == b'Content-Type: text/plain\r\nX-Foo: bar'
+
+def test_headers_all_returns_the_stored_list():
+    headers = BaseHeaders({b'Vary': b'Accept'})
+    headers.all(b'vary').append(b'Cookie')
+    assert headers.all(b'Vary') == [b'Accept', b'Cookie']
+    assert headers.all('Vary') == ['Accept', 'Cookie']
+    assert headers.all(b'X-Missing') == []
+
+def test_headers_can_be_pickled_and_copied():
+    headers = ResponseHeaders({b'Content-Type': b'text/plain'})
+    headers.add(b'Vary', b'Accept')
+    headers.add(b'Vary', b'Cookie')
+    headers.cookie['foo'] = 'bar'
+    for clone in (pickle.loads(pickle.dumps(headers)), copy(headers), deepcopy(headers)):
+        assert type(clone) is ResponseHeaders
+        assert dict(clone) == dict(headers)
+        assert clone.cookie['foo'].value == 'bar'
+        clone.add(b'Vary', b'Origin')
+        assert headers.all(b'Vary') == [b'Accept', b'Cookie']
+
+def test_headers_update_checks_for_CRLF():
+    headers = BaseHeaders()
+    with raises(CRLFInjection):
+        headers.update({b'X-Foo': b'bar\r\nbaz'})
+
+def test_headers_transcode_str_names_and_values():
+    headers = BaseHeaders()
+    headers['Content-Type'] = 'text/plain'
+    assert headers[b'Content-Type'] == b'text/plain'
+    assert headers['content-type'] == 'text/plain'
+    assert headers.get('Missing', 'default') == 'default'
+
+def test_headers_can_be_copied():
+    headers = BaseHeaders({b'Foo': b'bar'})
+    copy = BaseHeaders(headers)
+    copy[b'Foo'] = b'baz'
+    assert headers[b'Foo'] == b'bar'
+    assert Response(headers=headers).headers[b'Foo'] == b'bar'
+
+def test_headers_missing_key_raises_400():
+    with raises(Response) as x:
+        BaseHeaders()[b'Foo']
+    assert x.value.code == 400
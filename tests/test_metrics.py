@@ -0,0 +1,100 @@
+import logging
+import socket
+
+from pando.metrics import Histogram, LogSink, Metrics, StatsdSink
+
+
+class ListSink:
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, timings, total):
+        self.records.append((timings, total))
+
+
+def test_metrics_are_off_by_default(harness):
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nGreetings, program!'))
+    state = harness.client.GET(want='state')
+    assert 'timings' not in state
+    assert harness.client.website.metrics is None
+
+def test_state_chain_functions_are_timed(harness):
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nGreetings, program!'))
+    harness.client.hydrate_website(collect_metrics=True)
+    timings = harness.client.GET(want='state')['timings']
+    assert 'dispatch_path_to_filesystem' in timings
+    assert 'render_response' in timings
+    assert all(isinstance(ns, int) and ns >= 0 for ns in timings.values())
+    metrics = harness.client.website.metrics
+    assert metrics.requests.count == 1
+    assert metrics.functions['render_response'].count == 1
+
+def test_timings_are_passed_to_sinks(harness):
+    sink = ListSink()
+    harness.client.hydrate_website(collect_metrics=True, metrics_sinks=[sink])
+    harness.client.GET(raise_immediately=False)
+    assert len(sink.records) == 1
+    timings, total = sink.records[0]
+    assert 'raise_404_if_missing' in timings
+    assert total >= sum(timings.values())
+
+def test_failing_sink_does_not_break_requests(harness):
+    class BrokenSink:
+        def record(self, timings, total):
+            raise ZeroDivisionError
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nGreetings, program!'))
+    harness.client.hydrate_website(collect_metrics=True, metrics_sinks=[BrokenSink()])
+    assert harness.client.GET().body == b'Greetings, program!'
+
+def test_metrics_page(harness):
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nGreetings, program!'))
+    harness.client.hydrate_website(collect_metrics=True, metrics_path='/metrics')
+    harness.client.GET()
+    r = harness.client.GET('/metrics')
+    assert r.headers[b'Content-Type'] == b'text/plain; version=0.0.4; charset=utf-8'
+    assert b'pando_request_duration_seconds_count 1\n' in r.body
+    assert (
+        b'pando_state_chain_function_duration_seconds_count{function="render_response"} 1\n'
+    ) in r.body
+
+def test_metrics_page_returns_404_when_metrics_are_off(harness):
+    harness.client.hydrate_website(metrics_path='/metrics')
+    assert harness.client.GET('/metrics', raise_immediately=False).code == 404
+
+
+def test_histogram_buckets_are_cumulative_in_prometheus_format():
+    metrics = Metrics(buckets=(1000, 1000000))
+    metrics.record({'foo': 500}, 2000)
+    metrics.record({'foo': 5000000}, 6000000)
+    assert metrics.to_prometheus(prefix='x').splitlines()[-5:] == [
+        'x_state_chain_function_duration_seconds_bucket{function="foo",le="1e-06"} 1',
+        'x_state_chain_function_duration_seconds_bucket{function="foo",le="0.001"} 1',
+        'x_state_chain_function_duration_seconds_bucket{function="foo",le="+Inf"} 2',
+        'x_state_chain_function_duration_seconds_sum{function="foo"} 0.0050005',
+        'x_state_chain_function_duration_seconds_count{function="foo"} 2',
+    ]
+
+def test_histogram_upper_bounds_are_inclusive():
+    h = Histogram((10,))
+    h.observe(10)
+    h.observe(11)
+    assert h.counts == [1, 1]
+
+def test_log_sink(caplog):
+    caplog.set_level(logging.INFO, logger='pando.metrics')
+    LogSink().record({'foo': 1500000}, 2000000)
+    assert caplog.messages == ['request took 2.000ms (foo: 1.500ms)']
+
+def test_statsd_sink():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    try:
+        sink = StatsdSink(port=server.getsockname()[1], max_packet_size=40)
+        sink.record({'foo': 1500000}, 2000000)
+        sink.close()
+        assert server.recv(100) == b'pando.request:2.000|ms'
+        assert server.recv(100) == b'pando.state_chain.foo:1.500|ms'
+    finally:
+        server.close()
@@ -0,0 +1,118 @@
+import os
+from datetime import datetime, timezone
+
+from pando.http.ranges import parse_range_header
+from pando.http.response import FileBody
+from pando.utils import to_rfc822
+
+
+def test_parse_range_header_handles_open_ended_and_suffix_ranges():
+    assert parse_range_header(b'bytes=2-', 10) == [(2, 9)]
+    assert parse_range_header(b'bytes=-20', 10) == [(0, 9)]
+    assert parse_range_header(b'bytes=5-100', 10) == [(5, 9)]
+
+def test_parse_range_header_merges_overlapping_ranges():
+    assert parse_range_header(b'bytes=6-8,0-1,2-3,7-9', 10) == [(0, 3), (6, 9)]
+
+def test_parse_range_header_rejects_invalid_values():
+    assert parse_range_header(b'bytes=', 10) is None
+    assert parse_range_header(b'bytes=5-2', 10) is None
+    assert parse_range_header(b'bytes=a-b', 10) is None
+    assert parse_range_header(b'bytes=-', 10) is None
+    assert parse_range_header(b'0-5', 10) is None
+
+def test_parse_range_header_returns_empty_list_when_unsatisfiable():
+    assert parse_range_header(b'bytes=10-', 10) == []
+    assert parse_range_header(b'bytes=-0', 10) == []
+    assert parse_range_header(b'bytes=0-', 0) == []
+
+
+def test_static_resource_advertises_range_support(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    assert harness.client.GET('/file.txt').headers[b'Accept-Ranges'] == b'bytes'
+    assert harness.client.HEAD('/file.txt').headers[b'Accept-Ranges'] == b'bytes'
+
+def test_single_range_request(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=11-17')
+    assert r.code == 206
+    assert r.body == b'program'
+    assert r.headers[b'Content-Range'] == b'bytes 11-17/19'
+    assert r.headers[b'Content-Type'] == b'text/plain'
+
+def test_suffix_range_request(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=-8')
+    assert r.code == 206
+    assert r.body == b'program!'
+    assert r.headers[b'Content-Range'] == b'bytes 11-18/19'
+
+def test_multiple_range_request(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=0-8, 11-17')
+    assert r.code == 206
+    content_type = r.headers[b'Content-Type']
+    assert content_type.startswith(b'multipart/byteranges; boundary=')
+    boundary = content_type.split(b'=', 1)[1]
+    assert r.body == (
+        b'\r\n--' + boundary + b'\r\n'
+        b'Content-Type: text/plain\r\n'
+        b'Content-Range: bytes 0-8/19\r\n'
+        b'\r\n'
+        b'Greetings'
+        b'\r\n--' + boundary + b'\r\n'
+        b'Content-Type: text/plain\r\n'
+        b'Content-Range: bytes 11-17/19\r\n'
+        b'\r\n'
+        b'program'
+        b'\r\n--' + boundary + b'--\r\n'
+    )
+
+def test_unsatisfiable_range_request(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=50-', raise_immediately=False)
+    assert r.code == 416
+    assert r.headers[b'Content-Range'] == b'bytes */19'
+
+def test_invalid_range_header_is_ignored(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=9-0')
+    assert r.code == 200
+    assert r.body == b'Greetings, program!'
+
+def test_range_request_for_file_stored_in_ram(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    harness.client.hydrate_website(store_static_files_in_ram=True)
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=0-8')
+    assert r.code == 206
+    assert r.body == b'Greetings'
+
+def test_if_range_with_current_date_allows_range(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    mtime = int(os.stat(harness.fs.www.resolve('file.txt')).st_mtime)
+    last_modified = to_rfc822(datetime.fromtimestamp(mtime, timezone.utc)).encode('ascii')
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=0-8', HTTP_IF_RANGE=last_modified)
+    assert r.code == 206
+    assert r.body == b'Greetings'
+
+def test_if_range_mismatch_returns_full_file(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    r = harness.client.GET(
+        '/file.txt', HTTP_RANGE=b'bytes=0-8', HTTP_IF_RANGE=b'Sat, 18 Nov 2006 00:00:00 GMT'
+    )
+    assert r.code == 200
+    assert r.body == b'Greetings, program!'
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=0-8', HTTP_IF_RANGE=b'"abc"')
+    assert r.code == 200
+
+def test_large_range_is_read_from_offset(harness):
+    harness.fs.www.mk(('file.txt', "Greetings, program!"))
+    harness.client.hydrate_website(static_files_streaming_threshold=5)
+    r = harness.client.GET('/file.txt', HTTP_RANGE=b'bytes=11-17')
+    assert r.code == 206
+    assert isinstance(r.body, FileBody)
+    assert (r.body.offset, r.body.length) == (11, 7)
+    assert r.headers[b'Content-Length'] == b'7'
+    assert not r.body.reaches_eof()
+    assert b''.join(r.body) == b'program'
+    r.body.close()
@@ -1,10 +1,12 @@
-from ipaddress import IPv4Network
+from ipaddress import IPv4Network, IPv6Network, ip_address
 
 from pytest import raises
 
 from pando import Response
-from pando.http.request import kick_against_goad, make_franken_uri, Request
+from pando.exceptions import CRLFInjection
+from pando.http.request import EnvironView, URICache, kick_against_goad, make_franken_uri, Request
 from pando.http.baseheaders import BaseHeaders
+from pando.http.proxies import ProxyLevel, TrustedProxies, parse_forwarded_header
 
 
 def test_raw_is_raw():
@@ -16,6 +18,85 @@ def test_raw_is_raw():
 def test_blank_by_default():
     raises(AttributeError, lambda: Request(None).version)
 
+def test_headers_are_parsed_on_first_access():
+    request = Request(None, headers={b'Cookie': b'foo=bar'})
+    assert request._headers is None
+    assert request.cookie['foo'].value == 'bar'
+    assert request.headers is request._headers
+    assert request._raw_headers is None
+
+def test_crlf_injection_in_request_headers_is_rejected_while_parsing(harness):
+    environ = harness.client.build_wsgi_environ('GET', '/')
+    environ[b'HTTP_X_FOO'] = b'bar\r\nSet-Cookie: evil=1'
+    with raises(CRLFInjection):
+        Request.from_wsgi(harness.client.website, environ)
+    harness.fs.www.mk(('index.spt', '[---]\n[---] text/plain\nHi.'))
+    r = harness.client.GET('/', HTTP_X_FOO=b'bar\nbaz', raise_immediately=False)
+    assert r.code == 400
+
+def test_path_and_querystring_mappings_are_parsed_on_first_access():
+    request = Request(None, uri=b'/foo/bar?baz=buz')
+    path, qs = request.line.uri.path, request.line.uri.querystring
+    assert 'mapping' not in path.__dict__
+    assert 'mapping' not in qs.__dict__
+    assert request.qs['baz'] == 'buz'
+    assert [part for part in path.parts] == ['foo', 'bar']
+    assert request.path is path.mapping
+
+def test_request_attributes_are_stored_in_slots(harness):
+    request = harness.client.GET(return_after='parse_environ_into_request', want='request')
+    request.headers, request.source, request.bypasses_proxy
+    assert request.__dict__ == {}
+    request.user = 'alice'
+    assert request.__dict__ == {'user': 'alice'}
+
+def test_uri_cache_returns_independent_copies():
+    cache = URICache(10)
+    uri1 = cache.get_uri(b'/foo;a=1/bar?baz=buz')
+    uri2 = cache.get_uri(b'/foo;a=1/bar?baz=buz')
+    assert (cache.uris.hits, cache.uris.misses) == (1, 1)
+    assert uri1 == uri2 == b'/foo;a=1/bar?baz=buz'
+    assert uri1.path is not uri2.path
+    assert uri1.decoded == '/foo;a=1/bar?baz=buz'
+    uri1.querystring.mapping.add('baz', 'qux')
+    uri1.path.mapping['id'] = '42'
+    uri1.path.mapping.parts[0].params['a'] = '2'
+    assert uri2.querystring.mapping.all('baz') == ['buz']
+    assert 'id' not in uri2.path.mapping
+    assert uri2.path.mapping.parts[0].params['a'] == '1'
+    assert uri2.path.mapping.parts == ['foo', 'bar']
+    assert cache.get_uri(b'/foo;a=1/bar?baz=buz').querystring.mapping.all('baz') == ['buz']
+
+def test_uri_cache_evicts_least_recently_used_uris():
+    cache = URICache(1)
+    cache.get_uri(b'/a')
+    cache.get_uri(b'/b')
+    cache.get_uri(b'/a')
+    assert (cache.uris.hits, cache.uris.misses, cache.uris.evictions) == (0, 3, 2)
+    assert len(cache.uris) == 1
+    assert (cache.hosts.hits, cache.hosts.misses, len(cache.hosts)) == (0, 0, 0)
+
+def test_uri_cache_decodes_hosts(harness):
+    harness.client.hydrate_website(uri_cache_size=1000)
+    request = harness.client.GET(
+        return_after='parse_environ_into_request', want='request',
+        HTTP_HOST=b'xn--bcher-kva.example',
+    )
+    assert request.host == 'bücher.example'
+    assert request.host == 'bücher.example'
+    cache = harness.client.website.uri_cache
+    assert (cache.hosts.hits, cache.hosts.misses) == (1, 1)
+    request.headers[b'Host'] = b'\xff'
+    with raises(Response) as info:
+        request.host
+    assert info.value.code == 400
+
+def test_uri_cache_is_disabled_by_default(harness):
+    assert harness.client.website.uri_cache is None
+    request = harness.client.GET('/?a=1', return_after='parse_environ_into_request', want='request')
+    assert request.qs['a'] == '1'
+    assert request.host == 'localhost'
+
 def test_request_line_version_defaults_to_HTTP_1_1(harness):
     request = harness.make_request()
     actual = request.line.version.info
@@ -102,6 +183,13 @@ def test_baseheaders_loads_cookies_as_str():
     headers = BaseHeaders({b"Cookie": b"key=value"})
     assert headers.cookie[str('key')].value == str('value')
 
+def test_baseheaders_loads_cookies_on_first_access():
+    headers = BaseHeaders({b"Cookie": b"key=value"})
+    assert headers._cookie is None
+    assert not headers.has_cookies
+    assert headers.cookie['key'].value == 'value'
+    assert headers.has_cookies
+
 
 # aliases
 
@@ -297,3 +385,134 @@ def test_request_source_is_cached(harness):
     src1 = r.source
     src2 = r.source
     assert src1 is src2
+
+def test_request_source_resolutions_are_cached_by_the_website(harness):
+    r1 = request(harness, b'8.8.8.8,141.101.69.139', b'10.0.0.1')
+    r2 = harness.client.GET(
+        '/', HTTP_X_FORWARDED_FOR=b'8.8.8.8,141.101.69.139', REMOTE_ADDR=b'10.0.0.1',
+        return_after='parse_environ_into_request', want='request',
+    )
+    assert r2.source is r1.source
+    assert len(harness.client.website.compiled_trusted_proxies.cache) == 1
+
+def test_trusted_proxies_are_compiled_when_the_website_is_created(harness):
+    with raises(ValueError):
+        harness.client.hydrate_website(trusted_proxies_header='X-Real-IP')
+    harness.client.hydrate_website(trusted_proxies=[[IPv4Network('192.168.0.0/16')]])
+    compiled = harness.client.website.compiled_trusted_proxies
+    assert compiled.resolve(b'10.0.0.1', b'8.8.8.8')[0] == ip_address('10.0.0.1')
+
+def test_request_scheme_and_source_use_the_same_trusted_proxies(harness):
+    r = request(harness, b'8.8.8.8', b'10.0.0.1', HTTP_X_FORWARDED_PROTO=b'http')
+    harness.client.website.trusted_proxies = []
+    harness.client.website.trusted_proxies_header = 'Forwarded'
+    assert str(r.source) == '8.8.8.8'
+    assert r.scheme == 'http'
+
+def test_request_source_without_remote_addr_or_forwarding_header(harness):
+    r = harness.client.GET('/', return_after='parse_environ_into_request', want='request')
+    del r.environ[b'REMOTE_ADDR']
+    assert r.source is None
+    assert r.bypasses_proxy is None
+
+def test_proxy_level_merges_overlapping_and_adjacent_networks():
+    level = ProxyLevel([
+        IPv4Network('10.1.0.0/16'), IPv4Network('10.0.0.0/16'), IPv4Network('10.0.0.0/8'),
+        IPv4Network('11.0.0.0/8'), IPv4Network('192.168.0.0/24'),
+        IPv6Network('2001:db8::/32'),
+    ])
+    assert level.ranges[4] == (
+        [int(ip_address('10.0.0.0')), int(ip_address('192.168.0.0'))],
+        [int(ip_address('11.255.255.255')), int(ip_address('192.168.0.255'))],
+    )
+    assert ip_address('11.0.0.0') in level
+    assert ip_address('192.168.1.0') not in level
+    assert ip_address('2001:db8::1') in level
+    assert ip_address('2001:db9::1') not in level
+    assert ip_address('::1') not in level
+
+def test_proxy_level_private():
+    level = ProxyLevel(['private'])
+    assert ip_address('172.16.0.1') in level
+    assert ip_address('fd00::1') in level
+    assert ip_address('8.8.8.8') not in level
+
+def test_parse_forwarded_header():
+    assert parse_forwarded_header(b'For="[2001:db8::1]:8080";Proto=http;by=10.0.0.1') == [
+        (b'[2001:db8::1]:8080', 'http'),
+    ]
+    assert parse_forwarded_header(b'proto=https, for=_hidden') == [
+        (b'', 'https'), (b'_hidden', None),
+    ]
+
+def forwarded_request(harness, forwarded, source, **kw):
+    harness.client.hydrate_website(trusted_proxies_header='Forwarded', trusted_proxies=[
+        [IPv4Network('10.0.0.0/8')],
+        [IPv6Network('2001:db8::/32')],
+    ])
+    kw['HTTP_FORWARDED'] = forwarded
+    kw['REMOTE_ADDR'] = source
+    return harness.client.GET(
+        '/', return_after='parse_environ_into_request', want='request', **kw
+    )
+
+def test_request_source_with_forwarded_header(harness):
+    r = forwarded_request(
+        harness, b'for=8.8.8.8:4711;proto=http, for="[2001:db8::17]"', b'10.0.0.1'
+    )
+    assert str(r.source) == '8.8.8.8'
+    assert r.bypasses_proxy is False
+    assert r.scheme == 'http'
+
+def test_request_source_with_forwarded_header_from_untrusted_client(harness):
+    r = forwarded_request(
+        harness, b'for=1.1.1.1;proto=http, for="[2001:db9::1]";proto=https', b'10.0.0.1'
+    )
+    assert str(r.source) == '2001:db9::1'
+    assert r.bypasses_proxy is True
+    assert r.scheme == 'https'
+
+def test_request_source_ignores_x_forwarded_for_in_forwarded_mode(harness):
+    r = forwarded_request(harness, b'for=8.8.8.8', b'10.0.0.1', HTTP_X_FORWARDED_FOR=b'1.1.1.1')
+    assert str(r.source) == '8.8.8.8'
+
+def test_request_source_with_invalid_forwarded_header_and_no_remote_addr(harness):
+    with raises(Response) as x:
+        TrustedProxies([], 'Forwarded').resolve(None, b'for=unknown')
+    assert x.value.code == 400
+    assert TrustedProxies([], 'Forwarded').resolve(None, b'for="[::1]:80"')[0] == ip_address('::1')
+
+def test_environ_view_transcodes_on_access():
+    environ = {'REMOTE_ADDR': '1.2.3.4', 'wsgi.errors': None}
+    view = EnvironView(environ)
+    assert dict.__len__(view) == 0
+    assert view[b'REMOTE_ADDR'] == b'1.2.3.4'
+    assert view.get('REMOTE_ADDR') == b'1.2.3.4'
+    assert dict.__len__(view) == 1
+    assert view.get(b'REMOTE_PORT') is None
+    assert b'wsgi.errors' in view
+    assert dict(view) == {b'REMOTE_ADDR': b'1.2.3.4', b'wsgi.errors': None}
+
+def test_environ_view_does_not_modify_the_original_environ():
+    environ = {'REMOTE_ADDR': '1.2.3.4', 'SERVER_NAME': 'localhost'}
+    view = EnvironView(environ)
+    view[b'REMOTE_ADDR'] = b'5.6.7.8'
+    del view[b'SERVER_NAME']
+    assert view[b'REMOTE_ADDR'] == b'5.6.7.8'
+    assert b'SERVER_NAME' not in view
+    assert view.get(b'SERVER_NAME') is None
+    assert list(view) == [b'REMOTE_ADDR']
+    assert environ == {'REMOTE_ADDR': '1.2.3.4', 'SERVER_NAME': 'localhost'}
+
+def test_from_wsgi_wraps_native_environ_in_a_view(harness):
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': '/foo', 'QUERY_STRING': 'bar=baz',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'example.com',
+        'CONTENT_TYPE': 'text/plain', 'wsgi.input': None, 'wsgi.url_scheme': 'http',
+    }
+    request = Request.from_wsgi(harness.client.website, environ)
+    assert request.line == b'POST /foo?bar=baz HTTP/1.1'
+    assert request.headers[b'Content-Type'] == b'text/plain'
+    assert isinstance(request.environ, EnvironView)
+    assert request.environ[b'wsgi.url_scheme'] == b'http'
+    assert request.environ.environ is environ
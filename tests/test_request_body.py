@@ -1,8 +1,12 @@
 from io import BytesIO
+import json
+from tempfile import SpooledTemporaryFile
 
 from pytest import raises
 
-from pando.exceptions import MalformedBody, UnknownBodyType
+from pando import body_parsers
+from pando.exceptions import BodyTooLarge, MalformedBody, UnknownBodyType
+from pando.http.multipart import MultipartParser, get_boundary
 from pando.http.request import Request
 from pando.http.response import Response
 
@@ -88,3 +92,211 @@ def test_bad_content_length(harness):
             b'Content-Type': b'application/json',
         })
     assert x.value.code == 400
+
+
+# urlencoded
+
+def test_urlencoded_body_is_unquoted_and_decoded(harness):
+    body = make_body(harness, "q=caf%C3%A9+au+lait&a%2Bb=%26&blank=&flag&&=x&bad=%ff")
+    assert dict(body) == {
+        'q': ['café au lait'], 'a+b': ['&'], 'blank': [''], 'flag': [''], '': ['x'],
+        'bad': ['\ufffd'],
+    }
+
+def test_urlencoded_field_count_limit(harness):
+    harness.client.hydrate_website(form_max_fields=3)
+    assert make_body(harness, "a=1&&b=2&c=3&").all('a') == ['1']
+    with raises(MalformedBody) as x:
+        make_body(harness, "a=1&b=2&c=3&d=4")
+    assert x.value.code == 400
+
+def test_urlencoded_key_length_limit(harness):
+    harness.client.hydrate_website(form_max_key_length=5)
+    assert make_body(harness, "abcde=1")['abcde'] == '1'
+    with raises(MalformedBody):
+        make_body(harness, "abcdef=1")
+
+def test_urlencoded_body_bytes_are_kept(harness):
+    raw = b'a=1&b=2'
+    request = make_request(harness, raw)
+    request.headers[b'Content-Type'] = b'application/x-www-form-urlencoded'
+    assert request.body['b'] == '2'
+    assert request.body_bytes == raw
+
+def test_formdata_parses_urlencoded_bodies_without_limits():
+    raw = b'&'.join(b'k%i=%i' % (i, i) for i in range(2000))
+    body = body_parsers.formdata(raw, {b'Content-Type': b'application/x-www-form-urlencoded'})
+    assert len(body) == 2000
+    assert body['k1999'] == '1999'
+
+
+# json
+
+def test_json_body_is_parsed_from_bytes(harness):
+    body = make_body(harness, r'{"a": [1, 2.5, "\u00e9"]}', content_type=b"application/json")
+    assert body == {"a": [1, 2.5, "é"]}
+
+def test_json_body_accepts_what_the_standard_decoder_accepts(harness):
+    body = make_body(harness, '[NaN, 123456789012345678901234567890]',
+                     content_type=b"application/json")
+    assert body[0] != body[0]
+    assert body[1] == 123456789012345678901234567890
+
+def test_json_body_with_invalid_utf8(harness):
+    with raises(MalformedBody):
+        make_body(harness, b'"\xff"', content_type=b"application/json")
+
+def test_json_body_bytes_are_kept(harness):
+    raw = b'{"a": 1}'
+    request = make_request(harness, raw)
+    request.headers[b'Content-Type'] = b'application/json'
+    assert request.body == {"a": 1}
+    assert request.body_bytes == raw
+
+def test_json_loads_only_falls_back_for_what_orjson_rejects(monkeypatch):
+    class FakeOrjson:
+        JSONDecodeError = json.JSONDecodeError
+
+        @staticmethod
+        def loads(raw):
+            if b'NaN' in raw:
+                raise json.JSONDecodeError("unexpected character", raw.decode(), 1)
+            return json.loads(raw)
+
+    monkeypatch.setattr(body_parsers, '_orjson', FakeOrjson)
+    fallbacks = []
+    monkeypatch.setattr(body_parsers.json, 'loads', lambda raw: fallbacks.append(raw) or [])
+    assert body_parsers.json_loads(b'[NaN]') == []
+    assert fallbacks == [b'[NaN]']
+    with raises(ValueError):
+        body_parsers.json_loads(b'[1,]')
+    assert fallbacks == [b'[NaN]']
+
+def test_json_parser_has_a_size_limit(harness):
+    harness.client.hydrate_website(json_max_body_size=1000)
+    parser = harness.client.website.body_parsers['application/json']
+    assert isinstance(parser, body_parsers.JSONParser)
+    assert parser.max_body_size == 1000
+    assert parser(b'{"a": 1}', {}) == {"a": 1}
+
+def test_json_decoder_can_be_replaced(harness, monkeypatch):
+    monkeypatch.setattr(body_parsers, 'json_loads', lambda raw: ('custom', bytes(raw)))
+    body = make_body(harness, '{}', content_type=b"application/json")
+    assert body == ('custom', b'{}')
+
+def test_json_body_size_limit_is_checked_before_reading(harness):
+    harness.client.hydrate_website(json_max_body_size=10)
+    stream = BytesIO(b'[1, 2, 3, 4, 5]')
+    request = Request(harness.client.website, body=stream, headers={
+        b'Content-Type': b'application/json', b'Content-Length': b'15', b'Host': b'Blah',
+    })
+    with raises(BodyTooLarge) as x:
+        request.body
+    assert x.value.code == 413
+    assert stream.tell() == 0
+    assert make_body(harness, '[1, 2, 3]', content_type=b"application/json") == [1, 2, 3]
+
+def make_request(harness, raw, **headers):
+    headers = {b'Content-Length': str(len(raw)).encode('ascii'), b'Host': b'Blah', **headers}
+    return Request(harness.client.website, body=BytesIO(raw), headers=headers)
+
+def test_iter_json_array(harness):
+    elements = [{"id": i, "tags": ["a", "b"], "score": i / 3} for i in range(1000)]
+    request = make_request(harness, json.dumps(elements).encode('ascii'))
+    body = request.iter_body
+    request.iter_body = lambda: body(chunk_size=100)
+    assert list(request.iter_json_array()) == elements
+
+def test_iter_json_array_handles_elements_split_across_chunks():
+    raw = '["é", 12345, -1.5e3, true, null, {"a": []}]'.encode('utf8')
+    expected = ["é", 12345, -1.5e3, True, None, {"a": []}]
+    for size in (1, 2, 3, 5):
+        chunks = [raw[i:i+size] for i in range(0, len(raw), size)]
+        assert list(body_parsers.iter_json_array(chunks)) == expected
+
+def test_iter_json_array_decodes_large_elements_once(monkeypatch):
+    calls = []
+    raw_decode = json.JSONDecoder.raw_decode
+
+    def counting_raw_decode(self, s, idx=0):
+        calls.append(idx)
+        return raw_decode(self, s, idx)
+
+    monkeypatch.setattr(json.JSONDecoder, 'raw_decode', counting_raw_decode)
+    element = {"text": 'a "quoted" \\ [string] {with} brackets' * 50, "list": [[1], {"b": []}]}
+    raw = json.dumps([element, "x" * 1000, element]).encode('ascii')
+    chunks = [raw[i:i+7] for i in range(0, len(raw), 7)]
+    assert list(body_parsers.iter_json_array(chunks)) == [element, "x" * 1000, element]
+    # Each element is decoded at most twice: once incomplete, once complete
+    assert len(calls) <= 6
+
+def test_iter_json_array_rejects_invalid_documents(harness):
+    for raw in (b'', b'{}', b'[1,]', b'[1 2]', b'[1', b'[1] 2', b'[1.]'):
+        with raises(MalformedBody):
+            list(make_request(harness, raw).iter_json_array())
+
+def test_iter_json_array_size_limit(harness):
+    request = make_request(harness, b'[1, 2, 3, 4, 5]')
+    with raises(BodyTooLarge):
+        next(request.iter_json_array(max_size=10))
+    chunks = [b'[1, ', b'2, ', b'3]']
+    iterator = body_parsers.iter_json_array(chunks, max_size=6)
+    assert next(iterator) == 1
+    with raises(BodyTooLarge):
+        list(iterator)
+
+
+# multipart
+
+def test_multipart_parser_handles_any_chunking():
+    boundary = get_boundary(b"multipart/form-data; boundary=AaB03x")
+    raw = UPLOAD.encode('ascii')
+    for size in (1, 2, 7, 64, len(raw)):
+        chunks = [raw[i:i+size] for i in range(0, len(raw), size)]
+        body = MultipartParser(boundary).parse(chunks)
+        assert body['submit-name'] == "Larry"
+        assert body['files'].value == b"... contents of file1.txt ..."
+
+def test_multipart_parser_ignores_preamble_and_epilogue():
+    raw = b"preamble\r\n" + UPLOAD.encode('ascii') + b"\r\nepilogue"
+    body = MultipartParser(b'AaB03x').parse([raw])
+    assert body['submit-name'] == "Larry"
+
+def test_multipart_parser_spools_large_files_to_disk():
+    body = MultipartParser(b'AaB03x', spool_threshold=10).parse([UPLOAD.encode('ascii')])
+    upload = body['files']
+    assert upload.file._rolled
+    assert upload.file.read() == b"... contents of file1.txt ..."
+
+def test_multipart_parser_rejects_truncated_body():
+    with raises(ValueError):
+        MultipartParser(b'AaB03x').parse([UPLOAD.encode('ascii')[:-10]])
+
+def test_multipart_parser_closes_files_on_error(monkeypatch):
+    files = []
+
+    def spool(**kw):
+        files.append(SpooledTemporaryFile(**kw))
+        return files[-1]
+    monkeypatch.setattr('pando.http.multipart.SpooledTemporaryFile', spool)
+    raw = UPLOAD.encode('ascii').replace(b'--AaB03x--', (
+        b'--AaB03x\r\n'
+        b'Content-Disposition: form-data; name="more"; filename="file2.txt"\r\n'
+        b'\r\n'
+        b'... truncated'
+    ))
+    with raises(ValueError):
+        MultipartParser(b'AaB03x').parse([raw])
+    assert len(files) == 2
+    assert all(f.closed for f in files)
+
+def test_multipart_part_size_limit(harness):
+    harness.client.hydrate_website(multipart_max_part_size=10)
+    with raises(BodyTooLarge):
+        make_body(harness, UPLOAD, content_type=FORMDATA)
+
+def test_multipart_total_size_limit(harness):
+    harness.client.hydrate_website(multipart_max_size=100)
+    with raises(BodyTooLarge) as x:
+        make_body(harness, UPLOAD, content_type=FORMDATA)
+    assert x.value.code == 413
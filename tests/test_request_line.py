@@ -123,6 +123,19 @@ def test_method_other_forbidden_characters(i):
     the400(i)
 
 
+def test_standard_methods_are_interned():
+    assert Line(b"GET", b"/", b"HTTP/1.1").method is Line(b"GET", b"/a", b"HTTP/1.1").method
+    assert Method(b"GET").as_text == "GET"
+    assert Method(b"FOO") is not Method(b"FOO")
+
+def test_interned_methods_and_versions_are_immutable():
+    line = Line(b"GET", b"/", b"HTTP/1.1")
+    with raises(AttributeError):
+        line.method.foo = 'bar'
+    with raises(AttributeError):
+        line.version.foo = 'bar'
+
+
 # URI
 # ===
 
@@ -149,6 +162,11 @@ def test_uri_querystring_mapping():
     assert isinstance(uri.querystring.mapping, Mapping)
 
 
+def test_uri_decoded_includes_querystring():
+    assert URI(b"/baz.html?buz=bloo").decoded == "/baz.html?buz=bloo"
+    assert URI(b"/baz.html?").decoded == "/baz.html?"
+    assert URI(b"/baz.html").decoded == "/baz.html"
+
 def test_uri_normal_case_is_normal():
     uri = URI(b"/baz.html?buz=bloo")
     assert uri.path == Path(b"/baz.html")
@@ -208,3 +226,8 @@ def test_version_info_is_tuple():
 def test_version_is_bytestring():
     version = Version(b"HTTP/0.9")
     assert isinstance(version, bytes)
+
+def test_known_versions_are_interned():
+    assert Version(b"HTTP/1.1") is Version(b"HTTP/1.1")
+    assert Version(b"HTTP/1.1").info == (1, 1)
+    assert Version(b"HTTP/1.2") is not Version(b"HTTP/1.2")
@@ -1,7 +1,9 @@
+import io
 import os
 from pytest import raises
 
 from pando import Response
+from pando.http.response import FileBody
 from pando.exceptions import CRLFInjection
 
 
@@ -15,6 +17,18 @@ def test_response_to_wsgi():
     actual = list(response.to_wsgi({}, start_response, 'utf8').body)
     assert actual == expected
 
+def test_response_to_wsgi_reads_file_body_in_chunks():
+    f = io.BytesIO(b"Greetings, program!")
+    response = Response(body=FileBody(f, 19, chunk_size=8))
+
+    def start_response(status, headers):
+        pass
+
+    body = response.to_wsgi({}, start_response, 'utf8')
+    assert list(body) == [b"Greeting", b"s, progr", b"am!"]
+    body.close()
+    assert f.closed
+
 def test_response_wsgi_status_is_not_based_on_str_method():
     class CustomResponse(Response):
         def __str__(self):
@@ -98,6 +112,92 @@ def test_set_whence_raised_works():
         raise Response(200)
     except Response as r:
         assert r.whence_raised == (None, None)
-        r.set_whence_raised()
+        assert r.set_whence_raised() == r.whence_raised
         assert r.whence_raised[0] == 'tests' + os.sep + 'test_response.py'
         assert isinstance(r.whence_raised[1], int)
+
+def test_whence_raised_is_resolved_lazily(harness, monkeypatch):
+    calls = []
+    relpath = os.path.relpath
+    monkeypatch.setattr(os.path, 'relpath', lambda *a: calls.append(a) or relpath(*a))
+    try:
+        raise Response(302)
+    except Response as e:
+        r = e
+        r.request = harness.client.GET(return_after='parse_environ_into_request', want='request')
+        r._set_raised_from()
+    assert calls == []
+    assert r.whence_raised[0].endswith('test_response.py')
+    assert r.whence_raised[0] == relpath(__file__, harness.client.website.project_root)
+    assert len(calls) == 1
+
+def test_response_cookie_jar_starts_empty():
+    response = Response(headers={b'Cookie': b'foo=bar'})
+    assert not response.headers.has_cookies
+    assert len(response.headers.cookie) == 0
+    response.headers.cookie['baz'] = 'qux'
+    assert (b'Set-Cookie', b'baz=qux') in response._serialize_headers()
+
+def test_response_headers_are_serialized_in_insertion_order():
+    response = Response(headers={b'content-type': b'text/plain'})
+    response.headers[b'X-Foo'] = b'1'
+    response.headers.add(b'Vary', b'Accept')
+    response.headers.add(b'Vary', b'Cookie')
+    response.headers[b'X-Foo'] = b'2'
+    response.headers.cookie['foo'] = 'bar'
+    expected = [
+        ('Content-Type', 'text/plain'),
+        ('Vary', 'Accept'),
+        ('Vary', 'Cookie'),
+        ('X-Foo', '2'),
+        ('Set-Cookie', 'foo=bar'),
+    ]
+
+    def start_response(status, headers):
+        assert headers == expected
+
+    response.to_wsgi({}, start_response, 'utf8')
+    # Serializing doesn't modify the headers
+    assert b'Set-Cookie' not in response.headers
+    assert response.headers.native_items() == expected[:-1]
+
+def test_response_headers_must_be_ascii():
+    response = Response()
+    response.headers[b'X-Foo'] = 'café'
+    with raises(ValueError) as info:
+        response.to_wsgi({}, lambda *a: None, 'utf8')
+    assert str(info.value) == r"Header `X-Foo: caf\xc3\xa9` isn't US-ASCII."
+    del response.headers[b'X-Foo']
+    response.headers[b'X-Bar'] = b'bar'
+    assert response.headers.native_items() == [('X-Bar', 'bar')]
+
+def test_response_to_wsgi_streams_iterators_and_runs_cleanups(harness):
+    events = []
+
+    def chunks():
+        try:
+            yield 'Greetings, '
+            yield b'program!'
+        finally:
+            events.append('closed')
+
+    response = Response(body=chunks())
+    response.request = harness.client.GET(return_after='parse_environ_into_request', want='request')
+    response.request.add_cleanup(events.append, 'first')
+    response.request.add_cleanup(events.append, 'second')
+    body = response.to_wsgi({}, lambda *a: None, 'utf8')
+    assert next(iter(body)) == b'Greetings, '
+    body.close()
+    assert events == ['closed', 'second', 'first']
+    # The callbacks are only called once
+    body.close()
+    assert events == ['closed', 'second', 'first']
+
+def test_cleanup_errors_are_logged(harness, caplog):
+    request = harness.client.GET(return_after='parse_environ_into_request', want='request')
+    events = []
+    request.add_cleanup(events.append, 'called')
+    request.add_cleanup(lambda: 1 / 0)
+    request.run_cleanups()
+    assert events == ['called']
+    assert 'ZeroDivisionError' in caplog.text
@@ -30,13 +30,17 @@ def test_website_is_accessible_from_first_page_of_simplates(harness):
 
 def test_normal_response_is_returned(harness):
     harness.fs.www.mk(('index.html', "Greetings, program!"))
+    response = harness.client.GET()
     expected = b'\r\n'.join(b"""\
 HTTP/1.1
+Accept-Ranges: bytes
 Content-Type: text/html
+Etag: %s
+Last-Modified: %s
 
 Greetings, program!
-""".splitlines())
-    actual = harness.client.GET()._to_http('1.1')
+""".splitlines()) % (response.headers[b'ETag'], response.headers[b'Last-Modified'])
+    actual = response._to_http('1.1')
     assert actual == expected
 
 def test_fatal_error_response_is_returned(harness):
@@ -301,6 +305,106 @@ def test_custom_error_spt_with_text_plain_works(harness):
     assert response.headers[b'Content-Type'] == b'text/plain; charset=UTF-8'
     assert response.body == b"Oh no!\n"
 
+def test_error_pages_are_indexed_when_the_website_is_created(harness):
+    harness.fs.project.mk(('error.spt', '[---]\n[---] text/plain\nTold ya.'))
+    website = harness.client.website
+    assert website.find_error_page(404) == harness.fs.project.resolve('error.spt')
+    harness.fs.project.mk(('404.spt', '[---]\n[---] text/plain\nNope.'))
+    assert website.find_error_page(404) == harness.fs.project.resolve('error.spt')
+    assert harness.client.GET('/', raise_immediately=False).body == b'Told ya.'
+
+def test_error_page_index_is_refreshed_when_changes_reload_is_on(harness):
+    harness.fs.project.mk(('error.spt', '[---]\n[---] text/plain\nTold ya.'))
+    website = harness.client.hydrate_website(changes_reload=True)
+    assert website.find_error_page(404) == harness.fs.project.resolve('error.spt')
+    harness.fs.project.mk(('404.spt', '[---]\n[---] text/plain\nNope.'))
+    os.utime(harness.fs.project.root, ns=(0, 0))
+    assert website.find_error_page(404) == harness.fs.project.resolve('404.spt')
+    assert website.find_error_page(500) == harness.fs.project.resolve('error.spt')
+
+def test_default_error_spt_is_rendered_once_per_code_and_media_type(harness):
+    website = harness.client.website
+    r1 = harness.client.GET('/', raise_immediately=False)
+    r2 = harness.client.GET('/', raise_immediately=False)
+    r3 = harness.client.GET('/', HTTP_ACCEPT=b'application/json', raise_immediately=False)
+    assert r1.body == r2.body == b'Not found, program!\n\n'
+    assert r2.headers[b'Content-Type'] == b'text/plain; charset=UTF-8'
+    assert r3.headers[b'Content-Type'] == b'application/json; charset=UTF-8'
+    assert len(website.rendered_error_pages) == 2
+    assert website.rendered_error_pages.hits == 1
+
+def test_error_spt_without_render_once_is_rendered_every_time(harness):
+    harness.fs.project.mk(('error.spt', """
+        [---]
+        website.renders = getattr(website, 'renders', 0) + 1
+        [---] text/plain via stdlib_format
+        {website.renders}"""))
+    assert harness.client.GET('/', raise_immediately=False).body == b'1'
+    assert harness.client.GET('/', raise_immediately=False).body == b'2'
+
+def test_error_pages_are_not_reused_when_show_tracebacks_is_on(harness):
+    harness.client.hydrate_website(show_tracebacks=True)
+    harness.client.GET('/', raise_immediately=False)
+    assert len(harness.client.website.rendered_error_pages) == 0
+
+def test_traceback_of_response_exception_is_formatted_lazily(harness):
+    harness.fs.www.mk(('index.spt', """
+        [---]
+        website.redirect('/foo')
+        [---] text/plain
+        """))
+    state = harness.client.GET('/', raise_immediately=False, want='state',
+                               return_after='get_response_for_exception')
+    assert state['response'].code == 302
+    tb = state['traceback']
+    assert tb.text is None
+    assert str(tb).splitlines()[-1].startswith('pando.http.response.Response: 302 Found')
+    # It can be used like a `str`
+    assert tb.startswith('Traceback (most recent call last):')
+    assert 'website.redirect' in tb
+    assert tb == str(tb) and hash(tb) == hash(str(tb))
+    assert tb + '!' == str(tb) + '!'
+
+def test_cheap_errors_skip_traceback_and_negotiation(harness):
+    harness.fs.project.mk(('error.spt', """
+        [---]
+        website.renders = getattr(website, 'renders', 0) + 1
+        [---] application/json via stdlib_format
+        {{"renders": {website.renders}}}
+        [---] text/plain via stdlib_format
+        {website.renders}"""))
+    harness.client.hydrate_website(cheap_errors=True)
+    state = harness.client.GET('/', HTTP_ACCEPT=b'application/json', raise_immediately=False,
+                               want='state', return_after='get_response_for_exception')
+    assert state['traceback'] is None
+    r = harness.client.GET('/', HTTP_ACCEPT=b'application/json', raise_immediately=False)
+    assert r.body == b'1'
+    r = harness.client.GET('/', raise_immediately=False)
+    assert r.body == b'1'
+    assert r.headers[b'Content-Type'] == b'text/plain; charset=UTF-8'
+
+def test_cheap_errors_dont_apply_to_other_codes(harness):
+    harness.fs.www.mk(('index.spt', """
+        from pando import Response
+        [---]
+        raise Response(400)
+        [---] text/plain
+        """))
+    harness.client.hydrate_website(cheap_errors=True)
+    state = harness.client.GET('/', raise_immediately=False, want='state',
+                               return_after='get_response_for_exception')
+    assert state['response'].code == 400
+    assert state['traceback'] is not None
+
+def test_cheap_errors_access_logging_is_rate_limited(harness, caplog):
+    harness.client.hydrate_website(cheap_errors=True, cheap_errors_log_limit=2)
+    for i in range(5):
+        harness.client.GET('/', raise_immediately=False)
+    messages = [m for m in caplog.messages if m.startswith('404 Not Found')]
+    assert len(messages) == 2
+    harness.client.website._cheap_errors_log_limiter.window_end = 0
+    harness.client.GET('/', raise_immediately=False)
+    assert caplog.messages[-1].endswith('(3 similar messages suppressed)')
 
 def test_autoindex_response_is_404_by_default(harness):
     harness.fs.www.mk(('README', "Greetings, program!"))
@@ -1,5 +1,5 @@
 from pando.http.request import Request
-from pando.http.response import Response
+from pando.http.response import FileBody, Response
 
 
 def test_website_can_respond(harness):
@@ -70,6 +70,36 @@ def test_simplates_can_modify_output(harness):
     assert response.headers[b'Content-Type'] == b'text/x-foobar; charset=utf16'
 
 
+def test_simplates_can_stream_a_generator_body(harness):
+    harness.fs.www.mk(('export.spt', """\
+        [---]
+        events = website.events = []
+        def rows():
+            try:
+                for i in range(3):
+                    events.append(i)
+                    yield '%i,%i\\n' % (i, i * i)
+            finally:
+                events.append('closed')
+        request.add_cleanup(events.append, 'cleanup')
+        output.body = rows()
+        output.media_type = 'text/csv'
+        [---]
+    """))
+    website = harness.client.website
+    environ = harness.client.build_wsgi_environ('GET', '/export')
+    statuses = []
+    body = website.wsgi_app(environ, lambda status, headers: statuses.append(status))
+    assert statuses == ['200 OK']
+    assert website.events == []
+    chunks = iter(body)
+    assert next(chunks) == b'0,0\n'
+    assert website.events == [0]
+    assert list(chunks) == [b'1,1\n', b'2,4\n']
+    body.close()
+    assert website.events == [0, 1, 2, 'closed', 'cleanup']
+
+
 def test_early_failures_dont_break_everything(harness):
     old_from_wsgi = Request.from_wsgi
 
@@ -98,6 +128,34 @@ def test_static_resource_HEAD(harness):
     assert r.headers[b'Content-Length'] == b'12'
 
 
+def test_large_static_resource_is_streamed_from_disk(harness):
+    harness.fs.www.mk(('file.js', "Hello world!"))
+    harness.client.hydrate_website(static_files_streaming_threshold=10)
+    r = harness.client.GET('/file.js')
+    assert r.code == 200
+    assert isinstance(r.body, FileBody)
+    assert r.headers[b'Content-Length'] == b'12'
+    assert b''.join(r.body) == b"Hello world!"
+    r.body.close()
+
+
+def test_large_static_resource_is_passed_to_wsgi_file_wrapper(harness):
+    harness.fs.www.mk(('file.js', "Hello world!"))
+    harness.client.hydrate_website(static_files_streaming_threshold=10)
+    response = harness.client.GET('/file.js')
+    wrapped = []
+
+    def file_wrapper(f, chunk_size):
+        wrapped.append(f)
+        return iter(lambda: f.read(chunk_size), b'')
+
+    environ = {'wsgi.file_wrapper': file_wrapper}
+    body = response.to_wsgi(environ, lambda status, headers: None, 'utf8')
+    assert wrapped == [response.body.file]
+    assert b''.join(body) == b"Hello world!"
+    response.body.close()
+
+
 def test_static_resource_PUT(harness):
     harness.fs.www.mk(('file.js', "Hello world!"))
     r = harness.client.xPUT('/file.js', body=b'Malicious JS code.')